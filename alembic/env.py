@@ -38,6 +38,12 @@ if config.config_file_name is not None:
 # --- Usar la Base importada ---
 target_metadata = Base.metadata
 
+# --- Excluir las tablas internas de SQLite del autogenerate ---
+# ANALYZE (ver las migraciones de índices) crea sqlite_stat1 (y sqlite_stat4 según la
+# compilación); no están en los modelos y autogenerate/check propondrían borrarlas.
+def include_object(object, name, type_, reflected, compare_to):
+    return not (type_ == "table" and name.startswith("sqlite_"))
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -62,6 +68,7 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
         # <<< AÑADIDO: Habilitar modo batch también para offline si se generan SQLs >>>
         render_as_batch=True
     )
@@ -87,6 +94,7 @@ def run_migrations_online() -> None:
         context.configure(
             connection=connection,
             target_metadata=target_metadata,
+            include_object=include_object,
             # <<< AÑADIDO: Habilitar modo batch para operaciones online >>>
             render_as_batch=True
         )
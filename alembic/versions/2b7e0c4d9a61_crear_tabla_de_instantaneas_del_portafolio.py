@@ -0,0 +1,40 @@
+"""Crear tabla de instantaneas del portafolio
+
+Revision ID: 2b7e0c4d9a61
+Revises: f91fbe14c417
+Create Date: 2026-10-18 14:05:12.904117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b7e0c4d9a61'
+down_revision: Union[str, None] = 'f91fbe14c417'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('portfolio_snapshots',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('market_value', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('cost_basis', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('unrealized_pnl', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('realized_pnl', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('net_flow', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('positions', sa.Integer(), nullable=False),
+    sa.Column('missing_prices', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('owner_id', 'date')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('portfolio_snapshots')
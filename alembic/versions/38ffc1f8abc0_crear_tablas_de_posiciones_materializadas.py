@@ -0,0 +1,58 @@
+"""Crear tablas de posiciones materializadas
+
+Revision ID: 38ffc1f8abc0
+Revises: 9593e816b573
+Create Date: 2026-10-18 12:02:44.519301
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '38ffc1f8abc0'
+down_revision: Union[str, None] = '9593e816b573'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las tablas se llenan en la primera lectura de cada usuario (positions.ensure_built)
+    # o con 'python -m src.positions rebuild'.
+    op.create_table('positions',
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('asset_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('cost_basis', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('realized_pnl', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['asset_id'], ['assets.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('owner_id', 'asset_id')
+    )
+    op.create_table('open_lots',
+    sa.Column('buy_transaction_id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('asset_id', sa.Integer(), nullable=False),
+    sa.Column('lot_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('quantity', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('cost_per_unit', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.ForeignKeyConstraint(['asset_id'], ['assets.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['buy_transaction_id'], ['transactions.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('buy_transaction_id')
+    )
+    with op.batch_alter_table('open_lots', schema=None) as batch_op:
+        batch_op.create_index('ix_open_lots_owner_asset', ['owner_id', 'asset_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('open_lots', schema=None) as batch_op:
+        batch_op.drop_index('ix_open_lots_owner_asset')
+
+    op.drop_table('open_lots')
+    op.drop_table('positions')
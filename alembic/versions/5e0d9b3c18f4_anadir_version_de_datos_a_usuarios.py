@@ -0,0 +1,30 @@
+"""Anadir version de datos a usuarios
+
+Revision ID: 5e0d9b3c18f4
+Revises: c4e81f2a7b39
+Create Date: 2026-10-18 17:02:33.518204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e0d9b3c18f4'
+down_revision: Union[str, None] = 'c4e81f2a7b39'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,34 @@
+"""Crear tabla de cache de cotizaciones
+
+Revision ID: 7d728b5ce38e
+Revises: 3565803da5b8
+Create Date: 2026-10-18 09:12:41.503218
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d728b5ce38e'
+down_revision: Union[str, None] = '3565803da5b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('quote_cache',
+    sa.Column('symbol', sa.String(), nullable=False),
+    sa.Column('price', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('source', sa.String(), nullable=False),
+    sa.Column('fetched_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('symbol')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('quote_cache')
@@ -0,0 +1,51 @@
+"""Crear tablas de historico de precios
+
+Revision ID: 9593e816b573
+Revises: 7d728b5ce38e
+Create Date: 2026-10-18 10:41:07.118934
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9593e816b573'
+down_revision: Union[str, None] = '7d728b5ce38e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('price_bars',
+    sa.Column('symbol', sa.String(), nullable=False),
+    sa.Column('date', sa.Date(), nullable=False),
+    sa.Column('open', sa.Numeric(precision=24, scale=10), nullable=True),
+    sa.Column('high', sa.Numeric(precision=24, scale=10), nullable=True),
+    sa.Column('low', sa.Numeric(precision=24, scale=10), nullable=True),
+    sa.Column('close', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('adj_close', sa.Numeric(precision=24, scale=10), nullable=True),
+    sa.Column('volume', sa.BigInteger(), nullable=True),
+    sa.PrimaryKeyConstraint('symbol', 'date')
+    )
+    op.create_table('price_bar_coverage',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('symbol', sa.String(), nullable=False),
+    sa.Column('start_date', sa.Date(), nullable=False),
+    sa.Column('end_date', sa.Date(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('price_bar_coverage', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_price_bar_coverage_symbol'), ['symbol'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('price_bar_coverage', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_price_bar_coverage_symbol'))
+
+    op.drop_table('price_bar_coverage')
+    op.drop_table('price_bars')
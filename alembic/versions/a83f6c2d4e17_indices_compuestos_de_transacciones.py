@@ -0,0 +1,38 @@
+"""Indices compuestos de transacciones
+
+Revision ID: a83f6c2d4e17
+Revises: 5e0d9b3c18f4
+Create Date: 2026-10-18 17:40:09.261734
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a83f6c2d4e17'
+down_revision: Union[str, None] = '5e0d9b3c18f4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        # ix_transactions_id duplica la clave primaria (rowid) y ninguna consulta filtra solo por fecha
+        batch_op.drop_index('ix_transactions_id')
+        batch_op.drop_index('ix_transactions_transaction_date')
+        batch_op.create_index('ix_transactions_owner_asset_date', ['owner_id', 'asset_id', 'transaction_date', 'id'], unique=False)
+        batch_op.create_index('ix_transactions_owner_date', ['owner_id', 'transaction_date', 'id'], unique=False)
+    op.execute("ANALYZE transactions")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('transactions', schema=None) as batch_op:
+        batch_op.drop_index('ix_transactions_owner_date')
+        batch_op.drop_index('ix_transactions_owner_asset_date')
+        batch_op.create_index('ix_transactions_transaction_date', ['transaction_date'], unique=False)
+        batch_op.create_index('ix_transactions_id', ['id'], unique=False)
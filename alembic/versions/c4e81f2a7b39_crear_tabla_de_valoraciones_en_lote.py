@@ -0,0 +1,44 @@
+"""Crear tabla de valoraciones en lote
+
+Revision ID: c4e81f2a7b39
+Revises: 2b7e0c4d9a61
+Create Date: 2026-10-18 16:21:47.310528
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4e81f2a7b39'
+down_revision: Union[str, None] = '2b7e0c4d9a61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('valuation_snapshots',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.DateTime(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('market_value', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('cost_basis', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('unrealized_pnl', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('positions', sa.Integer(), nullable=False),
+    sa.Column('missing_prices', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('valuation_snapshots', schema=None) as batch_op:
+        batch_op.create_index('ix_valuation_snapshots_owner_run', ['owner_id', 'run_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('valuation_snapshots', schema=None) as batch_op:
+        batch_op.drop_index('ix_valuation_snapshots_owner_run')
+
+    op.drop_table('valuation_snapshots')
@@ -0,0 +1,41 @@
+"""Indices de busqueda sin mayusculas
+
+Revision ID: e61b7a93c0d5
+Revises: a83f6c2d4e17
+Create Date: 2026-10-18 18:22:47.915302
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e61b7a93c0d5'
+down_revision: Union[str, None] = 'a83f6c2d4e17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Índices sobre expresiones: deben coincidir con las de crud.get_user_by_* y get_asset_by_symbol
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index('ix_users_username_lower', [sa.text('lower(username)')], unique=False)
+        batch_op.create_index('ix_users_email_lower', [sa.text('lower(email)')], unique=False)
+
+    with op.batch_alter_table('assets', schema=None) as batch_op:
+        batch_op.create_index('ix_assets_owner_symbol_upper', ['owner_id', sa.text('upper(symbol)')], unique=False)
+    op.execute("ANALYZE users")
+    op.execute("ANALYZE assets")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('assets', schema=None) as batch_op:
+        batch_op.drop_index('ix_assets_owner_symbol_upper')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_email_lower')
+        batch_op.drop_index('ix_users_username_lower')
@@ -0,0 +1,60 @@
+"""Crear tabla de emparejamientos de lotes
+
+Revision ID: f91fbe14c417
+Revises: 38ffc1f8abc0
+Create Date: 2026-10-18 13:20:51.730412
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f91fbe14c417'
+down_revision: Union[str, None] = '38ffc1f8abc0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('lot_matches',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('owner_id', sa.Integer(), nullable=False),
+    sa.Column('asset_id', sa.Integer(), nullable=False),
+    sa.Column('sell_transaction_id', sa.Integer(), nullable=False),
+    sa.Column('buy_transaction_id', sa.Integer(), nullable=False),
+    sa.Column('sell_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('buy_date', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('quantity', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('cost_basis', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('proceeds', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('realized_pnl', sa.Numeric(precision=24, scale=10), nullable=False),
+    sa.Column('holding_days', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['asset_id'], ['assets.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['buy_transaction_id'], ['transactions.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['sell_transaction_id'], ['transactions.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('lot_matches', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_lot_matches_asset_id'), ['asset_id'], unique=False)
+        batch_op.create_index('ix_lot_matches_owner_sell_date', ['owner_id', 'sell_date'], unique=False)
+        batch_op.create_index(batch_op.f('ix_lot_matches_sell_transaction_id'), ['sell_transaction_id'], unique=False)
+
+    # Se vacían las posiciones materializadas para que la primera lectura de cada usuario
+    # las recalcule (positions.ensure_built) y genere también sus emparejamientos.
+    op.execute("DELETE FROM open_lots")
+    op.execute("DELETE FROM positions")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('lot_matches', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_lot_matches_sell_transaction_id'))
+        batch_op.drop_index('ix_lot_matches_owner_sell_date')
+        batch_op.drop_index(batch_op.f('ix_lot_matches_asset_id'))
+
+    op.drop_table('lot_matches')
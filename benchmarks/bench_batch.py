@@ -0,0 +1,71 @@
+# benchmarks/bench_batch.py
+# --- Benchmark de la valoración en lote de todos los usuarios ---
+# Genera muchos usuarios cuyos activos comparten un universo común de símbolos, sirve los
+# precios con FixtureProvider y ejecuta batch_valuation.run con un solo proceso y con un pool,
+# mostrando usuarios/s, tiempos por etapa y cuántas cotizaciones se ahorran al deduplicar.
+# Los datos se insertan sin pasar por crud (sin posiciones materializadas), así que cada
+# proceso reproduce el historial de sus usuarios. Ambas ejecuciones deben guardar los mismos valores.
+#
+# Uso: python benchmarks/bench_batch.py --users 500 --assets 20 --tx 40 --universe 300 --workers 4
+import argparse
+import logging
+
+import common
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la valoración en lote multiusuario.")
+    parser.add_argument("--users", type=int, default=500, help="Número de usuarios")
+    parser.add_argument("--assets", type=int, default=20, help="Activos por usuario")
+    parser.add_argument("--tx", type=int, default=40, help="Transacciones por activo")
+    parser.add_argument("--universe", type=int, default=300, help="Símbolos distintos entre todos los usuarios")
+    parser.add_argument("--workers", type=int, default=4, help="Procesos del pool")
+    parser.add_argument("--chunk-size", type=int, default=50, help="Usuarios por tarea")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latencia simulada por cotización (s)")
+    args = parser.parse_args()
+    if args.universe < args.assets:
+        parser.error("--universe debe ser al menos --assets")
+
+    logging.disable(logging.WARNING)
+    common.reset_schema()
+    from sqlalchemy import text
+    from src.database import SessionLocal
+    from src.providers import FixtureProvider
+    from src import batch_valuation, crud, models
+
+    db = SessionLocal()
+    with common.Timer() as t:
+        for i in range(args.users):
+            user = common.make_user(db, f"bench{i}")
+            common.generate_ledger(db, user.id, args.assets, args.tx, seed=i)
+        # Universo común: los ids de cada usuario son consecutivos, así que no se repiten símbolos dentro de un usuario
+        db.execute(text("UPDATE assets SET symbol = 'SHR' || (id % :universe)"), {"universe": args.universe})
+        db.commit()
+    print(f"Datos: {args.users} usuarios x {args.assets} activos x {args.tx} transacciones en {t.elapsed:.2f}s")
+
+    symbols = [f"SHR{i}" for i in range(args.universe)]
+    crud.set_price_provider(FixtureProvider(common.write_quote_fixture(symbols), latency=args.latency))
+
+    results = {}
+    for workers in (1, args.workers):
+        db.query(models.QuoteCacheEntry).delete()
+        db.commit()
+        crud.quote_cache.invalidate()
+        stats = batch_valuation.run(db, workers=workers, chunk_size=args.chunk_size)
+        results[workers] = stats
+        print(f"{workers} proceso(s): {stats['users']} usuarios en {stats['seconds']:.2f}s "
+              f"({stats['users_per_second']:,.0f} usuarios/s)")
+        for name, elapsed in stats["stages"].items():
+            print(f"    {name:<10} {elapsed:8.3f}s")
+
+    print(f"Cotizaciones pedidas: {results[1]['symbols']} (sin deduplicar serían {args.users * args.assets})")
+
+    S = models.ValuationSnapshot
+    def values(stats):
+        return [float(v) for (v,) in db.query(S.market_value).filter(S.run_at == stats["run_at"]).order_by(S.owner_id)]
+    same = values(results[1]) == values(results[args.workers])
+    print(f"1 proceso frente a {args.workers}: {'iguales' if same else 'DIFERENTES'}")
+    db.close()
+    raise SystemExit(0 if same else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_export.py
+# --- Benchmark de la exportación en streaming (src/exporter.py) ---
+# Genera el historial de un usuario y lo exporta a CSV (y a Parquet si pyarrow está instalado),
+# midiendo filas/s y el pico de memoria de Python (tracemalloc). Como referencia, mide el pico
+# de cargar el mismo historial como lista de objetos ORM (get_transactions_for_user sin límite).
+# Comprueba que el CSV tiene todas las filas y que la memoria no crece con el tamaño del historial.
+#
+# Uso: python benchmarks/bench_export.py --assets 200 --tx 5000 --batch-size 10000
+import argparse
+import csv
+import logging
+import os
+import tracemalloc
+
+import common
+
+def peak_mb(fn) -> tuple[object, float]:
+    tracemalloc.start()
+    try:
+        result = fn()
+        return result, tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la exportación en streaming.")
+    parser.add_argument("--assets", type=int, default=200, help="Número de activos")
+    parser.add_argument("--tx", type=int, default=5000, help="Transacciones por activo")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Filas por bloque")
+    parser.add_argument("--orm-sample", type=int, default=200000, help="Filas cargadas como objetos ORM (referencia)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    common.reset_schema()
+    from src.database import SessionLocal
+    from src import crud, exporter, models
+
+    db = SessionLocal()
+    user = common.make_user(db)
+    with common.Timer() as t:
+        common.generate_ledger(db, user.id, args.assets, args.tx)
+    total = args.assets * args.tx
+    print(f"Datos: {total:,} transacciones en {t.elapsed:.2f}s")
+
+    path = os.path.join(common.WORK_DIR, "transacciones.csv")
+    stats = exporter.export(db, user.id, "transactions", path, batch_size=args.batch_size)
+    print(f"CSV: {stats['rows']:,} filas en {stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} filas/s), "
+          f"{os.path.getsize(path) / 1e6:.1f} MB")
+    db.expunge_all()
+
+    # Pico de memoria: exportación completa frente a la mitad de filas (debe ser similar)
+    _, peak_full = peak_mb(lambda: exporter.export(db, user.id, "transactions", path, batch_size=args.batch_size))
+    with open(path, newline="", encoding="utf-8") as f:
+        exported = sum(1 for _ in csv.reader(f)) - 1
+    db.query(models.Transaction).filter(models.Transaction.owner_id == user.id,
+                                        models.Transaction.id > total // 2).delete(synchronize_session=False)
+    db.commit()
+    _, peak_half = peak_mb(lambda: exporter.export(db, user.id, "transactions", path, batch_size=args.batch_size))
+    print(f"Pico de memoria exportando: {peak_full:.1f} MB ({total:,} filas), {peak_half:.1f} MB ({total // 2:,} filas)")
+
+    sample = min(args.orm_sample, total // 2)
+    _, peak_orm = peak_mb(lambda: crud.get_transactions_for_user(db, user.id, limit=sample))
+    db.expunge_all()
+    print(f"Referencia: {sample:,} objetos ORM en memoria, pico {peak_orm:.1f} MB")
+
+    try:
+        exporter._require_pyarrow()
+    except ImportError:
+        print("Parquet: pyarrow no está instalado, se omite")
+    else:
+        parquet_path = os.path.join(common.WORK_DIR, "transacciones.parquet")
+        stats = exporter.export(db, user.id, "transactions", parquet_path, batch_size=args.batch_size)
+        print(f"Parquet: {stats['rows']:,} filas en {stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} filas/s), "
+              f"{os.path.getsize(parquet_path) / 1e6:.1f} MB")
+
+    ok = exported == total
+    print(f"Filas exportadas: {exported:,} de {total:,} ({'completas' if ok else 'INCOMPLETAS'})")
+    db.close()
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/bench_import.py
+# --- Benchmark de la importación en bloque (src/importer.py) ---
+# Genera un extracto CSV sintético (con una fracción de filas inválidas), lo importa con
+# importer.import_file y compara las filas/s con dar de alta una muestra de las mismas filas
+# una a una con crud.create_transaction (el camino del formulario de la GUI). Al final
+# comprueba que las posiciones materializadas coinciden con el historial (positions.verify).
+#
+# Uso: python benchmarks/bench_import.py --rows 50000 --symbols 200 --batch-size 1000 --baseline 500
+import argparse
+import csv
+import logging
+import os
+import random
+from datetime import datetime, timedelta
+
+import common
+
+def write_statement(path: str, rows: int, symbols: int, invalid: float, seed: int = 9) -> int:
+    """Escribe el CSV; las ventas nunca superan la cantidad abierta. Retorna las filas inválidas."""
+    rng = random.Random(seed)
+    open_qty = [0] * symbols
+    start = datetime(2010, 1, 1)
+    bad = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("date", "type", "symbol", "quantity", "price", "fees", "notes"))
+        for i in range(rows):
+            k = rng.randrange(symbols)
+            price = f"{rng.uniform(5, 500):.2f}"
+            if open_qty[k] > 1 and rng.random() < 0.3:
+                qty = rng.randint(1, open_qty[k]); open_qty[k] -= qty; kind = "SELL"
+            else:
+                qty = rng.randint(1, 50); open_qty[k] += qty; kind = "BUY"
+            row = [(start + timedelta(minutes=17 * i)).strftime("%Y-%m-%d %H:%M"), kind, f"sym{k:04d}",
+                   str(qty), price, f"{rng.uniform(0, 5):.2f}", ""]
+            if rng.random() < invalid:
+                # La fila inválida no cuenta para la cantidad abierta
+                if kind == "BUY": open_qty[k] -= qty
+                else: open_qty[k] += qty
+                row[rng.choice((0, 3, 4))] = "n/a"
+                bad += 1
+            writer.writerow(row)
+    return bad
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la importación en bloque de transacciones.")
+    parser.add_argument("--rows", type=int, default=50000, help="Filas del extracto")
+    parser.add_argument("--symbols", type=int, default=200, help="Símbolos distintos")
+    parser.add_argument("--invalid", type=float, default=0.01, help="Fracción de filas inválidas")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Filas por lote")
+    parser.add_argument("--baseline", type=int, default=500, help="Filas de la muestra dada de alta una a una")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    common.reset_schema()
+    from src.database import SessionLocal
+    from src import crud, importer, models, positions
+
+    path = os.path.join(common.WORK_DIR, "extracto.csv")
+    rejects_path = os.path.join(common.WORK_DIR, "extracto.rechazos.csv")
+    bad = write_statement(path, args.rows, args.symbols, args.invalid)
+    db = SessionLocal()
+
+    # Muestra una a una (otro usuario) con el mismo flujo que el formulario de la GUI
+    user = common.make_user(db, "uno_a_uno")
+    asset_ids = {}
+    rows = [row for _, row in importer.iter_csv_rows(path)][:args.baseline]
+    with common.Timer() as t_single:
+        for row in rows:
+            try:
+                values = importer.convert_row(row)
+            except ValueError:
+                continue
+            if values["symbol"] not in asset_ids:
+                asset_ids[values["symbol"]] = crud.create_asset(db, user.id, values["symbol"], values["symbol"],
+                                                                values["asset_type"]).id
+            crud.create_transaction(db, user.id, asset_ids[values["symbol"]], values["transaction_type"],
+                                    values["quantity"], values["price_per_unit"], values["transaction_date"],
+                                    values["fees"], values["notes"])
+    single_rate = len(rows) / t_single.elapsed
+    print(f"Una a una (crud.create_transaction): {len(rows)} filas en {t_single.elapsed:.2f}s ({single_rate:,.0f} filas/s)")
+
+    user = common.make_user(db, "importacion")
+    stats = importer.import_file(db, user.id, path, batch_size=args.batch_size, rejects_path=rejects_path)
+    print(f"Importación en bloque: {stats['imported']:,} de {stats['rows']:,} filas en {stats['batches']} lotes, "
+          f"{stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} filas/s, {stats['rows_per_second'] / single_rate:.0f}x), "
+          f"{stats['assets_created']} activos nuevos")
+    print(f"Rechazadas: {stats['rejected']} (generadas {bad}) -> {rejects_path}")
+
+    differences = positions.verify(db, user.id)
+    imported = db.query(models.Transaction).filter(models.Transaction.owner_id == user.id).count()
+    ok = not differences and stats["rejected"] == bad and imported == args.rows - bad
+    print(f"Posiciones frente al historial: {'coinciden' if not differences else f'{len(differences)} diferencias'}")
+    db.close()
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
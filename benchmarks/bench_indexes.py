@@ -0,0 +1,126 @@
+# benchmarks/bench_indexes.py
+# --- Benchmark de los índices de la tabla transactions ---
+# Genera una tabla de transacciones grande (por defecto 1M de filas) y ejecuta las consultas
+# reales de la aplicación con dos juegos de índices:
+#   - antes:   los índices de la migración inicial (ix_transactions_id, ix_transactions_transaction_date).
+#   - después: los compuestos de la migración a83f6c2d4e17 (los declarados en models.Transaction).
+# Para cada consulta muestra el EXPLAIN QUERY PLAN y el tiempo medio en ambos casos, y
+# comprueba que las filas devueltas son las mismas.
+#
+# Uso: python benchmarks/bench_indexes.py --users 200 --assets 50 --tx 100 --samples 20
+import argparse
+import logging
+import random
+
+import common
+
+OLD_INDEXES = {"ix_transactions_id": "(id)", "ix_transactions_transaction_date": "(transaction_date)"}
+
+def queries(models, owner_id: int, asset_id: int, tx) -> dict:
+    """Las consultas de la aplicación sobre transactions (mismos filtros y orden que el código)."""
+    from sqlalchemy import asc, desc, select
+    T = models.Transaction
+    return {
+        # crud.get_transactions_by_asset / positions._replay_asset
+        "por activo": select(T).where(T.asset_id == asset_id, T.owner_id == owner_id)
+                               .order_by(asc(T.transaction_date), asc(T.id)),
+        # crud.get_transactions_for_user (primera página)
+        "por usuario": select(T).where(T.owner_id == owner_id)
+                                .order_by(desc(T.transaction_date), desc(T.id)).offset(0).limit(100),
+        # positions.iter_ledgers / valuation.load_transactions
+        "replay": select(T.asset_id, T.id, T.quantity, T.price_per_unit, T.fees).where(T.owner_id == owner_id)
+                         .order_by(T.asset_id, T.transaction_date, T.id),
+        # snapshots / returns: historial completo del usuario por fecha
+        "por fecha": select(T.id, T.asset_id, T.transaction_date).where(T.owner_id == owner_id)
+                            .order_by(T.transaction_date, T.id),
+        # positions.apply_transaction: ¿hay transacciones posteriores a la editada?
+        "posteriores": select(T.id).where(T.owner_id == owner_id, T.asset_id == asset_id, T.id != tx.id,
+                                          T.transaction_date > tx.transaction_date).limit(1),
+    }
+
+def explain(db, stmt) -> list[str]:
+    from sqlalchemy import text
+    sql = str(stmt.compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in db.execute(text("EXPLAIN QUERY PLAN " + sql))]
+
+def measure(db, models, samples) -> dict:
+    """Plan y tiempo medio (ms) de cada consulta, más los ids devueltos para comparar."""
+    results = {}
+    for owner_id, asset_id, tx in samples:
+        for name, stmt in queries(models, owner_id, asset_id, tx).items():
+            entry = results.setdefault(name, {"plan": explain(db, stmt), "seconds": 0.0, "rows": []})
+            with common.Timer() as t:
+                rows = db.execute(stmt).all()
+            entry["seconds"] += t.elapsed
+            entry["rows"].append([tuple(row)[:2] if len(row) > 1 else tuple(row) for row in rows])
+    for entry in results.values():
+        entry["ms"] = entry["seconds"] * 1000 / len(samples)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los índices de transactions (antes/después).")
+    parser.add_argument("--users", type=int, default=200, help="Número de usuarios")
+    parser.add_argument("--assets", type=int, default=50, help="Activos por usuario")
+    parser.add_argument("--tx", type=int, default=100, help="Transacciones por activo")
+    parser.add_argument("--samples", type=int, default=20, help="Pares (usuario, activo) consultados")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    common.reset_schema()
+    from sqlalchemy import text
+    from src.database import SessionLocal
+    from src import models
+
+    db = SessionLocal()
+    with common.Timer() as t:
+        for i in range(args.users):
+            user = common.make_user(db, f"bench{i}")
+            common.generate_ledger(db, user.id, args.assets, args.tx, seed=i)
+    total = db.query(models.Transaction).count()
+    print(f"Datos: {total:,} transacciones ({args.users} usuarios x {args.assets} activos x {args.tx}) en {t.elapsed:.2f}s")
+
+    rng = random.Random(11)
+    samples = []
+    for asset_id, owner_id in rng.sample(db.query(models.Asset.id, models.Asset.owner_id).all(), args.samples):
+        txs = db.query(models.Transaction).filter(models.Transaction.asset_id == asset_id)\
+                .order_by(models.Transaction.transaction_date).all()
+        samples.append((owner_id, asset_id, txs[len(txs) // 2])) # Una edición a mitad de historial
+    new_indexes = list(models.Transaction.__table__.indexes)
+
+    # Antes: índices de la migración inicial
+    for index in new_indexes:
+        index.drop(db.get_bind())
+    for name, columns in OLD_INDEXES.items():
+        db.execute(text(f"CREATE INDEX {name} ON transactions {columns}"))
+    db.execute(text("ANALYZE transactions"))
+    db.commit()
+    before = measure(db, models, samples)
+
+    # Después: los compuestos (lo que hace la migración)
+    with common.Timer() as t_migrate:
+        for name in OLD_INDEXES:
+            db.execute(text(f"DROP INDEX {name}"))
+        for index in new_indexes:
+            index.create(db.get_bind())
+        db.execute(text("ANALYZE transactions"))
+        db.commit()
+    print(f"Cambio de índices sobre {total:,} filas: {t_migrate.elapsed:.2f}s")
+    after = measure(db, models, samples)
+
+    same = True
+    print(f"\n{'consulta':<12} {'antes (ms)':>11} {'después (ms)':>13} {'mejora':>8}")
+    for name in before:
+        b, a = before[name], after[name]
+        same = same and b["rows"] == a["rows"]
+        print(f"{name:<12} {b['ms']:11.3f} {a['ms']:13.3f} {b['ms'] / a['ms'] if a['ms'] else 0:7.1f}x")
+    for name in before:
+        print(f"\n{name}")
+        for label, entry in (("antes", before[name]), ("después", after[name])):
+            for step in entry["plan"]:
+                print(f"  {label:<8} {step}")
+    print(f"\nResultados antes/después: {'iguales' if same else 'DIFERENTES'}")
+    db.close()
+    raise SystemExit(0 if same else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+# benchmarks/bench_lookups.py
+# --- Benchmark de las búsquedas sin distinguir mayúsculas (login y símbolos) ---
+# Para cada tamaño inserta ese número de usuarios y de activos (todos del mismo usuario) y
+# mide la latencia media de crud.get_user_by_username, get_user_by_email y get_asset_by_symbol
+# con los índices sobre expresiones (ix_users_*_lower, ix_assets_owner_symbol_upper) y sin ellos.
+# Con los índices la latencia debe mantenerse plana al crecer las tablas.
+#
+# Uso: python benchmarks/bench_lookups.py --sizes 1000,10000,100000 --lookups 200
+import argparse
+import logging
+import random
+
+import common
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsquedas de usuarios y símbolos.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Usuarios (y activos) por tamaño, separados por comas")
+    parser.add_argument("--lookups", type=int, default=200, help="Búsquedas por función y tamaño")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+
+    logging.disable(logging.WARNING)
+    from sqlalchemy import text
+    from src.database import SessionLocal
+    from src import crud, models
+
+    expression_indexes = [index for table in (models.User.__table__, models.Asset.__table__)
+                          for index in table.indexes if index.name.endswith(("_lower", "_upper"))]
+    lookups = {
+        "usuario": lambda db, i, owner_id: crud.get_user_by_username(db, f"User{i}"),
+        "email": lambda db, i, owner_id: crud.get_user_by_email(db, f"USER{i}@Example.com"),
+        "símbolo": lambda db, i, owner_id: crud.get_asset_by_symbol(db, f"sym{i}", owner_id),
+    }
+    plans = {}
+    print(f"{'tamaño':>8} {'función':<8} {'sin índice (ms)':>16} {'con índice (ms)':>16}")
+    for size in sizes:
+        common.reset_schema()
+        db = SessionLocal()
+        db.execute(models.User.__table__.insert(), [{"username": f"user{i}", "email": f"user{i}@example.com",
+                                                     "hashed_password": "x"} for i in range(size)])
+        owner_id = db.query(models.User.id).filter(models.User.username == "user0").scalar()
+        db.execute(models.Asset.__table__.insert(), [{"symbol": f"SYM{i}", "asset_type": models.AssetType.STOCK,
+                                                      "owner_id": owner_id} for i in range(size)])
+        db.execute(text("ANALYZE"))
+        db.commit()
+        keys = random.Random(size).sample(range(size), min(args.lookups, size))
+
+        timings = {}
+        for label, indexed in (("sin", False), ("con", True)):
+            if not indexed:
+                for index in expression_indexes:
+                    index.drop(db.get_bind())
+            else:
+                for index in expression_indexes:
+                    index.create(db.get_bind())
+                db.execute(text("ANALYZE"))
+                db.commit()
+            for name, lookup in lookups.items():
+                with common.Timer() as t:
+                    for i in keys:
+                        if lookup(db, i, owner_id) is None:
+                            raise SystemExit(f"{name} {i}: no encontrado")
+                timings[(name, label)] = t.elapsed * 1000 / len(keys)
+            # Plan de las consultas tal como las genera crud (con parámetros de ejemplo)
+            with common.QueryCounter() as counter:
+                for lookup in lookups.values():
+                    lookup(db, 0, owner_id)
+            connection = db.connection()
+            plans[label] = [connection.exec_driver_sql("EXPLAIN QUERY PLAN " + sql, params).fetchall()[-1][-1]
+                            for sql, params in counter.statements]
+        for name in lookups:
+            print(f"{size:>8} {name:<8} {timings[(name, 'sin')]:16.3f} {timings[(name, 'con')]:16.3f}")
+        db.close()
+
+    for label, steps in plans.items():
+        print(f"\nPlan {label} índices ({sizes[-1]}):")
+        for step in steps:
+            print(f"  {step}")
+
+if __name__ == "__main__":
+    main()
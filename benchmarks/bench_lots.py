@@ -0,0 +1,223 @@
+# benchmarks/bench_lots.py
+# --- Benchmark del emparejamiento FIFO de lotes ---
+# Compara el bucle anterior de get_open_positions (reordena la lista de lotes y construye
+# una lista nueva en cada venta) con LotLedger (deque consumida desde la cabeza) para un
+# solo activo con N transacciones, y comprueba que ambos dan exactamente los mismos
+# números (cantidad, coste base y P&L realizado). También mide el motor de enteros escalados
+# (FixedLotLedger) y comprueba que coincide exactamente, a la escala de la BD (10 decimales),
+# con el Decimal: totales, lotes abiertos y emparejamientos. Por último verifica
+# get_open_positions (tabla positions) sobre una BD generada contra el bucle anterior.
+#
+# Uso: python benchmarks/bench_lots.py --sizes 1000,10000,100000 [--legacy-max 30000]
+import argparse
+import logging
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from types import SimpleNamespace
+
+import common
+
+
+def legacy_fifo(transactions, zero_tolerance=Decimal('1e-9')):
+    """Copia del bucle FIFO anterior (sin logs). Retorna (cantidad, coste base, P&L realizado)."""
+    from src import models
+    purchase_lots = []
+    realized_pnl_asset = Decimal(0)
+    current_quantity = Decimal(0)
+    total_investment = Decimal(0)
+    for t in transactions:
+        t_quantity = Decimal(t.quantity)
+        t_price = Decimal(t.price_per_unit)
+        t_fees = Decimal(t.fees) if t.fees is not None else Decimal(0)
+        if t.transaction_type == models.TransactionType.BUY:
+            cost_of_this_lot = (t_quantity * t_price) + t_fees
+            cost_per_unit_with_fees = cost_of_this_lot / t_quantity if t_quantity > zero_tolerance else Decimal(0)
+            purchase_lots.append((t.transaction_date, t_quantity, cost_per_unit_with_fees))
+            current_quantity += t_quantity
+            total_investment += cost_of_this_lot
+        elif t.transaction_type == models.TransactionType.SELL:
+            sell_quantity = t_quantity
+            proceeds = (sell_quantity * t_price) - t_fees
+            cost_basis_of_sold_units = Decimal(0)
+            if sell_quantity > current_quantity + zero_tolerance:
+                sell_quantity = current_quantity
+            remaining_sell_quantity = sell_quantity
+            temp_lots = []
+            purchase_lots.sort(key=lambda x: x[0])
+            for lot_date, lot_quantity, lot_cost_per_unit in purchase_lots:
+                if remaining_sell_quantity <= zero_tolerance:
+                    temp_lots.append((lot_date, lot_quantity, lot_cost_per_unit))
+                    continue
+                quantity_from_this_lot = min(remaining_sell_quantity, lot_quantity)
+                cost_basis_of_sold_units += quantity_from_this_lot * lot_cost_per_unit
+                remaining_sell_quantity -= quantity_from_this_lot
+                if lot_quantity > quantity_from_this_lot + zero_tolerance:
+                    temp_lots.append((lot_date, lot_quantity - quantity_from_this_lot, lot_cost_per_unit))
+            purchase_lots = temp_lots
+            current_quantity -= sell_quantity
+            total_investment -= cost_basis_of_sold_units
+            realized_pnl_asset += proceeds - cost_basis_of_sold_units
+    return current_quantity, total_investment, realized_pnl_asset
+
+
+def ledger_fifo(transactions):
+    from src.lots import replay
+    ledger = replay(transactions, engine="decimal") # LotLedger, sea cual sea LOT_ENGINE
+    return ledger.quantity, ledger.cost_basis, ledger.realized_pnl
+
+
+def to_scaled(transactions):
+    """Mismas transacciones con cantidad, precio y comisiones como enteros escalados (como las lee iter_ledgers)."""
+    from src.lots import to_fixed
+    return [SimpleNamespace(id=t.id, transaction_type=t.transaction_type, transaction_date=t.transaction_date,
+                            quantity=to_fixed(t.quantity), price_per_unit=to_fixed(t.price_per_unit),
+                            fees=to_fixed(t.fees)) for t in transactions]
+
+
+def fixed_fifo(scaled, record_matches: bool = False):
+    from src.lots import FixedLotLedger
+    ledger = FixedLotLedger(record_matches=record_matches)
+    for t in scaled:
+        ledger.apply_fixed(t)
+    return ledger
+
+
+def same_at_scale(decimal, fixed) -> bool:
+    """Libro Decimal redondeado a la escala de la BD frente al de enteros: totales, lotes y emparejamientos."""
+    from src.lots import RESULT_QUANTUM
+    q = lambda value: value.quantize(RESULT_QUANTUM)
+    totals = all(q(getattr(decimal, name)) == getattr(fixed, name) for name in ("quantity", "cost_basis", "realized_pnl"))
+    lots = [(l.transaction_id, q(l.quantity), q(l.cost_per_unit)) for l in decimal.lots] == \
+           [(l.transaction_id, l.quantity, l.cost_per_unit) for l in fixed.lots]
+    matches = decimal.matches is None or \
+              [(m.buy_transaction_id, m.sell_transaction_id, q(m.quantity), q(m.cost_basis), q(m.proceeds)) for m in decimal.matches] == \
+              [(m.buy_transaction_id, m.sell_transaction_id, m.quantity, m.cost_basis, m.proceeds) for m in fixed.matches]
+    return totals and lots and matches
+
+
+def make_transactions(n: int, sell_ratio: float, seed: int = 42):
+    """Historial en memoria de un activo con la misma distribución que common.generate_ledger."""
+    from src import models
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    open_qty = Decimal(0)
+    transactions = []
+    for j in range(n):
+        price = Decimal(rng.randint(1000, 50000)) / 100
+        if open_qty > 1 and rng.random() < sell_ratio:
+            qty = min(open_qty, Decimal(rng.randint(1, 40)) / 4)
+            tx_type = models.TransactionType.SELL
+            open_qty -= qty
+        else:
+            qty = Decimal(rng.randint(1, 80)) / 4
+            tx_type = models.TransactionType.BUY
+            open_qty += qty
+        transactions.append(SimpleNamespace(id=j + 1, transaction_type=tx_type, quantity=qty, price_per_unit=price,
+                                            transaction_date=start + timedelta(minutes=37 * j),
+                                            fees=Decimal(rng.randint(0, 300)) / 100))
+    return transactions
+
+
+def check_database(assets: int, tx: int) -> bool:
+    """get_open_positions (LotLedger) frente al bucle anterior sobre una BD generada."""
+    common.reset_schema()
+    from src.database import SessionLocal
+    from src import crud
+    from src.positions import DRIFT_TOLERANCE
+
+    db = SessionLocal()
+    try:
+        user = common.make_user(db)
+        common.generate_ledger(db, user.id, assets, tx, sell_ratio=0.45)
+        positions = {asset.id: (qty, cost) for asset, qty, cost in crud.get_open_positions(db, user.id)}
+        for asset in crud.get_assets_by_user(db, owner_id=user.id, limit=10000):
+            qty, cost, _ = legacy_fifo(crud.get_transactions_by_asset(db, asset.id, user.id))
+            expected = (qty, cost) if qty > crud.ZERO_TOLERANCE else None
+            got = positions.get(asset.id)
+            # Las posiciones se leen de la tabla positions (Numeric guardado como REAL en SQLite)
+            if (got is None) != (expected is None) or (got is not None and any(
+                    abs(g - e) > DRIFT_TOLERANCE for g, e in zip(got, expected))):
+                print(f"  DIFERENCIA en {asset.symbol}: {got} != {expected}")
+                return False
+        return True
+    finally:
+        db.close()
+
+
+def check_replay_engines(assets: int, tx: int) -> bool:
+    """Replay desde la BD (positions.iter_ledgers) con el motor Decimal y con el de enteros."""
+    common.reset_schema()
+    from src.database import SessionLocal
+    from src.positions import iter_ledgers
+
+    db = SessionLocal()
+    try:
+        user = common.make_user(db)
+        common.generate_ledger(db, user.id, assets, tx, sell_ratio=0.45)
+        ledgers, times = {}, {}
+        for engine in ("decimal", "fixed"):
+            with common.Timer() as t:
+                ledgers[engine] = {asset_id: ledger for _, asset_id, ledger in
+                                   iter_ledgers(db, user.id, record_matches=True, engine=engine)}
+                for ledger in ledgers[engine].values():
+                    ledger.quantity, ledger.cost_basis, ledger.realized_pnl
+            times[engine] = t.elapsed
+        same = ledgers["decimal"].keys() == ledgers["fixed"].keys() and all(
+            same_at_scale(ledgers["decimal"][k], ledgers["fixed"][k]) for k in ledgers["decimal"])
+        print(f"Replay desde la BD ({assets} activos x {tx} tx): Decimal {times['decimal']:.3f}s, "
+              f"enteros {times['fixed']:.3f}s ({times['decimal'] / times['fixed']:.1f}x), "
+              f"{'iguales' if same else 'DIFERENTES'} a 10 decimales")
+        return same
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del libro de lotes FIFO frente al bucle anterior.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Transacciones por activo (separadas por comas)")
+    parser.add_argument("--sell-ratio", type=float, default=0.3, help="Proporción de ventas")
+    parser.add_argument("--legacy-max", type=int, default=30000,
+                        help="No ejecutar el bucle anterior por encima de este tamaño (es cuadrático)")
+    parser.add_argument("--db-assets", type=int, default=20, help="Activos para la verificación sobre BD")
+    parser.add_argument("--db-tx", type=int, default=300, help="Transacciones por activo en la verificación sobre BD")
+    parser.add_argument("--replay-assets", type=int, default=50, help="Activos para el replay desde la BD por motor")
+    parser.add_argument("--replay-tx", type=int, default=4000, help="Transacciones por activo en el replay desde la BD")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    from src.lots import replay
+    ok = True
+    print(f"{'transacciones':>13} {'lotes abiertos':>15} {'anterior (s)':>13} {'deque (s)':>10} {'mejora':>8}  iguales"
+          f" {'enteros (s)':>12} {'mejora':>8}  iguales")
+    for size in (int(s) for s in args.sizes.split(",")):
+        transactions = make_transactions(size, args.sell_ratio)
+        with common.Timer() as t_new:
+            new = ledger_fifo(transactions)
+        scaled = to_scaled(transactions)
+        with common.Timer() as t_fixed:
+            fixed = fixed_fifo(scaled)
+            fixed.quantity, fixed.cost_basis, fixed.realized_pnl
+        fixed_same = same_at_scale(replay(transactions, record_matches=True), fixed_fifo(scaled, record_matches=True))
+        ok &= fixed_same
+        fixed_cols = f" {t_fixed.elapsed:>12.3f} {t_new.elapsed / t_fixed.elapsed:>7.1f}x  {'sí' if fixed_same else 'NO'}"
+        open_lots = len(replay(transactions).lots)
+        if size <= args.legacy_max:
+            with common.Timer() as t_old:
+                old = legacy_fifo(transactions)
+            same = old == new
+            ok &= same
+            print(f"{size:>13} {open_lots:>15} {t_old.elapsed:>13.3f} {t_new.elapsed:>10.3f} "
+                  f"{t_old.elapsed / t_new.elapsed:>7.1f}x  {'sí' if same else 'NO':<7}" + fixed_cols)
+        else:
+            print(f"{size:>13} {open_lots:>15} {'-':>13} {t_new.elapsed:>10.3f} {'-':>8}  {'-':<7}" + fixed_cols)
+
+    db_ok = check_database(args.db_assets, args.db_tx)
+    print(f"get_open_positions frente al bucle anterior ({args.db_assets} activos x {args.db_tx} tx): "
+          f"{'iguales' if db_ok else 'DIFERENTES'}")
+    replay_ok = check_replay_engines(args.replay_assets, args.replay_tx)
+    raise SystemExit(0 if ok and db_ok and replay_ok else 1)
+
+
+if __name__ == "__main__":
+    main()
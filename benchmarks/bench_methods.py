@@ -0,0 +1,55 @@
+# benchmarks/bench_methods.py
+# --- Benchmark del motor de valoración con métodos de coste (FIFO/LIFO/HIFO/AVERAGE) ---
+# Genera un libro de transacciones sintético, mide el motor de valuation.py (enteros escalados) con
+# cada método y compara su resultado FIFO con las posiciones materializadas (positions.py).
+#
+# Uso: python benchmarks/bench_methods.py --assets 200 --tx 500
+import argparse
+import logging
+
+import common
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del motor de valoración por método de coste.")
+    parser.add_argument("--assets", type=int, default=200, help="Número de activos")
+    parser.add_argument("--tx", type=int, default=500, help="Transacciones por activo")
+    parser.add_argument("--sell-ratio", type=float, default=0.3, help="Proporción de ventas")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    common.reset_schema()
+    from src.database import SessionLocal
+    from src import crud, positions, valuation
+    from src.valuation import CostBasisMethod
+
+    db = SessionLocal()
+    user = common.make_user(db)
+    common.generate_ledger(db, user.id, args.assets, args.tx, sell_ratio=args.sell_ratio)
+    total_tx = args.assets * args.tx
+
+    with common.Timer() as t:
+        transactions = valuation.load_transactions(db, user.id)
+    print(f"Carga: {total_tx:,} transacciones en {t.elapsed:.3f}s")
+    print(f"{'método':>8} {'tiempo (s)':>11} {'tx/s':>12} {'coste abierto':>16} {'P&L realizado':>16}")
+    summary = valuation.compare_methods(db, user.id)
+    for method in CostBasisMethod:
+        with common.Timer() as t:
+            valuation.compute_positions(transactions, method)
+        print(f"{method.value:>8} {t.elapsed:>11.3f} {total_tx / t.elapsed:>12,.0f} "
+              f"{summary[method]['open_cost_basis']:>16,.2f} {summary[method]['realized_pnl']:>16,.2f}")
+
+    # FIFO del motor frente a las posiciones materializadas (replay con LOT_ENGINE)
+    with common.Timer() as t:
+        materialized = {asset.id: (qty, cost) for asset, qty, cost in crud.get_open_positions(db, user.id, CostBasisMethod.FIFO)}
+    engine = {asset.id: (qty, cost) for asset, qty, cost in valuation.get_open_positions(db, user.id, CostBasisMethod.FIFO)}
+    same = materialized.keys() == engine.keys() and all(
+        abs(materialized[k][0] - engine[k][0]) <= positions.DRIFT_TOLERANCE and
+        abs(materialized[k][1] - engine[k][1]) <= positions.DRIFT_TOLERANCE * max(1, abs(materialized[k][1]))
+        for k in materialized)
+    print(f"FIFO del motor frente a la tabla positions ({len(materialized)} posiciones abiertas): "
+          f"{'iguales' if same else 'DIFERENTES'}")
+    db.close()
+    raise SystemExit(0 if same else 1)
+
+if __name__ == "__main__":
+    main()
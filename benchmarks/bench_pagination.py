@@ -0,0 +1,64 @@
+# benchmarks/bench_pagination.py
+# --- Benchmark de la paginación del historial de transacciones ---
+# Compara, a distintas profundidades, el coste de pedir una página con offset/limit
+# (get_transactions_for_user) y con cursor (fecha, id) (get_transactions_page). Con offset
+# el coste crece con la profundidad; con cursor debe mantenerse constante. Comprueba además
+# que recorrer todo el historial por cursor devuelve las mismas filas y en el mismo orden.
+#
+# Uso: python benchmarks/bench_pagination.py --assets 100 --tx 2000 --page 100
+import argparse
+import logging
+
+import common
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de paginación por offset frente a cursor.")
+    parser.add_argument("--assets", type=int, default=100, help="Número de activos")
+    parser.add_argument("--tx", type=int, default=2000, help="Transacciones por activo")
+    parser.add_argument("--page", type=int, default=100, help="Filas por página")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por profundidad")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    common.reset_schema()
+    from src.database import SessionLocal
+    from src import crud
+
+    db = SessionLocal()
+    user = common.make_user(db)
+    common.generate_ledger(db, user.id, args.assets, args.tx)
+    total = args.assets * args.tx
+    print(f"Datos: {total:,} transacciones, páginas de {args.page}")
+
+    # Cursores de todas las páginas (recorrido completo) y comprobación frente al orden por offset
+    cursors, ids, cursor = [None], [], None
+    with common.Timer() as t_walk:
+        while True:
+            page, cursor = crud.get_transactions_page(db, user.id, cursor, limit=args.page)
+            ids.extend(tx.id for tx in page)
+            db.expunge_all()
+            if cursor is None:
+                break
+            cursors.append(cursor)
+    print(f"Recorrido completo por cursor: {len(cursors)} páginas en {t_walk.elapsed:.2f}s")
+
+    print(f"{'página':>8} {'offset (ms)':>12} {'cursor (ms)':>12}")
+    for index in sorted({0, len(cursors) // 10, len(cursors) // 2, len(cursors) - 1}):
+        with common.Timer() as t_offset:
+            for _ in range(args.repeat):
+                crud.get_transactions_for_user(db, user.id, skip=index * args.page, limit=args.page)
+                db.expunge_all()
+        with common.Timer() as t_cursor:
+            for _ in range(args.repeat):
+                crud.get_transactions_page(db, user.id, cursors[index], limit=args.page)
+                db.expunge_all()
+        print(f"{index:>8} {t_offset.elapsed * 1000 / args.repeat:12.2f} {t_cursor.elapsed * 1000 / args.repeat:12.2f}")
+
+    expected = [tx.id for tx in crud.get_transactions_for_user(db, user.id, limit=None)]
+    same = ids == expected
+    print(f"Cursor frente a offset: {'mismas filas y orden' if same else 'DIFERENTES'}")
+    db.close()
+    raise SystemExit(0 if same else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# benchmarks/bench_queries.py
+# --- Comprobación del número de consultas al listar y modificar transacciones ---
+# Recorre páginas de distintos tamaños (get_transactions_page y get_transactions_for_user) y
+# lee tx.asset.symbol de cada fila, como hace la GUI: el número de sentencias debe ser el mismo
+# para cualquier tamaño de página (el activo llega en la misma consulta). Comprueba además que
+# update_transaction, delete_transaction y las posiciones abiertas no cargan los activos uno a uno
+# (SELECT ... FROM assets WHERE assets.id = ?) para leer el símbolo.
+#
+# Uso: python benchmarks/bench_queries.py --assets 50 --tx 40 --pages 10,50,200
+import argparse
+import logging
+import re
+
+import common
+
+# Firma de la carga perezosa de Transaction.asset / Position.asset
+LAZY_ASSET_LOAD = re.compile(r"FROM assets\s+WHERE assets\.id = \?")
+
+def count_page(db, fn) -> tuple[int, int]:
+    """Ejecuta fn() (que retorna transacciones), lee el símbolo de cada una y cuenta las sentencias."""
+    db.expunge_all()
+    with common.QueryCounter() as q:
+        rows = fn()
+        symbols = [tx.asset.symbol for tx in rows]
+    return q.count, len(symbols)
+
+def lazy_asset_loads(q) -> int:
+    return sum(1 for sql, _ in q.statements if LAZY_ASSET_LOAD.search(sql))
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprueba que una página de transacciones cuesta un número constante de consultas.")
+    parser.add_argument("--assets", type=int, default=50, help="Número de activos")
+    parser.add_argument("--tx", type=int, default=40, help="Transacciones por activo")
+    parser.add_argument("--pages", default="10,50,200", help="Tamaños de página, separados por comas")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    common.reset_schema()
+    from src.database import SessionLocal
+    from src import crud
+
+    db = SessionLocal()
+    user_id = common.make_user(db).id
+    common.generate_ledger(db, user_id, args.assets, args.tx)
+    sizes = [int(size) for size in args.pages.split(",")]
+    ok = True
+
+    print(f"{'filas':>8} {'cursor':>8} {'offset':>8}   (sentencias por página, leyendo tx.asset.symbol)")
+    counts = set()
+    for size in sizes:
+        by_cursor, n = count_page(db, lambda: crud.get_transactions_page(db, user_id, limit=size)[0])
+        by_offset, _ = count_page(db, lambda: crud.get_transactions_for_user(db, user_id, limit=size))
+        counts.update((by_cursor, by_offset))
+        print(f"{n:>8} {by_cursor:>8} {by_offset:>8}")
+    if len(counts) != 1:
+        print("El número de sentencias depende del tamaño de página (carga perezosa de activos)")
+        ok = False
+
+    # Caminos de modificación: el símbolo del log debe llegar con la transacción
+    tx = crud.get_transactions_page(db, user_id, limit=2)[0]
+    update_id, delete_id = tx[0].id, tx[1].id
+    db.expunge_all()
+    with common.QueryCounter() as q_update:
+        crud.update_transaction(db, update_id, user_id, {"notes": "revisada"})
+    db.expunge_all()
+    with common.QueryCounter() as q_delete:
+        crud.delete_transaction(db, delete_id, user_id)
+    db.expunge_all()
+    with common.QueryCounter() as q_positions:
+        open_positions = crud.get_open_positions(db, user_id)
+        [asset.symbol for asset, _, _ in open_positions]
+    for name, q in (("update_transaction", q_update), ("delete_transaction", q_delete),
+                    ("get_open_positions", q_positions)):
+        lazy = lazy_asset_loads(q)
+        print(f"{name}: {q.count} sentencias, {lazy} cargas perezosas de activos")
+        ok = ok and lazy == 0
+
+    db.close()
+    print("Resultado:", "OK" if ok else "FALLO")
+    raise SystemExit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
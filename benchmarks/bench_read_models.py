@@ -0,0 +1,94 @@
+# benchmarks/bench_read_models.py
+# --- Benchmark de los modelos de lectura (src/read_models.py) frente a objetos ORM ---
+# Carga el mismo historial como objetos Transaction (con su activo, get_transactions_for_user)
+# y como filas TransactionRow (read_models.get_transactions), y mide el tiempo y la memoria de
+# Python (tracemalloc: pico durante la carga y memoria retenida por el resultado), normalizados
+# a 100k filas. Comprueba que ambas lecturas dan los mismos valores, y que las posiciones
+# abiertas (crud.get_open_positions) coinciden con las de la tabla positions leídas por el ORM.
+#
+# Uso: python benchmarks/bench_read_models.py --assets 100 --tx 1000 --repeat 3
+import argparse
+import gc
+import logging
+import tracemalloc
+from decimal import Decimal
+
+import common
+
+def measure(db, fn, repeat: int) -> tuple[list, float, float, float]:
+    """Retorna (resultado, segundos, pico MB, retenido MB) de la mejor de 'repeat' ejecuciones."""
+    best = None
+    for _ in range(repeat):
+        db.expunge_all()
+        gc.collect()
+        with common.Timer() as t:
+            result = fn()
+        if best is None or t.elapsed < best:
+            best = t.elapsed
+        result = None
+    db.expunge_all()
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, best, peak / 1e6, retained / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de modelos de lectura frente a objetos ORM.")
+    parser.add_argument("--assets", type=int, default=100, help="Número de activos")
+    parser.add_argument("--tx", type=int, default=1000, help="Transacciones por activo")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones (se toma la mejor)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    common.reset_schema()
+    from src.database import SessionLocal
+    from src import crud, positions, read_models
+
+    db = SessionLocal()
+    user_id = common.make_user(db).id
+    common.generate_ledger(db, user_id, args.assets, args.tx)
+    total = args.assets * args.tx
+    scale = 100_000 / total
+    print(f"Datos: {total:,} transacciones (cifras por 100k filas)")
+
+    def orm_rows():
+        rows = crud.get_transactions_for_user(db, user_id, limit=None)
+        for tx in rows:
+            tx.asset.symbol
+        return rows
+
+    orm, orm_s, orm_peak, orm_kept = measure(db, orm_rows, args.repeat)
+    orm_values = [(tx.id, tx.transaction_date, tx.transaction_type, tx.quantity, tx.price_per_unit, tx.fees,
+                   tx.notes, tx.asset_id, tx.asset.symbol) for tx in orm]
+    del orm
+    light, light_s, light_peak, light_kept = measure(
+        db, lambda: read_models.get_transactions(db, user_id, limit=None), args.repeat)
+    light_values = [(tx.id, tx.transaction_date, tx.transaction_type, tx.quantity, tx.price_per_unit, tx.fees,
+                     tx.notes, tx.asset_id, tx.symbol) for tx in light]
+
+    print(f"{'':>14} {'tiempo (ms)':>12} {'pico (MB)':>10} {'retenido (MB)':>14}")
+    for name, seconds, peak, kept in (("ORM", orm_s, orm_peak, orm_kept),
+                                      ("TransactionRow", light_s, light_peak, light_kept)):
+        print(f"{name:>14} {seconds * 1000 * scale:12.1f} {peak * scale:10.1f} {kept * scale:14.1f}")
+    print(f"Mejora: {orm_s / light_s:.1f}x en tiempo, {orm_kept / light_kept:.1f}x en memoria retenida")
+    same_transactions = orm_values == light_values
+    print(f"Transacciones: {'mismos valores' if same_transactions else 'DIFERENTES'}")
+
+    # Posiciones abiertas: filas de lectura frente a la tabla positions vía ORM
+    db.expunge_all()
+    if positions.ensure_built(db, user_id):
+        db.commit()
+    expected = [(p.asset.id, p.asset.symbol, p.asset.asset_type, Decimal(p.quantity), Decimal(p.cost_basis))
+                for p in positions.get_positions(db, user_id)]
+    actual = [(asset.id, asset.symbol, asset.asset_type, quantity, cost_basis)
+              for asset, quantity, cost_basis in crud.get_open_positions(db, user_id)]
+    same_positions = expected == actual and all(isinstance(asset, read_models.AssetRow)
+                                                for asset, _, _ in crud.get_open_positions(db, user_id))
+    print(f"Posiciones abiertas ({len(actual)}): {'coinciden' if same_positions else 'DIFERENTES'}")
+    db.close()
+    raise SystemExit(0 if same_transactions and same_positions else 1)
+
+if __name__ == "__main__":
+    main()
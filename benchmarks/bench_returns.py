@@ -0,0 +1,90 @@
+# benchmarks/bench_returns.py
+# --- Benchmark de rentabilidades (TWR / XIRR) ---
+# Genera un libro de transacciones y cierres diarios sintéticos, calcula TWR y XIRR de todos
+# los activos y del portafolio para varios periodos (returns.get_returns) y compara el
+# resolvedor XIRR por lotes con un Newton escalar fila a fila sobre los mismos flujos.
+#
+# Uso: python benchmarks/bench_returns.py --assets 300 --tx 200 --periods 4
+import argparse
+import logging
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
+import common
+
+def scalar_xirr(amounts, years, guess=0.1, tolerance=1e-10, iterations=100):
+    """Newton clásico de una sola serie (referencia)."""
+    rate = guess
+    for _ in range(iterations):
+        npv = sum(a / (1 + rate) ** t for a, t in zip(amounts, years))
+        derivative = sum(-t * a / (1 + rate) ** (t + 1) for a, t in zip(amounts, years))
+        if derivative == 0:
+            return float("nan")
+        step = npv / derivative
+        rate = rate - step if rate - step > -1 else (rate - 1) / 2
+        if abs(step) < tolerance:
+            return rate
+    return float("nan")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de TWR/XIRR por lotes.")
+    parser.add_argument("--assets", type=int, default=300, help="Número de activos")
+    parser.add_argument("--tx", type=int, default=200, help="Transacciones por activo")
+    parser.add_argument("--periods", type=int, default=4, help="Número de periodos")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    common.reset_schema()
+    from src.database import SessionLocal
+    from src import models, returns
+
+    db = SessionLocal()
+    user = common.make_user(db)
+    symbols = common.generate_ledger(db, user.id, args.assets, args.tx)
+    # generate_ledger reparte las transacciones cada 37 minutos desde 2015-01-01
+    first = date(2015, 1, 1)
+    last = first + timedelta(minutes=37 * args.tx) + timedelta(days=365)
+    rng = random.Random(3)
+    bars = []
+    for symbol in symbols:
+        close = rng.uniform(10, 500)
+        day = first
+        while day <= last:
+            close *= 1 + rng.gauss(0.0003, 0.02)
+            bars.append({"symbol": symbol.upper(), "date": day, "open": close, "high": close, "low": close,
+                         "close": close, "volume": 0})
+            day += timedelta(days=1)
+    db.execute(models.PriceBar.__table__.insert(), bars)
+    db.commit()
+
+    span = (last - first).days
+    periods = [(first + timedelta(days=span * i // (2 * args.periods)), last) for i in range(args.periods)]
+    with common.Timer() as t:
+        results = returns.get_returns(db, user.id, periods)
+    solved = sum(1 for r in results for m in [r["portfolio"], *r["by_symbol"].values()] if m["xirr"] is not None)
+    print(f"get_returns: {args.periods} periodos x {args.assets} activos ({span} días) en {t.elapsed:.3f}s, "
+          f"{solved} XIRR resueltas")
+    for r in results:
+        print(f"  {r['start']}..{r['end']}: TWR {r['portfolio']['twr']:+.4%}  XIRR {r['portfolio']['xirr']:+.4%}")
+
+    # Resolvedor por lotes frente a Newton escalar sobre flujos aleatorios
+    n_rows, n_flows = args.assets * args.periods, 24
+    gen = np.random.default_rng(5)
+    amounts = -gen.uniform(10, 1000, (n_rows, n_flows))
+    amounts[:, -1] = -amounts[:, :-1].sum(axis=1) * gen.uniform(0.7, 1.6, n_rows)
+    years = np.tile(np.arange(n_flows) / 12.0, (n_rows, 1))
+    with common.Timer() as t_batch:
+        batch = returns.xirr_batch(amounts, years)
+    with common.Timer() as t_scalar:
+        scalar = np.array([scalar_xirr(a.tolist(), y.tolist()) for a, y in zip(amounts, years)])
+    same = np.allclose(batch, scalar, atol=1e-8, equal_nan=True)
+    print(f"XIRR {n_rows} series x {n_flows} flujos: lote {t_batch.elapsed:.4f}s, "
+          f"escalar {t_scalar.elapsed:.4f}s ({t_scalar.elapsed / t_batch.elapsed:.0f}x), "
+          f"{'iguales' if same else 'DIFERENTES'}")
+    db.close()
+    raise SystemExit(0 if same else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# benchmarks/bench_sqlite.py
+# --- Benchmark de los perfiles de SQLite (database.SQLITE_PROFILE) ---
+# Para cada perfil crea una BD nueva con create_db_engine y mide:
+#   - commits/s: altas de transacciones con crud.create_transaction (un commit cada una, como la GUI).
+#   - filas/s:   inserción en bloque de un historial (common.generate_ledger).
+#   - lecturas/s: consultas de la aplicación (transacciones por usuario y por activo, posiciones).
+#   - lecturas concurrentes: las que completa otro hilo mientras se hacen los commits, y los
+#     errores "database is locked" de ambos lados (con el journal de rollback lector y escritor
+#     se bloquean; con WAL no).
+# El coste del fsync depende del disco: con --dir se puede apuntar a un disco real en vez de al temporal.
+#
+# Uso: python benchmarks/bench_sqlite.py --commits 500 --reads 500 --profiles default,tuned
+import argparse
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+import common
+
+def run_profile(profile: str, path: str, args) -> dict:
+    from sqlalchemy.orm import sessionmaker
+    from src.database import Base, create_db_engine
+    from src import crud, models
+
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    engine = create_db_engine(f"sqlite:///{path}", profile)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = Session()
+    user = common.make_user(db)
+    result = {}
+
+    with common.Timer() as t:
+        common.generate_ledger(db, user.id, args.assets, args.tx)
+    result["filas/s"] = args.assets * args.tx / t.elapsed
+    asset = db.query(models.Asset).filter(models.Asset.owner_id == user.id).first()
+    crud.positions.rebuild_user(db, user.id)
+    db.commit()
+
+    # Un lector en otro hilo (otra conexión) mientras este hilo hace commits
+    stop = threading.Event()
+    concurrent = {"reads": 0, "read_errors": 0, "write_errors": 0}
+    def reader():
+        reader_db = Session()
+        while not stop.is_set():
+            try:
+                crud.get_transactions_for_user(reader_db, user.id)
+                concurrent["reads"] += 1
+            except Exception:
+                concurrent["read_errors"] += 1
+            reader_db.rollback() # Cierra la transacción de lectura
+            time.sleep(args.read_interval)
+        reader_db.close()
+    thread = threading.Thread(target=reader)
+    thread.start()
+    start = datetime(2030, 1, 1)
+    with common.Timer() as t:
+        for i in range(args.commits):
+            try:
+                crud.create_transaction(db, user.id, asset.id, models.TransactionType.BUY, 1, 100,
+                                        start + timedelta(minutes=i))
+            except Exception: # create_transaction ya hace rollback
+                concurrent["write_errors"] += 1
+    stop.set()
+    thread.join()
+    result["commits/s"] = args.commits / t.elapsed
+    result["lecturas concurrentes/s"] = concurrent["reads"] / t.elapsed
+    result["errores de lectura"] = concurrent["read_errors"]
+    result["errores de escritura"] = concurrent["write_errors"]
+
+    with common.Timer() as t:
+        for _ in range(args.reads):
+            crud.position_cache.invalidate()
+            crud.get_transactions_for_user(db, user.id)
+            crud.get_transactions_by_asset(db, asset.id, user.id)
+            crud.get_open_positions(db, user.id)
+    result["lecturas/s"] = 3 * args.reads / t.elapsed
+
+    connection = db.connection()
+    result["journal_mode"] = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+    db.close()
+    engine.dispose()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los perfiles de SQLite.")
+    parser.add_argument("--profiles", default="default,tuned", help="Perfiles a comparar, separados por comas")
+    parser.add_argument("--commits", type=int, default=500, help="Transacciones creadas con un commit cada una")
+    parser.add_argument("--reads", type=int, default=500, help="Iteraciones de lectura")
+    parser.add_argument("--assets", type=int, default=50, help="Activos del historial inicial")
+    parser.add_argument("--tx", type=int, default=200, help="Transacciones por activo del historial inicial")
+    parser.add_argument("--read-interval", type=float, default=0.005, help="Pausa (s) entre lecturas del hilo concurrente")
+    parser.add_argument("--dir", default=common.WORK_DIR, help="Directorio de las BDs de prueba")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    results = {profile: run_profile(profile, os.path.join(args.dir, f"bench_{profile}.db"), args)
+               for profile in args.profiles.split(",")}
+
+    profiles = list(results)
+    print(f"{'':<24}" + "".join(f"{p:>14}" for p in profiles))
+    for metric in results[profiles[0]]:
+        cells = [results[p][metric] for p in profiles]
+        print(f"{metric:<24}" + "".join(f"{c:>14,.0f}" if isinstance(c, float) else f"{c!s:>14}" for c in cells))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+# benchmarks/bench_valuation.py
+# --- Benchmark de valoración del portafolio sin red ---
+# Genera un libro de transacciones sintético, sirve los precios con FixtureProvider
+# (con latencia simulada) y mide el replay del historial y get_portfolio_performance en
+# frío y en caliente, junto con el número de consultas SQL de lectura.
+#
+# Uso: python benchmarks/bench_valuation.py --assets 60 --tx 200 --latency 0.25
+import argparse
+import logging
+from datetime import date
+
+import common
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de valoración con proveedor de precios offline.")
+    parser.add_argument("--assets", type=int, default=60, help="Número de activos")
+    parser.add_argument("--tx", type=int, default=200, help="Transacciones por activo")
+    parser.add_argument("--latency", type=float, default=0.25, help="Latencia simulada por cotización (s)")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones en caliente")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    common.reset_schema()
+    from src.database import SessionLocal
+    from src.providers import FixtureProvider
+    from src import crud, models, positions
+
+    db = SessionLocal()
+    user = common.make_user(db)
+    with common.Timer() as t:
+        symbols = common.generate_ledger(db, user.id, args.assets, args.tx)
+    print(f"Datos: {args.assets} activos x {args.tx} transacciones generados en {t.elapsed:.2f}s")
+
+    crud.set_price_provider(FixtureProvider(common.write_quote_fixture(symbols), latency=args.latency))
+    db.query(models.QuoteCacheEntry).delete()
+    db.commit()
+
+    total_tx = args.assets * args.tx
+    # Los datos se cargaron sin pasar por crud: se materializan las posiciones replicando
+    # todo el historial (una sola consulta en streaming, sin importar el número de activos)
+    with common.Timer() as t, common.QueryCounter() as q:
+        positions.rebuild_user(db, user.id)
+        db.commit()
+    print(f"Replay:   {t.elapsed:.3f}s  ({total_tx / t.elapsed:,.0f} tx/s, {q.selects} consultas de lectura)")
+
+    # Ganancias realizadas de un año: lectura por rango de lot_matches, sin replay
+    with common.Timer() as t, common.QueryCounter() as q:
+        gains = crud.get_realized_gains(db, user.id, date(2015, 1, 1), date(2015, 12, 31))
+    print(f"Realizado 2015: {t.elapsed:.3f}s  ({len(gains['by_symbol'])} activos, {q.selects} consultas de lectura)")
+
+    with common.Timer() as t, common.QueryCounter() as q:
+        portfolio = crud.get_portfolio_performance(db, user_id=user.id)
+    print(f"Frío:     {t.elapsed:.3f}s  ({len(portfolio)} posiciones, {q.selects} consultas de lectura, incluida la caché de cotizaciones)")
+
+    for i in range(args.repeat):
+        with common.Timer() as t, common.QueryCounter() as q:
+            crud.get_portfolio_performance(db, user_id=user.id)
+        print(f"Caliente: {t.elapsed:.3f}s  ({len(portfolio) / t.elapsed:,.0f} posiciones/s, {q.selects} consultas de lectura)")
+
+    print(f"Caché: {crud.quote_cache.stats()}")
+    db.close()
+
+if __name__ == "__main__":
+    main()
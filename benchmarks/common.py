@@ -0,0 +1,119 @@
+# benchmarks/common.py
+# --- Utilidades compartidas por los benchmarks ---
+# Cada benchmark trabaja sobre una BD SQLite temporal: DATABASE_URL se fija ANTES de
+# importar el paquete 'src' para que database.engine apunte a ella y no a portfolio.db.
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+WORK_DIR = tempfile.mkdtemp(prefix="portfolio_bench_")
+BENCH_DB_PATH = os.path.join(WORK_DIR, "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{BENCH_DB_PATH}")
+
+
+def reset_schema():
+    """Crea el esquema completo desde los modelos sobre una BD vacía."""
+    from src.database import Base, engine
+    from src import models # noqa: F401 (registra los modelos en Base.metadata)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    return engine
+
+
+def make_user(db, username: str = "bench"):
+    from src import models
+    user = models.User(username=username, email=f"{username}@bench.local", hashed_password="x")
+    db.add(user)
+    db.commit()
+    return user
+
+
+def generate_ledger(db, owner_id: int, n_assets: int, tx_per_asset: int, sell_ratio: float = 0.3, seed: int = 42):
+    """
+    Inserta (en bloque) 'n_assets' activos con 'tx_per_asset' transacciones cada uno.
+    Las ventas nunca superan la cantidad abierta. Retorna la lista de símbolos.
+    """
+    from src import models
+    rng = random.Random(seed)
+    start = datetime(2015, 1, 1)
+    symbols = []
+    asset_rows = [{"symbol": f"SYM{owner_id}_{i:05d}", "name": f"Activo {i}",
+                   "asset_type": models.AssetType.STOCK, "owner_id": owner_id} for i in range(n_assets)]
+    db.execute(models.Asset.__table__.insert(), asset_rows)
+    assets = db.query(models.Asset.id, models.Asset.symbol).filter(models.Asset.owner_id == owner_id).all()
+
+    for asset_id, symbol in assets:
+        symbols.append(symbol)
+        open_qty = Decimal(0)
+        rows = []
+        for j in range(tx_per_asset):
+            when = start + timedelta(minutes=37 * j)
+            price = Decimal(rng.randint(1000, 50000)) / 100
+            if open_qty > 1 and rng.random() < sell_ratio:
+                qty = min(open_qty, Decimal(rng.randint(1, 40)) / 4)
+                tx_type = models.TransactionType.SELL
+                open_qty -= qty
+            else:
+                qty = Decimal(rng.randint(1, 80)) / 4
+                tx_type = models.TransactionType.BUY
+                open_qty += qty
+            rows.append({"transaction_type": tx_type, "quantity": qty, "price_per_unit": price,
+                         "transaction_date": when, "fees": Decimal(rng.randint(0, 300)) / 100,
+                         "asset_id": asset_id, "owner_id": owner_id})
+        db.execute(models.Transaction.__table__.insert(), rows)
+    db.commit()
+    return symbols
+
+
+def write_quote_fixture(symbols, path: str | None = None, seed: int = 7) -> str:
+    """Escribe un fichero JSON de cotizaciones para FixtureProvider."""
+    rng = random.Random(seed)
+    path = path or os.path.join(WORK_DIR, "quotes.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({s: str(Decimal(rng.randint(1000, 50000)) / 100) for s in symbols}, f)
+    return path
+
+
+class Timer:
+    """Context manager sencillo: 'with Timer() as t: ...' y luego t.elapsed (segundos)."""
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+class QueryCounter:
+    """
+    Cuenta las sentencias SQL ejecutadas por el engine dentro del bloque:
+    'with QueryCounter() as q: ...' y luego q.count (o q.selects, solo lecturas).
+    q.statements guarda (sql, parámetros) de cada sentencia, p.ej. para pedir su EXPLAIN.
+    """
+    def __enter__(self):
+        from sqlalchemy import event
+        from src.database import engine
+        self.count = self.selects = 0
+        self.statements = []
+        self._engine = engine
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+        return self
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+        self.statements.append((statement, parameters))
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.selects += 1
+
+    def __exit__(self, *exc):
+        from sqlalchemy import event
+        event.remove(self._engine, "before_cursor_execute", self._on_execute)
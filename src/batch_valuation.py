@@ -0,0 +1,180 @@
+# src/batch_valuation.py
+# --- Valoración en lote de todos los usuarios (sin GUI) ---
+# Etapas de una ejecución:
+#   1. users:     usuarios a valorar.
+#   2. symbols:   una sola consulta con los símbolos de todas las carteras, sin duplicados
+#                 (el mismo símbolo en varias carteras se pide una vez).
+#   3. prices:    precios actuales de esos símbolos en lote (crud.get_current_prices, con caché).
+#   4. valuation: los usuarios se reparten en bloques entre un pool de procesos; cada proceso
+#                 abre su propia sesión y valora su bloque con el diccionario de precios que
+#                 recibe al arrancar. Las posiciones se leen de la tabla positions (una consulta
+#                 por bloque); los usuarios sin posiciones materializadas se reproducen desde sus
+#                 transacciones en el propio proceso (otra consulta por bloque), solo con lecturas:
+#                 SQLite admite un único escritor, así que el pool nunca escribe.
+#   5. write:     inserción en bloque de una fila por usuario en valuation_snapshots.
+# Retorna (y registra) los tiempos por etapa y el rendimiento en usuarios/s.
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+import logging
+import os
+import time
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal, engine
+from .lots import ZERO_TOLERANCE
+from .positions import iter_ledgers
+
+# Procesos del pool de valoración (0 = uno por CPU) y usuarios por tarea
+BATCH_VALUATION_WORKERS = int(os.getenv("BATCH_VALUATION_WORKERS", "0"))
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "200"))
+
+# Precios de la ejecución en curso dentro de cada proceso del pool (ver _init_worker)
+_worker_prices: dict[str, Decimal | None] = {}
+
+
+def _init_worker(prices: dict[str, Decimal | None]):
+    global _worker_prices
+    _worker_prices = prices
+    # Las conexiones heredadas del proceso padre no se comparten: cada proceso abre las suyas
+    engine.dispose(close=False)
+
+def _value_chunk(user_ids: list[int]) -> list[dict]:
+    db = SessionLocal()
+    try:
+        return value_users(db, user_ids, _worker_prices)
+    finally:
+        db.close()
+
+def value_users(db: Session, user_ids: list[int], prices: dict[str, Decimal | None]) -> list[dict]:
+    """
+    Valora las posiciones abiertas de varios usuarios: las materializadas con una sola consulta
+    y las de los usuarios sin posiciones materializadas reproduciendo su historial (sin escribir).
+    'prices' va indexado por símbolo en mayúsculas. Retorna una fila por usuario.
+    """
+    totals = {user_id: {"owner_id": user_id, "market_value": Decimal(0), "cost_basis": Decimal(0),
+                        "positions": 0, "missing_prices": 0} for user_id in user_ids}
+
+    def add(owner_id: int, symbol: str, quantity: Decimal, cost_basis: Decimal):
+        row = totals[owner_id]
+        row["positions"] += 1
+        row["cost_basis"] += cost_basis
+        price = prices.get(symbol.upper())
+        if price is None:
+            row["missing_prices"] += 1
+            row["market_value"] += cost_basis
+        else:
+            row["market_value"] += quantity * price
+
+    built = set()
+    rows = db.query(models.Position.owner_id, models.Position.quantity, models.Position.cost_basis, models.Asset.symbol)\
+             .join(models.Asset, models.Asset.id == models.Position.asset_id)\
+             .filter(models.Position.owner_id.in_(user_ids))
+    for owner_id, quantity, cost_basis, symbol in rows:
+        built.add(owner_id) # Las posiciones cerradas también cuentan como materializadas
+        if quantity > ZERO_TOLERANCE:
+            add(owner_id, symbol, quantity, cost_basis)
+
+    pending = [user_id for user_id in user_ids if user_id not in built]
+    if pending:
+        symbols = dict(db.query(models.Asset.id, models.Asset.symbol).filter(models.Asset.owner_id.in_(pending)))
+        for user_id, asset_id, ledger in iter_ledgers(db, owner_ids=pending):
+            if ledger.is_open():
+                add(user_id, symbols[asset_id], ledger.quantity, ledger.cost_basis)
+    for row in totals.values():
+        row["unrealized_pnl"] = row["market_value"] - row["cost_basis"]
+    return list(totals.values())
+
+def run(db: Session, workers: int | None = None, chunk_size: int | None = None) -> dict:
+    """
+    Valora a todos los usuarios y guarda el resultado en valuation_snapshots. Hace commit.
+    Retorna {"run_at", "users", "symbols", "seconds", "users_per_second", "stages": {etapa: segundos}}.
+    """
+    from .crud import get_current_prices # Import diferido: crud carga el proveedor de precios
+
+    workers = workers or BATCH_VALUATION_WORKERS or os.cpu_count() or 1
+    chunk_size = chunk_size or BATCH_CHUNK_SIZE
+    if workers < 1 or chunk_size < 1:
+        raise ValueError("El número de procesos y el tamaño de bloque deben ser positivos.")
+    run_at = datetime.now()
+    stages: dict[str, float] = {}
+    started = stage_start = time.perf_counter()
+
+    def end_stage(name: str):
+        nonlocal stage_start
+        now = time.perf_counter()
+        stages[name] = now - stage_start
+        stage_start = now
+
+    user_ids = [user_id for (user_id,) in db.query(models.User.id).order_by(models.User.id)]
+    end_stage("users")
+
+    # Activos con posición abierta, más todos los de los usuarios sin posiciones materializadas
+    open_assets = db.query(models.Position.asset_id).filter(models.Position.quantity > ZERO_TOLERANCE)
+    built = db.query(models.Position.owner_id).distinct()
+    symbols = db.query(func.upper(models.Asset.symbol), func.min(models.Asset.asset_type))\
+                .filter(or_(models.Asset.id.in_(open_assets), models.Asset.owner_id.notin_(built)))\
+                .group_by(func.upper(models.Asset.symbol)).all()
+    end_stage("symbols")
+
+    prices = get_current_prices([symbol for symbol, _ in symbols], asset_types=dict(symbols))
+    end_stage("prices")
+
+    chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+    rows = []
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            rows.extend(value_users(db, chunk, prices))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=_init_worker,
+                                 initargs=(prices,)) as executor:
+            for chunk_rows in executor.map(_value_chunk, chunks):
+                rows.extend(chunk_rows)
+    end_stage("valuation")
+
+    try:
+        if rows:
+            db.execute(models.ValuationSnapshot.__table__.insert(), [dict(row, run_at=run_at) for row in rows])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error al guardar la valoración en lote: {e}", exc_info=True)
+        raise
+    end_stage("write")
+
+    seconds = time.perf_counter() - started
+    stats = {"run_at": run_at, "users": len(user_ids), "symbols": len(symbols), "seconds": seconds,
+             "users_per_second": len(user_ids) / seconds if seconds > 0 else 0.0, "stages": stages}
+    logging.info(f"Valoración en lote: {len(user_ids)} usuarios, {len(symbols)} símbolos en {seconds:.2f}s "
+                 f"({stats['users_per_second']:.0f} usuarios/s). Etapas: "
+                 + ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in stages.items()))
+    return stats
+
+def get_latest(db: Session, user_id: int) -> models.ValuationSnapshot | None:
+    """Última valoración en lote guardada de un usuario."""
+    return db.query(models.ValuationSnapshot).filter(models.ValuationSnapshot.owner_id == user_id)\
+             .order_by(models.ValuationSnapshot.run_at.desc()).first()
+
+
+# --- Uso desde línea de comandos ---
+# python -m src.batch_valuation [--workers N] [--chunk-size N]
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Valora el portafolio de todos los usuarios (valuation_snapshots).")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos del pool (por defecto BATCH_VALUATION_WORKERS o uno por CPU)")
+    parser.add_argument("--chunk-size", type=int, default=None, help="Usuarios por tarea (por defecto BATCH_CHUNK_SIZE)")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        stats = run(session, args.workers, args.chunk_size)
+    finally:
+        session.close()
+    print(f"{stats['users']} usuarios, {stats['symbols']} símbolos en {stats['seconds']:.2f}s "
+          f"({stats['users_per_second']:.0f} usuarios/s)")
+    for name, elapsed in stats["stages"].items():
+        print(f"  {name:<10} {elapsed:8.3f}s")
@@ -1,15 +1,24 @@
 # src/crud.py
 # --- Importaciones ---
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, contains_eager, joinedload
 from sqlalchemy import func, desc, asc, case
 from . import models
+from .quote_cache import QuoteCache
+from .position_cache import PositionCache
+from .providers import PriceProvider, get_price_provider
+from .lots import ZERO_TOLERANCE
+from . import positions, read_models, returns, snapshots, valuation
+from .read_models import AssetRow, TransactionCursor, TransactionRow
+from .valuation import CostBasisMethod
 # Asegúrate de que passlib esté instalado en tu venv: pip install "passlib[bcrypt]"
 from passlib.context import CryptContext
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP, getcontext
-import yfinance as yf
 import logging # Asegúrate de que logging esté importado
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # --- Configuración ---
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -19,7 +28,13 @@ DATABASE_URL = f"sqlite:///{os.path.join(BASE_DIR, 'portfolio.db')}"
 # getcontext().prec = 28
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-ZERO_TOLERANCE = Decimal('1e-9')
+
+# Obtención de precios en lote: número máximo de peticiones simultáneas al proveedor
+# y presupuesto total de tiempo (segundos) para resolver todos los símbolos.
+PRICE_FETCH_MAX_WORKERS = int(os.getenv("PRICE_FETCH_MAX_WORKERS", "8"))
+PRICE_FETCH_TIMEOUT = float(os.getenv("PRICE_FETCH_TIMEOUT", "20"))
+# Ganancias realizadas: a partir de cuántos días de tenencia se consideran a largo plazo
+LONG_TERM_HOLDING_DAYS = 365
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -32,46 +47,107 @@ def get_password_hash(password):
     # Asegúrate de que pwd_context esté definido antes de esta línea
     return pwd_context.hash(password)
 
-def get_current_price(symbol: str) -> Decimal | None:
+# Proveedor de precios activo (yfinance por defecto; configurable con PRICE_PROVIDER)
+price_provider: PriceProvider = get_price_provider()
+
+def set_price_provider(provider: PriceProvider):
+    """Sustituye el proveedor de precios activo y vacía la caché en memoria."""
+    global price_provider
+    price_provider = provider
+    quote_cache.invalidate()
+    logging.info(f"Proveedor de precios activo: {provider!r}")
+
+def fetch_quote(symbol: str) -> tuple[Decimal | None, str | None]:
+    """
+    Obtiene el precio actual de un símbolo directamente del proveedor activo (sin caché).
+    Retorna (precio, fuente) o (None, None) si falla.
+    """
+    return price_provider.get_quote(symbol)
+
+# Caché de cotizaciones (memoria + tabla quote_cache) delante del proveedor
+quote_cache = QuoteCache(fetcher=fetch_quote)
+# Posiciones abiertas por (usuario, método) etiquetadas con users.data_version (ver position_cache.py)
+position_cache = PositionCache()
+
+def get_current_price(symbol: str, asset_type: models.AssetType | None = None) -> Decimal | None:
     """
-    Obtiene el precio de mercado actual para un símbolo usando yfinance.
-    Intenta con fast_info y luego con history.
+    Obtiene el precio de mercado actual para un símbolo a través de la caché de cotizaciones.
+    El TTL depende de 'asset_type'; un valor caducado se devuelve al momento y se refresca en segundo plano.
     Retorna Decimal o None si falla.
     """
-    try:
-        ticker = yf.Ticker(symbol)
-        last_price = ticker.fast_info.get('last_price')
-        if last_price is not None:
-            try:
-                price_dec = Decimal(str(last_price))
-                logging.info(f"Precio actual (fast_info) para {symbol}: {price_dec}")
-                return price_dec
-            except InvalidOperation:
-                logging.warning(f"Valor 'last_price' de fast_info no es un número válido para {symbol}: {last_price}")
-
-        logging.warning(f"No se pudo obtener 'last_price' válido de fast_info para {symbol}. Intentando con history.")
-        hist = ticker.history(period="1d")
-        if not hist.empty and 'Close' in hist.columns:
-            last_close_price = hist['Close'].iloc[-1]
-            try:
-                price_dec = Decimal(str(last_close_price))
-                logging.info(f"Precio actual (history close) para {symbol}: {price_dec}")
-                return price_dec
-            except InvalidOperation:
-                 logging.error(f"Valor 'Close' de history no es un número válido para {symbol}: {last_close_price}")
-                 return None
-        else:
-            logging.warning(f"No se encontró precio actual para {symbol} usando yfinance (ni fast_info ni history).")
-            return None
+    return quote_cache.get(symbol, asset_type)
 
-    except Exception as e:
-        logging.error(f"Excepción al obtener precio para {symbol} con yfinance: {e}", exc_info=True)
-        return None
+def iter_current_prices(symbols, asset_types: dict[str, models.AssetType] | None = None,
+                        max_workers: int | None = None, timeout: float | None = None,
+                        cancel_event: threading.Event | None = None):
+    """
+    Generador que obtiene los precios de varios símbolos a la vez (pasando por la caché)
+    y produce (símbolo, precio) a medida que cada uno se resuelve.
+    Las peticiones se reparten en un pool de hilos acotado y el conjunto completo
+    debe resolverse dentro de 'timeout' segundos; los símbolos que no respondan
+    a tiempo (o fallen) se producen con precio None.
+    Si se activa 'cancel_event' el generador termina sin producir los pendientes.
+    """
+    unique_symbols = list(dict.fromkeys(s for s in symbols if s))
+    if not unique_symbols:
+        return
+
+    max_workers = max_workers or PRICE_FETCH_MAX_WORKERS
+    timeout = PRICE_FETCH_TIMEOUT if timeout is None else timeout
+    asset_types = asset_types or {}
+    start = time.monotonic()
+    resolved = 0
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(unique_symbols)), thread_name_prefix="price-fetch")
+    try:
+        futures = {executor.submit(get_current_price, symbol, asset_types.get(symbol)): symbol for symbol in unique_symbols}
+        pending = set(futures)
+        while pending:
+            if cancel_event is not None and cancel_event.is_set():
+                logging.info(f"Obtención de precios cancelada con {len(pending)} símbolos pendientes.")
+                return
+            remaining = timeout - (time.monotonic() - start)
+            if remaining <= 0:
+                break
+            # Esperas cortas para poder atender la cancelación
+            done, pending = wait(pending, timeout=min(remaining, 0.2), return_when=FIRST_COMPLETED)
+            for future in done:
+                symbol = futures[future]
+                try:
+                    price = future.result()
+                except Exception as e:
+                    logging.error(f"Error inesperado al obtener precio en lote para {symbol}: {e}")
+                    price = None
+                if price is not None: resolved += 1
+                yield symbol, price
+        if pending:
+            missing = sorted(futures[f] for f in pending)
+            logging.warning(f"Presupuesto de {timeout:.1f}s agotado al obtener precios. Sin precio para: {', '.join(missing)}")
+            for symbol in missing:
+                yield symbol, None
+    finally:
+        # No esperar a los hilos rezagados: su resultado se descarta.
+        executor.shutdown(wait=False, cancel_futures=True)
+        elapsed = time.monotonic() - start
+        logging.info(f"Precios en lote: {resolved}/{len(unique_symbols)} símbolos resueltos en {elapsed:.2f}s.")
+
+def get_current_prices(symbols, asset_types: dict[str, models.AssetType] | None = None,
+                       max_workers: int | None = None, timeout: float | None = None) -> dict[str, Decimal | None]:
+    """
+    Obtiene los precios actuales de varios símbolos a la vez (ver iter_current_prices).
+    Retorna un diccionario símbolo -> Decimal | None.
+    """
+    prices: dict[str, Decimal | None] = {symbol: None for symbol in symbols if symbol}
+    for symbol, price in iter_current_prices(prices.keys(), asset_types, max_workers=max_workers, timeout=timeout):
+        prices[symbol] = price
+    return prices
 
 # --- Funciones CRUD para User ---
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
 
+# Las comparaciones sin distinguir mayúsculas usan la misma expresión que los índices
+# ix_users_*_lower / ix_assets_owner_symbol_upper (models.py); si cambia una, debe cambiar la otra.
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(func.lower(models.User.email) == func.lower(email)).first()
 
@@ -125,20 +201,46 @@ def create_asset(db: Session, owner_id: int, symbol: str, name: str, asset_type:
     return db_asset
 
 # --- Funciones CRUD para Transaction ---
+# Las transacciones se devuelven con su activo ya cargado (misma consulta): la GUI y los logs
+# leen tx.asset.symbol y, sin eso, cada activo distinto costaría un SELECT adicional.
 def get_transaction(db: Session, transaction_id: int, owner_id: int):
-    return db.query(models.Transaction).join(models.Asset).filter(
+    return db.query(models.Transaction).join(models.Asset).options(contains_eager(models.Transaction.asset)).filter(
         models.Transaction.id == transaction_id,
         models.Transaction.owner_id == owner_id
     ).first()
 
 def get_transactions_for_user(db: Session, user_id: int, skip: int = 0, limit: int = 100):
     return db.query(models.Transaction)\
+             .options(joinedload(models.Transaction.asset, innerjoin=True))\
              .filter(models.Transaction.owner_id == user_id)\
              .order_by(desc(models.Transaction.transaction_date), desc(models.Transaction.id))\
              .offset(skip)\
              .limit(limit)\
              .all()
 
+TRANSACTIONS_PAGE_SIZE = int(os.getenv("TRANSACTIONS_PAGE_SIZE", "100"))
+
+def get_transactions_page(db: Session, user_id: int, after: TransactionCursor | None = None,
+                          limit: int = TRANSACTIONS_PAGE_SIZE) -> tuple[list[models.Transaction], TransactionCursor | None]:
+    """
+    Página del historial (más recientes primero) que empieza justo después de 'after'.
+    Paginación por clave (fecha, id) en vez de offset: cada página es un rango del índice
+    ix_transactions_owner_date, así que cuesta lo mismo a cualquier profundidad.
+    Retorna (transacciones, cursor de la página siguiente o None si no hay más).
+    El cursor y el orden son los de read_models.keyset_page, compartidos con get_transaction_rows_page.
+    """
+    T = models.Transaction
+    query = db.query(T).options(joinedload(T.asset, innerjoin=True)).filter(T.owner_id == user_id)
+    return read_models.keyset_page(query, after, limit, lambda q: q.all())
+
+def get_transaction_rows_page(db: Session, user_id: int, after: TransactionCursor | None = None,
+                              limit: int = TRANSACTIONS_PAGE_SIZE) -> tuple[list[TransactionRow], TransactionCursor | None]:
+    """
+    Como get_transactions_page, pero con filas de solo lectura (read_models.TransactionRow, con
+    el símbolo del activo) en vez de objetos ORM. Es lo que usa la tabla del historial de la GUI.
+    """
+    return read_models.get_transactions_page(db, user_id, after, limit)
+
 def get_transactions_by_asset(db: Session, asset_id: int, owner_id: int):
     return db.query(models.Transaction)\
              .filter(models.Transaction.asset_id == asset_id, models.Transaction.owner_id == owner_id)\
@@ -165,6 +267,15 @@ def _validate_and_convert_transaction_data(quantity, price_per_unit, fees) -> tu
     except ValueError as ve:
         raise ve
 
+def get_data_version(db: Session, user_id: int) -> int:
+    """Versión actual de los datos de transacciones del usuario (0 si no existe)."""
+    return db.query(models.User.data_version).filter(models.User.id == user_id).scalar() or 0
+
+def bump_data_version(db: Session, user_id: int):
+    """Incrementa la versión de datos del usuario en la transacción de BD en curso (sin commit)."""
+    db.query(models.User).filter(models.User.id == user_id)\
+      .update({models.User.data_version: models.User.data_version + 1}, synchronize_session=False)
+
 def create_transaction(db: Session, owner_id: int, asset_id: int, transaction_type: models.TransactionType,
                        quantity: float | str | Decimal, price_per_unit: float | str | Decimal, transaction_date: datetime,
                        fees: float | str | Decimal = 0.0, notes: str | None = None):
@@ -181,8 +292,18 @@ def create_transaction(db: Session, owner_id: int, asset_id: int, transaction_ty
         quantity=quantity_dec, price_per_unit=price_per_unit_dec,
         transaction_date=transaction_date, fees=fees_dec, notes=notes.strip() if notes else None
     )
-    db.add(db_transaction)
-    db.commit()
+    try:
+        db.add(db_transaction)
+        db.flush()
+        # La posición materializada se actualiza en la misma transacción de BD
+        positions.apply_transaction(db, db_transaction)
+        snapshots.invalidate_from(db, owner_id, db_transaction.transaction_date)
+        bump_data_version(db, owner_id)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error al registrar transacción de {asset.symbol} para usuario ID {owner_id}: {e}")
+        raise
     db.refresh(db_transaction)
     logging.info(f"Transacción {transaction_type.name} de {quantity_dec} {asset.symbol} registrada para usuario ID {owner_id}.")
     return db_transaction
@@ -251,12 +372,23 @@ def update_transaction(db: Session, transaction_id: int, owner_id: int, updates:
         logging.info(f"No se detectaron cambios válidos para la transacción ID {transaction_id}.")
         return db_transaction
 
+    previous_asset_id = db_transaction.asset_id
+    previous_date = db_transaction.transaction_date
     for key, value in validated_updates.items():
         setattr(db_transaction, key, value)
 
     try:
+        db.flush()
+        # Cualquier cambio puede alterar el emparejamiento FIFO: se recalculan los activos afectados
+        # (primero el activo anterior, para liberar los lotes de esta transacción)
+        if previous_asset_id != db_transaction.asset_id:
+            positions.rebuild_position(db, owner_id, previous_asset_id)
+        positions.rebuild_position(db, owner_id, db_transaction.asset_id)
+        snapshots.invalidate_from(db, owner_id, min(previous_date, db_transaction.transaction_date))
+        bump_data_version(db, owner_id)
         db.commit()
-        db.refresh(db_transaction)
+        # Recarga la transacción y su activo (puede haber cambiado) en una sola consulta
+        db_transaction = get_transaction(db, transaction_id=transaction_id, owner_id=owner_id)
         log_symbol = db_transaction.asset.symbol
         logging.info(f"Transacción ID {transaction_id} ({db_transaction.transaction_type.name} {db_transaction.quantity} {log_symbol}) actualizada para usuario ID {owner_id}.")
         return db_transaction
@@ -270,7 +402,12 @@ def delete_transaction(db: Session, transaction_id: int, owner_id: int) -> bool:
     if db_transaction:
         try:
             log_info = f"ID {transaction_id} ({db_transaction.transaction_type.name} {db_transaction.quantity} {db_transaction.asset.symbol})"
+            asset_id = db_transaction.asset_id
             db.delete(db_transaction)
+            db.flush()
+            positions.rebuild_position(db, owner_id, asset_id)
+            snapshots.invalidate_from(db, owner_id, db_transaction.transaction_date)
+            bump_data_version(db, owner_id)
             db.commit()
             logging.info(f"Transacción {log_info} eliminada para usuario ID {owner_id}.")
             return True
@@ -283,120 +420,146 @@ def delete_transaction(db: Session, transaction_id: int, owner_id: int) -> bool:
         return False
 
 # --- Funciones de Lógica de Negocio (Portafolio) ---
-def get_portfolio_performance(db: Session, user_id: int) -> dict:
+def get_open_positions(db: Session, user_id: int,
+                       method: CostBasisMethod | None = None) -> list[tuple[AssetRow, Decimal, Decimal]]:
+    """
+    Retorna las posiciones abiertas de un usuario como (activo, cantidad actual, coste base total),
+    sin precios de mercado. Con FIFO (método por defecto, ver COST_BASIS_METHOD) se leen de la
+    tabla positions, que se mantiene en cada escritura de transacciones (ver positions.py);
+    con LIFO, HIFO o AVERAGE se calculan con el motor de valuation.py (misma aritmética exacta).
+    El resultado se guarda en position_cache con la versión de datos del usuario: mientras no
+    cambien sus transacciones, las siguientes llamadas solo releen los activos.
+    Los activos se devuelven como filas de solo lectura (read_models.AssetRow), no objetos ORM.
+    """
+    method = method or valuation.DEFAULT_COST_BASIS_METHOD
+    version = get_data_version(db, user_id)
+    cached = position_cache.get(user_id, method, version)
+    if cached is not None:
+        assets = {a.id: a for a in read_models.get_assets(db, [row[0] for row in cached])}
+        if len(assets) == len(cached):
+            logging.info(f"Posiciones abiertas ({method.value}) para usuario ID {user_id} desde la caché (versión {version}).")
+            return [(assets[asset_id], quantity, cost_basis) for asset_id, quantity, cost_basis in cached]
+        position_cache.invalidate(user_id) # Algún activo ya no existe
+
+    if method != CostBasisMethod.FIFO:
+        open_positions = valuation.get_open_positions(db, user_id, method)
+    else:
+        logging.info(f"Leyendo posiciones abiertas para usuario ID {user_id}...")
+        if positions.ensure_built(db, user_id):
+            db.commit() # Primera lectura tras migrar o tras cargar datos sin pasar por crud
+        open_positions = read_models.get_open_positions(db, user_id)
+    position_cache.put(user_id, method, version, [(asset.id, quantity, cost_basis) for asset, quantity, cost_basis in open_positions])
+    return open_positions
+
+def build_position_metrics(asset: AssetRow, current_quantity: Decimal, total_cost_basis: Decimal,
+                           current_price: Decimal | None) -> dict:
+    """
+    Combina una posición abierta con su precio actual.
+    Retorna el diccionario de métricas de la posición (valor de mercado y P&L no realizado).
+    """
+    average_cost_basis = total_cost_basis / current_quantity
+
+    logging.debug(f"Calculando métricas finales para {asset.symbol}: Cantidad={current_quantity}, Coste Base Total={total_cost_basis:.4f}, Coste Medio={average_cost_basis:.4f}")
+
+    market_value, unrealized_pnl, unrealized_pnl_percent = None, None, None
+
+    if current_price is not None:
+        market_value = current_quantity * current_price
+        unrealized_pnl = market_value - total_cost_basis
+        if total_cost_basis > ZERO_TOLERANCE:
+            unrealized_pnl_percent = (unrealized_pnl / total_cost_basis) * Decimal(100)
+        elif market_value > ZERO_TOLERANCE:
+            unrealized_pnl_percent = Decimal('inf')
+            logging.warning(f"Coste base <= 0 para {asset.symbol} con valor de mercado > 0. P&L% es infinito.")
+        else:
+            unrealized_pnl_percent = Decimal(0)
+
+        logging.debug(f"  Precio Actual: {current_price:.4f}, Valor Mercado: {market_value:.4f}, P&L No Real.: {unrealized_pnl:.4f}, %P&L: {unrealized_pnl_percent if unrealized_pnl_percent != Decimal('inf') else 'Inf'}")
+    else:
+         logging.warning(f"No se pudo obtener precio actual para {asset.symbol}. No se calculará valor de mercado ni P&L.")
+
+    return {
+        "asset": asset, "quantity": current_quantity,
+        "average_cost_basis": average_cost_basis, "total_cost_basis": total_cost_basis,
+        "current_price": current_price, "market_value": market_value,
+        "unrealized_pnl": unrealized_pnl, "unrealized_pnl_percent": unrealized_pnl_percent
+    }
+
+def get_portfolio_performance(db: Session, user_id: int, method: CostBasisMethod | None = None) -> dict:
     """
     Calcula el rendimiento del portafolio para un usuario.
-    Utiliza FIFO (First-In, First-Out) implícito para calcular el coste base en las ventas.
+    El coste base de las ventas se calcula con 'method' (FIFO por defecto; ver get_open_positions).
+    Los precios de todas las posiciones abiertas se obtienen en lote (get_current_prices).
     Retorna un diccionario con detalles por activo.
     """
-    user_assets = get_assets_by_user(db, owner_id=user_id, limit=10000)
-    portfolio = {}
     logging.info(f"Calculando rendimiento para usuario ID {user_id}...")
+    open_positions = get_open_positions(db, user_id, method)
 
-    for asset in user_assets:
-        transactions = get_transactions_by_asset(db, asset_id=asset.id, owner_id=user_id)
-        if not transactions:
-            logging.debug(f"Sin transacciones para {asset.symbol}, omitiendo.")
-            continue
+    # Obtener todos los precios de las posiciones abiertas en una sola llamada en lote
+    current_prices = get_current_prices([asset.symbol for asset, _, _ in open_positions],
+                                        asset_types={asset.symbol: asset.asset_type for asset, _, _ in open_positions})
 
-        purchase_lots: list[tuple[datetime, Decimal, Decimal]] = []
-        realized_pnl_asset = Decimal(0)
-        current_quantity = Decimal(0)
-        total_investment = Decimal(0)
-
-        logging.debug(f"Procesando {len(transactions)} transacciones para {asset.symbol}...")
-        for t in transactions:
-            # Asegurarse de que los valores de la BD son Decimal
-            t_quantity = Decimal(t.quantity)
-            t_price = Decimal(t.price_per_unit)
-            t_fees = Decimal(t.fees) if t.fees is not None else Decimal(0)
-
-            if t.transaction_type == models.TransactionType.BUY:
-                cost_of_this_lot = (t_quantity * t_price) + t_fees
-                cost_per_unit_with_fees = cost_of_this_lot / t_quantity if t_quantity > ZERO_TOLERANCE else Decimal(0)
-
-                purchase_lots.append((t.transaction_date, t_quantity, cost_per_unit_with_fees))
-                current_quantity += t_quantity
-                total_investment += cost_of_this_lot
-                logging.debug(f"  BUY {t_quantity} {asset.symbol} @ {t_price} (Coste Lote: {cost_of_this_lot:.4f}). Cantidad actual: {current_quantity}, Inversión total: {total_investment:.4f}")
-
-            elif t.transaction_type == models.TransactionType.SELL:
-                sell_quantity = t_quantity
-                proceeds = (sell_quantity * t_price) - t_fees
-                cost_basis_of_sold_units = Decimal(0)
-
-                logging.debug(f"  SELL {sell_quantity} {asset.symbol} @ {t_price} (Ingresos: {proceeds:.4f}). Cantidad antes: {current_quantity}")
-
-                if sell_quantity > current_quantity + ZERO_TOLERANCE:
-                    logging.warning(f"Usuario {user_id}, Activo {asset.symbol}: Venta de {sell_quantity} excede la cantidad actual {current_quantity}. Se ajustará a {current_quantity}.")
-                    sell_quantity = current_quantity
-
-                remaining_sell_quantity = sell_quantity
-                temp_lots = []
-                purchase_lots.sort(key=lambda x: x[0])
-
-                for lot_date, lot_quantity, lot_cost_per_unit in purchase_lots:
-                    if remaining_sell_quantity <= ZERO_TOLERANCE:
-                        temp_lots.append((lot_date, lot_quantity, lot_cost_per_unit))
-                        continue
-
-                    quantity_from_this_lot = min(remaining_sell_quantity, lot_quantity)
-                    cost_basis_of_sold_units += quantity_from_this_lot * lot_cost_per_unit
-                    remaining_sell_quantity -= quantity_from_this_lot
-
-                    if lot_quantity > quantity_from_this_lot + ZERO_TOLERANCE:
-                        remaining_lot_quantity = lot_quantity - quantity_from_this_lot
-                        temp_lots.append((lot_date, remaining_lot_quantity, lot_cost_per_unit))
-                        logging.debug(f"    - Vendido {quantity_from_this_lot} del lote {lot_date:%Y-%m-%d}. Quedan {remaining_lot_quantity}")
-                    else:
-                         logging.debug(f"    - Vendido {quantity_from_this_lot} (todo) del lote {lot_date:%Y-%m-%d}.")
-
-                purchase_lots = temp_lots
-                current_quantity -= sell_quantity
-                total_investment -= cost_basis_of_sold_units
-                realized_pnl_this_sale = proceeds - cost_basis_of_sold_units
-                realized_pnl_asset += realized_pnl_this_sale
-
-                logging.debug(f"  Venta completada. Coste base vendido: {cost_basis_of_sold_units:.4f}. P&L Realizado Venta: {realized_pnl_this_sale:.4f}")
-                logging.debug(f"  Cantidad actual: {current_quantity}. Inversión restante: {total_investment:.4f}")
-
-        if current_quantity > ZERO_TOLERANCE:
-            total_cost_basis = total_investment
-            average_cost_basis = total_cost_basis / current_quantity
-
-            logging.debug(f"Calculando métricas finales para {asset.symbol}: Cantidad={current_quantity}, Coste Base Total={total_cost_basis:.4f}, Coste Medio={average_cost_basis:.4f}")
-
-            current_price = get_current_price(asset.symbol)
-            market_value, unrealized_pnl, unrealized_pnl_percent = None, None, None
-
-            if current_price is not None:
-                market_value = current_quantity * current_price
-                unrealized_pnl = market_value - total_cost_basis
-                if total_cost_basis > ZERO_TOLERANCE:
-                    unrealized_pnl_percent = (unrealized_pnl / total_cost_basis) * Decimal(100)
-                elif market_value > ZERO_TOLERANCE:
-                    unrealized_pnl_percent = Decimal('inf')
-                    logging.warning(f"Coste base <= 0 para {asset.symbol} con valor de mercado > 0. P&L% es infinito.")
-                else:
-                    unrealized_pnl_percent = Decimal(0)
-
-                logging.debug(f"  Precio Actual: {current_price:.4f}, Valor Mercado: {market_value:.4f}, P&L No Real.: {unrealized_pnl:.4f}, %P&L: {unrealized_pnl_percent if unrealized_pnl_percent != Decimal('inf') else 'Inf'}")
-            else:
-                 logging.warning(f"No se pudo obtener precio actual para {asset.symbol}. No se calculará valor de mercado ni P&L.")
-
-            portfolio[asset.symbol] = {
-                "asset": asset, "quantity": current_quantity,
-                "average_cost_basis": average_cost_basis, "total_cost_basis": total_cost_basis,
-                "current_price": current_price, "market_value": market_value,
-                "unrealized_pnl": unrealized_pnl, "unrealized_pnl_percent": unrealized_pnl_percent
-            }
-        else:
-             logging.info(f"Posición final en {asset.symbol} es cero o negativa ({current_quantity}). No se incluye en el resumen de posiciones abiertas.")
+    portfolio = {}
+    for asset, current_quantity, total_cost_basis in open_positions:
+        portfolio[asset.symbol] = build_position_metrics(asset, current_quantity, total_cost_basis,
+                                                         current_prices.get(asset.symbol))
 
     logging.info(f"Cálculo de rendimiento para usuario ID {user_id} completado. {len(portfolio)} posiciones abiertas encontradas.")
     return portfolio
 
+def get_portfolio_as_of(db: Session, user_id: int, as_of: date, backfill_missing: bool = False) -> dict:
+    """
+    Valora el portafolio al cierre de 'as_of' con los cierres del histórico local (price_bars).
+    Mismo formato que get_portfolio_performance. Ver snapshots.value_as_of.
+    """
+    return snapshots.value_as_of(db, user_id, as_of, backfill_missing=backfill_missing, provider=price_provider)
+
+def get_returns(db: Session, user_id: int, periods: list[tuple[date, date]], backfill_missing: bool = False) -> list[dict]:
+    """
+    Rentabilidad ponderada por tiempo (TWR) y por dinero (XIRR) del portafolio y de cada
+    activo en cada periodo (inicio, fin). Ver returns.get_returns.
+    """
+    return returns.get_returns(db, user_id, periods, backfill_missing=backfill_missing, provider=price_provider)
+
 # --- Funciones Adicionales (Ejemplos) ---
-def get_realized_gains(db: Session, user_id: int, start_date: date | None = None, end_date: date | None = None):
-    logging.warning("La función get_realized_gains aún no está implementada.")
-    return None
\ No newline at end of file
+def get_realized_gains(db: Session, user_id: int, start_date: date | None = None, end_date: date | None = None) -> dict:
+    """
+    Ganancias realizadas (FIFO) de las ventas entre 'start_date' y 'end_date' (ambas incluidas;
+    sin límites, todo el historial). Se leen por rango de la tabla lot_matches, indexada por
+    (usuario, fecha de venta). Retorna totales ('realized_pnl', 'proceeds', 'cost_basis'),
+    su reparto a corto y largo plazo ('short_term_pnl', 'long_term_pnl'; largo plazo si el lote
+    se mantuvo más de LONG_TERM_HOLDING_DAYS días) y 'by_symbol' con el P&L realizado por activo.
+    """
+    if positions.ensure_built(db, user_id):
+        db.commit()
+    M = models.LotMatchEntry
+    is_long_term = (M.holding_days > LONG_TERM_HOLDING_DAYS).label("long_term")
+    query = db.query(models.Asset.symbol, is_long_term, func.sum(M.proceeds), func.sum(M.cost_basis), func.sum(M.realized_pnl))\
+              .join(models.Asset, models.Asset.id == M.asset_id)\
+              .filter(M.owner_id == user_id)
+    if start_date is not None:
+        query = query.filter(M.sell_date >= datetime.combine(start_date, datetime.min.time()))
+    if end_date is not None:
+        query = query.filter(M.sell_date < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+
+    gains = {"realized_pnl": Decimal(0), "proceeds": Decimal(0), "cost_basis": Decimal(0),
+             "short_term_pnl": Decimal(0), "long_term_pnl": Decimal(0), "by_symbol": {}}
+    for symbol, long_term, proceeds, cost_basis, realized_pnl in query.group_by(models.Asset.symbol, is_long_term):
+        proceeds, cost_basis, realized_pnl = Decimal(proceeds), Decimal(cost_basis), Decimal(realized_pnl)
+        gains["proceeds"] += proceeds
+        gains["cost_basis"] += cost_basis
+        gains["realized_pnl"] += realized_pnl
+        gains["long_term_pnl" if long_term else "short_term_pnl"] += realized_pnl
+        gains["by_symbol"][symbol] = gains["by_symbol"].get(symbol, Decimal(0)) + realized_pnl
+    logging.info(f"Ganancias realizadas de usuario ID {user_id} ({start_date or 'inicio'}..{end_date or 'hoy'}): {gains['realized_pnl']:.2f}")
+    return gains
+
+def get_lot_matches(db: Session, user_id: int, start_date: date | None = None, end_date: date | None = None):
+    """Detalle de los emparejamientos venta-compra del periodo, por fecha de venta."""
+    M = models.LotMatchEntry
+    query = db.query(M).filter(M.owner_id == user_id)
+    if start_date is not None:
+        query = query.filter(M.sell_date >= datetime.combine(start_date, datetime.min.time()))
+    if end_date is not None:
+        query = query.filter(M.sell_date < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    return query.order_by(M.sell_date, M.id).all()
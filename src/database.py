@@ -1,5 +1,6 @@
 # src/database.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 
@@ -12,15 +13,58 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 DEFAULT_DB_PATH = os.path.join(PROJECT_ROOT, DEFAULT_DB_FILENAME)
 DATABASE_URL = os.getenv("DATABASE_URL", f"sqlite:///{DEFAULT_DB_PATH}")
 
-print(f"[*] Conectando a la base de datos: {DATABASE_URL}") # Mensaje informativo
+# --- Perfil de SQLite (PRAGMAs aplicados a cada conexión nueva) ---
+#   - "tuned":   WAL (los lectores no bloquean al escritor ni al revés), synchronous=NORMAL
+#                (en WAL solo se hace fsync en los checkpoints, no en cada commit; un corte de
+#                luz puede perder los últimos commits pero no corrompe la BD), caché de páginas
+#                y mmap configurables, temporales en memoria y claves foráneas activas
+#                (los ON DELETE CASCADE de models.py). Las conexiones se reutilizan (QueuePool)
+#                para que la caché de páginas, que es por conexión, sobreviva entre sesiones.
+#   - "default": ajustes de fábrica de SQLite (journal de rollback, fsync completo en cada commit).
+# Alembic usa su propio engine (alembic/env.py), así que las migraciones no se ven afectadas.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned").lower()
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE_MB = int(os.getenv("SQLITE_MMAP_SIZE_MB", "256"))
 
-engine = create_engine(
-    DATABASE_URL,
-    # connect_args es específico para SQLite. Necesario para permitir
-    # el uso de la sesión de base de datos desde diferentes hilos (si fuera necesario,
-    # aunque en este CLI simple no es estrictamente requerido pero es buena práctica).
-    connect_args={"check_same_thread": False}
-)
+def sqlite_pragmas(profile: str) -> list[tuple[str, str | int]]:
+    """PRAGMAs (nombre, valor) de un perfil, en el orden en que se aplican."""
+    if profile == "default":
+        return []
+    if profile == "tuned":
+        return [("journal_mode", "WAL"), ("synchronous", "NORMAL"),
+                ("cache_size", -SQLITE_CACHE_SIZE_KB), # Negativo: tamaño en KiB, no en páginas
+                ("mmap_size", SQLITE_MMAP_SIZE_MB * 1024 * 1024),
+                ("temp_store", "MEMORY"), ("foreign_keys", "ON")]
+    raise ValueError(f"Perfil de SQLite desconocido: '{profile}'. Use 'tuned' o 'default'.")
+
+def create_db_engine(url: str, profile: str = SQLITE_PROFILE):
+    """Crea el engine; si es SQLite, registra el perfil de PRAGMAs en el evento 'connect'."""
+    pragmas = sqlite_pragmas(profile.lower())
+    sqlite = url.startswith("sqlite")
+    options = {}
+    if sqlite and pragmas and ":memory:" not in url and url.rstrip("/") != "sqlite:":
+        # Por defecto SQLAlchemy 1.4 abre y cierra un fichero SQLite en cada sesión (NullPool)
+        options["poolclass"] = QueuePool
+    db_engine = create_engine(
+        url,
+        # connect_args es específico para SQLite. Necesario para permitir
+        # el uso de la sesión de base de datos desde diferentes hilos (si fuera necesario,
+        # aunque en este CLI simple no es estrictamente requerido pero es buena práctica).
+        connect_args={"check_same_thread": False} if sqlite else {},
+        **options
+    )
+    if sqlite and pragmas:
+        @event.listens_for(db_engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas:
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+    return db_engine
+
+print(f"[*] Conectando a la base de datos: {DATABASE_URL} (perfil SQLite: {SQLITE_PROFILE})") # Mensaje informativo
+
+engine = create_db_engine(DATABASE_URL)
 
 # SessionLocal es una 'fábrica' de sesiones de base de datos.
 # Cada instancia de SessionLocal será una nueva sesión.
@@ -0,0 +1,157 @@
+# src/exporter.py
+# --- Exportación en streaming a CSV / Parquet ---
+# Conjuntos exportables de un usuario:
+#   - transactions: historial completo (sin el límite de get_transactions_for_user).
+#   - lots:         lotes abiertos materializados (tabla open_lots).
+#   - valuation:    posiciones abiertas valoradas con precios actuales (get_portfolio_performance).
+# Las tablas grandes se leen con consultas Core y yield_per: las filas llegan del cursor en
+# bloques de EXPORT_BATCH_SIZE y se escriben sin crear objetos ORM, con memoria constante.
+# Los importes se leen como float (type_coerce), que es como SQLite guarda los Numeric.
+# Parquet necesita pyarrow (dependencia opcional, solo se importa al exportar a Parquet).
+import csv
+from decimal import Decimal
+import logging
+import os
+import time
+from typing import Iterator
+
+from sqlalchemy import Float, String, select, type_coerce
+from sqlalchemy.orm import Session
+
+from . import models, positions
+
+# Filas por bloque leído del cursor (y por row group en Parquet)
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "10000"))
+
+# Columnas de cada conjunto: (nombre, tipo) con tipo en "int", "float", "str" o "datetime"
+TRANSACTION_COLUMNS = (("id", "int"), ("transaction_date", "datetime"), ("transaction_type", "str"),
+                       ("symbol", "str"), ("quantity", "float"), ("price_per_unit", "float"),
+                       ("fees", "float"), ("notes", "str"))
+LOT_COLUMNS = (("buy_transaction_id", "int"), ("symbol", "str"), ("lot_date", "datetime"),
+               ("quantity", "float"), ("cost_per_unit", "float"))
+VALUATION_COLUMNS = (("symbol", "str"), ("asset_type", "str"), ("quantity", "float"),
+                     ("average_cost_basis", "float"), ("total_cost_basis", "float"), ("current_price", "float"),
+                     ("market_value", "float"), ("unrealized_pnl", "float"), ("unrealized_pnl_percent", "float"))
+
+
+# --- Lectores (generadores de bloques de filas) ---
+
+def iter_transactions(db: Session, owner_id: int, batch_size: int) -> Iterator[list[tuple]]:
+    T, A = models.Transaction, models.Asset
+    stmt = select(T.id, T.transaction_date, type_coerce(T.transaction_type, String), A.symbol,
+                  type_coerce(T.quantity, Float), type_coerce(T.price_per_unit, Float),
+                  type_coerce(T.fees, Float), T.notes)\
+           .join(A, A.id == T.asset_id)\
+           .where(T.owner_id == owner_id)\
+           .order_by(T.transaction_date, T.id)
+    yield from db.execute(stmt.execution_options(yield_per=batch_size)).partitions()
+
+def iter_open_lots(db: Session, owner_id: int, batch_size: int) -> Iterator[list[tuple]]:
+    if positions.ensure_built(db, owner_id):
+        db.commit()
+    L, A = models.OpenLot, models.Asset
+    stmt = select(L.buy_transaction_id, A.symbol, L.lot_date, type_coerce(L.quantity, Float),
+                  type_coerce(L.cost_per_unit, Float))\
+           .join(A, A.id == L.asset_id)\
+           .where(L.owner_id == owner_id)\
+           .order_by(A.symbol, L.lot_date, L.buy_transaction_id)
+    yield from db.execute(stmt.execution_options(yield_per=batch_size)).partitions()
+
+def iter_valuation(db: Session, owner_id: int, batch_size: int) -> Iterator[list[tuple]]:
+    from .crud import get_portfolio_performance # Import diferido: crud carga el proveedor de precios
+
+    def number(value: Decimal | None) -> float | None:
+        return float(value) if value is not None else None
+
+    rows = [(symbol, data["asset"].asset_type.value, *(number(data[key]) for key, _ in VALUATION_COLUMNS[2:]))
+            for symbol, data in sorted(get_portfolio_performance(db, owner_id).items())]
+    for i in range(0, len(rows), batch_size):
+        yield rows[i:i + batch_size]
+
+DATASETS = {"transactions": (TRANSACTION_COLUMNS, iter_transactions),
+            "lots": (LOT_COLUMNS, iter_open_lots),
+            "valuation": (VALUATION_COLUMNS, iter_valuation)}
+
+
+# --- Escritores ---
+
+def _write_csv(path: str, columns, batches: Iterator[list[tuple]]) -> int:
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(name for name, _ in columns)
+        for batch in batches:
+            writer.writerows(batch)
+            count += len(batch)
+    return count
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("La exportación a Parquet necesita pyarrow (pip install pyarrow).") from e
+    return pyarrow, pyarrow.parquet
+
+def _write_parquet(path: str, columns, batches: Iterator[list[tuple]]) -> int:
+    pa, pq = _require_pyarrow()
+    types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string(), "datetime": pa.timestamp("us")}
+    schema = pa.schema([(name, types[kind]) for name, kind in columns])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        for batch in batches:
+            # Un row group por bloque: columnas a partir de las filas del bloque
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(batch)
+    return count
+
+WRITERS = {"csv": _write_csv, "parquet": _write_parquet}
+
+def export(db: Session, owner_id: int, dataset: str, path: str, fmt: str | None = None,
+           batch_size: int | None = None) -> dict:
+    """
+    Exporta un conjunto ('transactions', 'lots' o 'valuation') de un usuario a 'path' en formato
+    'csv' o 'parquet' (por defecto según la extensión). Retorna {"rows", "seconds", "rows_per_second"}.
+    """
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt == "pq":
+        fmt = "parquet"
+    if dataset not in DATASETS:
+        raise ValueError(f"Conjunto desconocido: '{dataset}'. Use uno de: {', '.join(DATASETS)}.")
+    if fmt not in WRITERS:
+        raise ValueError(f"Formato de exportación no soportado: '{fmt}'. Use 'csv' o 'parquet'.")
+    batch_size = batch_size or EXPORT_BATCH_SIZE
+    if batch_size < 1:
+        raise ValueError("El tamaño de bloque debe ser positivo.")
+
+    columns, reader = DATASETS[dataset]
+    started = time.perf_counter()
+    count = WRITERS[fmt](path, columns, reader(db, owner_id, batch_size))
+    seconds = time.perf_counter() - started
+    stats = {"rows": count, "seconds": seconds, "rows_per_second": count / seconds if seconds > 0 else 0.0}
+    logging.info(f"Exportación '{dataset}' del usuario ID {owner_id} a {path}: {count} filas en {seconds:.2f}s "
+                 f"({stats['rows_per_second']:.0f} filas/s).")
+    return stats
+
+
+# --- Uso desde línea de comandos ---
+# python -m src.exporter --user ID salida.(csv|parquet) [--dataset transactions|lots|valuation] [--batch-size N]
+if __name__ == "__main__":
+    import argparse
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Exporta transacciones, lotes abiertos o valoración a CSV/Parquet.")
+    parser.add_argument("path", help="Fichero de salida")
+    parser.add_argument("--user", type=int, required=True, help="ID del usuario")
+    parser.add_argument("--dataset", choices=tuple(DATASETS), default="transactions", help="Conjunto a exportar")
+    parser.add_argument("--format", choices=tuple(WRITERS), default=None, help="Formato (por defecto según la extensión)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Filas por bloque (por defecto EXPORT_BATCH_SIZE)")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        stats = export(session, args.user, args.dataset, args.path, args.format, args.batch_size)
+    finally:
+        session.close()
+    print(f"{stats['rows']} filas exportadas a {args.path} en {stats['seconds']:.2f}s ({stats['rows_per_second']:,.0f} filas/s)")
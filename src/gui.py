@@ -6,12 +6,15 @@ from CTkTable import CTkTable
 from . import crud
 from . import models
 from .database import SessionLocal
+from .valuation import CostBasisMethod, DEFAULT_COST_BASIS_METHOD
 import logging
 import sys
 import os # <--- Añadido import os
 from decimal import Decimal, ROUND_HALF_UP, InvalidOperation, DivisionByZero
 from datetime import datetime
 import re # Importar re para validación básica de email
+import threading
+import queue
 
 # --- Configuración de Apariencia ---
 ctk.set_appearance_mode("System")
@@ -20,6 +23,9 @@ ctk.set_default_color_theme("blue")
 # --- Validación básica de Email (expresión regular simple) ---
 EMAIL_REGEX = r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$"
 
+# Intervalo (ms) con el que el hilo de Tk revisa los resultados de la valoración en segundo plano
+PORTFOLIO_POLL_MS = 100
+
 # --- Función para obtener la ruta a los recursos (como el icono) ---
 def resource_path(relative_path):
     """ Obtiene la ruta absoluta al recurso, funciona para desarrollo y para PyInstaller """
@@ -44,6 +50,53 @@ def resource_path(relative_path):
     # print(f"Calculated resource path for '{relative_path}': {path_to_resource}") # Para depuración
     return path_to_resource
 
+# --- Valoración del portafolio en segundo plano ---
+def _portfolio_worker(user_id, cancel_event, results, method=None):
+    """
+    Se ejecuta en un hilo aparte: NO debe tocar widgets de Tk.
+    'method' es el método de coste base (CostBasisMethod; por defecto FIFO).
+    Usa su propia sesión de BD y deja en la cola 'results' los mensajes:
+    ("positions", lista), ("price", símbolo, precio)..., y al final ("done",), ("cancelled",) o ("error", e).
+    """
+    db = SessionLocal()
+    try:
+        open_positions = crud.get_open_positions(db, user_id=user_id, method=method)
+        results.put(("positions", open_positions))
+        if cancel_event.is_set():
+            results.put(("cancelled",)); return
+        symbols = [asset.symbol for asset, _, _ in open_positions]
+        asset_types = {asset.symbol: asset.asset_type for asset, _, _ in open_positions}
+        for symbol, price in crud.iter_current_prices(symbols, asset_types, cancel_event=cancel_event):
+            results.put(("price", symbol, price))
+        results.put(("cancelled",) if cancel_event.is_set() else ("done",))
+    except Exception as e:
+        logging.error(f"Error en el hilo de valoración del portafolio: {e}", exc_info=True)
+        results.put(("error", e))
+    finally:
+        db.close()
+
+def _format_portfolio_row(symbol, data):
+    # Formatear números para mostrar (con precisión y manejo de N/A)
+    quantity, avg_cost, total_cost, current_price, market_value, unrealized_pnl, unrealized_pnl_percent = (
+        data["quantity"], data["average_cost_basis"], data["total_cost_basis"], data["current_price"],
+        data["market_value"], data["unrealized_pnl"], data["unrealized_pnl_percent"]
+    )
+    q_prec, p_prec, v_prec, pct_prec = 8, 4, 2, 2 # Precisiones
+    quantity_str = f"{quantity:.{q_prec}f}".rstrip('0').rstrip('.') if quantity is not None else "N/A"
+    avg_cost_str = f"{avg_cost:,.{p_prec}f}" if avg_cost is not None else "N/A"
+    total_cost_str = f"{total_cost:,.{v_prec}f}" if total_cost is not None else "N/A"
+    current_price_str = f"{current_price:,.{p_prec}f}" if current_price is not None else "N/A"
+    market_value_str = f"{market_value:,.{v_prec}f}" if market_value is not None else "N/A"
+    unrealized_pnl_str = f"{unrealized_pnl:,.{v_prec}f}" if unrealized_pnl is not None else "N/A"
+
+    # Formateo especial para % P&L (infinito, N/A)
+    if unrealized_pnl_percent is None: pnl_percent_str = "N/A"
+    elif unrealized_pnl_percent == Decimal('inf'): pnl_percent_str = "+Inf%"
+    elif unrealized_pnl_percent == Decimal('-inf'): pnl_percent_str = "-Inf%"
+    else: pnl_percent_str = f"{unrealized_pnl_percent:,.{pct_prec}f}%"
+
+    return [symbol, quantity_str, avg_cost_str, total_cost_str, current_price_str, market_value_str, unrealized_pnl_str, pnl_percent_str]
+
 
 class PortfolioApp(ctk.CTk):
     def __init__(self, db_session):
@@ -52,6 +105,14 @@ class PortfolioApp(ctk.CTk):
         self.db = db_session
         self.current_user: models.User | None = None
         self.selected_transaction_id: int | None = None
+        # Estado del refresco del portafolio en segundo plano
+        self._portfolio_job = 0
+        self._portfolio_cancel_event: threading.Event | None = None
+        self._cost_basis_method: CostBasisMethod = DEFAULT_COST_BASIS_METHOD
+        # Paginación del historial: cursor de la página siguiente (None si no hay más)
+        self._transactions_cursor: crud.TransactionCursor | None = None
+        self._transactions_table_frame = None
+        self._load_more_button = None
 
         # --- Configuración de la Ventana Principal ---
         self.title("Portfolio Tracker Pro")
@@ -153,6 +214,8 @@ class PortfolioApp(ctk.CTk):
             confirm = CTkMessagebox(title="Confirmar Logout", message="¿Estás seguro de que quieres cerrar sesión?",
                                     icon="question", option_1="Cancelar", option_2="Sí")
             if confirm.get() == "Sí":
+                self._cancel_portfolio_refresh()
+                self._portfolio_job += 1 # Descartar resultados pendientes
                 self.current_user = None
                 self.login_logout_button.configure(text="Login")
                 self.portfolio_button.configure(state="disabled")
@@ -182,6 +245,10 @@ class PortfolioApp(ctk.CTk):
 
     # --- Métodos para actualizar frames ---
     def update_portfolio_frame(self):
+        # La valoración (historial FIFO + precios) se ejecuta en un hilo en segundo plano.
+        # El hilo deja mensajes en una cola que el hilo de Tk lee con after(), de modo que
+        # la ventana sigue respondiendo y las filas se completan a medida que llegan los precios.
+        self._cancel_portfolio_refresh()
         self._clear_portfolio_frame()
         if not self.current_user: return # No hacer nada si no hay usuario
 
@@ -191,92 +258,174 @@ class PortfolioApp(ctk.CTk):
         header_frame.grid_columnconfigure(0, weight=1) # Label se expande a la izquierda
         label = ctk.CTkLabel(header_frame, text=f"Resumen del Portafolio ({self.current_user.username})", font=ctk.CTkFont(size=18, weight="bold"))
         label.grid(row=0, column=0, padx=5, pady=5, sticky="w")
+
+        # Indicador de progreso y botón de cancelar (visibles mientras se valora)
+        self.portfolio_status_label = ctk.CTkLabel(header_frame, text="Calculando posiciones...", text_color="gray")
+        self.portfolio_status_label.grid(row=0, column=1, padx=5, pady=5, sticky="e")
+        self.portfolio_progress = ctk.CTkProgressBar(header_frame, width=140, mode="indeterminate")
+        self.portfolio_progress.grid(row=0, column=2, padx=5, pady=5, sticky="e")
+        self.portfolio_progress.start()
+        self.portfolio_cancel_button = ctk.CTkButton(header_frame, text="Cancelar", width=80, fg_color="gray",
+                                                     command=self._cancel_portfolio_refresh)
+        self.portfolio_cancel_button.grid(row=0, column=3, padx=5, pady=5, sticky="e")
+        # Selector del método de coste base (FIFO, LIFO, HIFO, coste medio); al cambiarlo se revalora
+        method_menu = ctk.CTkOptionMenu(header_frame, width=110, values=[m.value for m in CostBasisMethod],
+                                        command=self._change_cost_basis_method)
+        method_menu.set(self._cost_basis_method.value)
+        method_menu.grid(row=0, column=4, padx=5, pady=5, sticky="e")
         refresh_button = ctk.CTkButton(header_frame, text="Refrescar", width=100, command=self.update_portfolio_frame)
-        refresh_button.grid(row=0, column=1, padx=5, pady=5, sticky="e") # Botón a la derecha
+        refresh_button.grid(row=0, column=5, padx=5, pady=5, sticky="e") # Botón a la derecha
+
+        # --- Lanzar la valoración en segundo plano ---
+        self._portfolio_job += 1
+        job_id = self._portfolio_job
+        cancel_event = threading.Event()
+        self._portfolio_cancel_event = cancel_event
+        results = queue.Queue()
+        worker = threading.Thread(target=_portfolio_worker,
+                                  args=(self.current_user.id, cancel_event, results, self._cost_basis_method),
+                                  name=f"portfolio-refresh-{job_id}", daemon=True)
+        worker.start()
+        self.after(PORTFOLIO_POLL_MS, self._poll_portfolio_results, job_id, results)
+
+    def _change_cost_basis_method(self, value):
+        self._cost_basis_method = CostBasisMethod(value)
+        logging.info(f"Método de coste base seleccionado: {value}")
+        self.update_portfolio_frame()
 
+    def _cancel_portfolio_refresh(self):
+        # Pide al hilo de valoración activo (si lo hay) que termine
+        if self._portfolio_cancel_event is not None and not self._portfolio_cancel_event.is_set():
+            self._portfolio_cancel_event.set()
+            logging.info("Refresco del portafolio cancelado.")
+
+    def _poll_portfolio_results(self, job_id, results):
+        # Lee los mensajes del hilo de valoración. Se reprograma con after() hasta recibir el final.
+        if job_id != self._portfolio_job:
+            return # Un refresco más reciente reemplazó a este
+        finished = False
         try:
-            # --- Obtener y Mostrar Datos del Portafolio ---
-            portfolio_details = crud.get_portfolio_performance(self.db, user_id=self.current_user.id)
-
-            if not portfolio_details:
-                # Mostrar mensaje si no hay posiciones
-                no_data_label = ctk.CTkLabel(self.portfolio_frame, text="No hay posiciones abiertas en el portafolio.", font=ctk.CTkFont(size=14))
-                no_data_label.grid(row=1, column=0, padx=20, pady=20, sticky="n")
-                self._add_empty_portfolio_totals() # Mostrar totales en cero
-                return
-
-            # --- Preparar Datos para la Tabla ---
-            headers = ["Símbolo", "Cantidad", "Coste Medio", "Coste Total", "Precio Act.", "Valor Mercado", "P&L No Real.", "% P&L"]
-            table_data = [headers]
-            total_portfolio_market_value = Decimal(0)
-            total_portfolio_cost_basis = Decimal(0)
-
-            sorted_symbols = sorted(portfolio_details.keys()) # Ordenar por símbolo
-
-            for symbol in sorted_symbols:
-                data = portfolio_details[symbol]
-                quantity, avg_cost, total_cost, current_price, market_value, unrealized_pnl, unrealized_pnl_percent = (
-                    data["quantity"], data["average_cost_basis"], data["total_cost_basis"], data["current_price"],
-                    data["market_value"], data["unrealized_pnl"], data["unrealized_pnl_percent"]
-                )
-
-                # Acumular totales
-                if market_value is not None: total_portfolio_market_value += market_value
-                if total_cost is not None: total_portfolio_cost_basis += total_cost
-
-                # Formatear números para mostrar (con precisión y manejo de N/A)
-                q_prec, p_prec, v_prec, pct_prec = 8, 4, 2, 2 # Precisiones
-                quantity_str = f"{quantity:.{q_prec}f}".rstrip('0').rstrip('.') if quantity is not None else "N/A"
-                avg_cost_str = f"{avg_cost:,.{p_prec}f}" if avg_cost is not None else "N/A"
-                total_cost_str = f"{total_cost:,.{v_prec}f}" if total_cost is not None else "N/A"
-                current_price_str = f"{current_price:,.{p_prec}f}" if current_price is not None else "N/A"
-                market_value_str = f"{market_value:,.{v_prec}f}" if market_value is not None else "N/A"
-                unrealized_pnl_str = f"{unrealized_pnl:,.{v_prec}f}" if unrealized_pnl is not None else "N/A"
-
-                # Formateo especial para % P&L (infinito, N/A)
-                if unrealized_pnl_percent is None: pnl_percent_str = "N/A"
-                elif unrealized_pnl_percent == Decimal('inf'): pnl_percent_str = "+Inf%"
-                elif unrealized_pnl_percent == Decimal('-inf'): pnl_percent_str = "-Inf%"
-                else: pnl_percent_str = f"{unrealized_pnl_percent:,.{pct_prec}f}%"
-
-                table_data.append([symbol, quantity_str, avg_cost_str, total_cost_str, current_price_str, market_value_str, unrealized_pnl_str, pnl_percent_str])
-
-            # --- Crear y Mostrar Tabla ---
-            table_frame = ctk.CTkScrollableFrame(self.portfolio_frame, corner_radius=0)
-            table_frame.grid(row=1, column=0, padx=15, pady=(5,15), sticky="nsew") # Ocupa el espacio principal
-
-            if len(table_data) > 1: # Si hay datos además de la cabecera
-                table = CTkTable(master=table_frame, values=table_data,
-                                 header_color=ctk.ThemeManager.theme["CTkButton"]["fg_color"],
-                                 hover_color=ctk.ThemeManager.theme["CTkButton"]["hover_color"],
-                                 corner_radius=6)
-                table.pack(expand=True, fill="both", padx=5, pady=5)
-            else:
-                 # Mensaje si por alguna razón no hay datos en la tabla (no debería pasar si portfolio_details no estaba vacío)
-                 no_data_label = ctk.CTkLabel(table_frame, text="No se encontraron datos para mostrar.", font=ctk.CTkFont(size=14))
-                 no_data_label.pack(padx=20, pady=20)
+            while not finished:
+                message = results.get_nowait()
+                kind = message[0]
+                if kind == "positions": finished = self._show_portfolio_positions(message[1])
+                elif kind == "price": self._show_portfolio_price(message[1], message[2])
+                elif kind in ("done", "cancelled"): self._finish_portfolio_refresh(cancelled=(kind == "cancelled")); finished = True
+                elif kind == "error": self._show_portfolio_error(message[1]); finished = True
+        except queue.Empty:
+            pass
+        except Exception as e:
+            self._show_portfolio_error(e)
+            finished = True
+        if finished:
+            self._portfolio_cancel_event = None
+        else:
+            self.after(PORTFOLIO_POLL_MS, self._poll_portfolio_results, job_id, results)
+
+    def _show_portfolio_positions(self, open_positions):
+        # Dibuja la tabla con las posiciones (sin precios todavía). Retorna True si no hay nada más que esperar.
+        self._portfolio_positions = {asset.symbol: (asset, quantity, total_cost) for asset, quantity, total_cost in open_positions}
+        self._portfolio_results = {}
+        self._portfolio_prices_received = 0
+
+        if not open_positions:
+            # Mostrar mensaje si no hay posiciones
+            self._stop_portfolio_progress("")
+            no_data_label = ctk.CTkLabel(self.portfolio_frame, text="No hay posiciones abiertas en el portafolio.", font=ctk.CTkFont(size=14))
+            no_data_label.grid(row=1, column=0, padx=20, pady=20, sticky="n")
+            self._add_empty_portfolio_totals() # Mostrar totales en cero
+            return True
+
+        # --- Preparar Datos para la Tabla (los precios se rellenan al llegar) ---
+        headers = ["Símbolo", "Cantidad", "Coste Medio", "Coste Total", "Precio Act.", "Valor Mercado", "P&L No Real.", "% P&L"]
+        table_data = [headers]
+        self._portfolio_rows = {}
+        for row_index, symbol in enumerate(sorted(self._portfolio_positions.keys()), start=1): # Ordenar por símbolo
+            asset, quantity, total_cost = self._portfolio_positions[symbol]
+            q_prec, p_prec, v_prec = 8, 4, 2
+            quantity_str = f"{quantity:.{q_prec}f}".rstrip('0').rstrip('.')
+            avg_cost_str = f"{total_cost / quantity:,.{p_prec}f}"
+            total_cost_str = f"{total_cost:,.{v_prec}f}"
+            table_data.append([symbol, quantity_str, avg_cost_str, total_cost_str, "...", "...", "...", "..."])
+            self._portfolio_rows[symbol] = row_index
+
+        # --- Crear y Mostrar Tabla ---
+        table_frame = ctk.CTkScrollableFrame(self.portfolio_frame, corner_radius=0)
+        table_frame.grid(row=1, column=0, padx=15, pady=(5,15), sticky="nsew") # Ocupa el espacio principal
+        self.portfolio_table = CTkTable(master=table_frame, values=table_data,
+                                        header_color=ctk.ThemeManager.theme["CTkButton"]["fg_color"],
+                                        hover_color=ctk.ThemeManager.theme["CTkButton"]["hover_color"],
+                                        corner_radius=6)
+        self.portfolio_table.pack(expand=True, fill="both", padx=5, pady=5)
+
+        # Pasar la barra a modo determinado: 0/N precios recibidos
+        self.portfolio_progress.stop()
+        self.portfolio_progress.configure(mode="determinate")
+        self.portfolio_progress.set(0)
+        self.portfolio_status_label.configure(text=f"Precios 0/{len(open_positions)}")
+        return False
+
+    def _show_portfolio_price(self, symbol, current_price):
+        # Completa la fila de un símbolo en cuanto llega su precio
+        if symbol not in self._portfolio_rows:
+            return
+        asset, quantity, total_cost = self._portfolio_positions[symbol]
+        data = crud.build_position_metrics(asset, quantity, total_cost, current_price)
+        row_values = _format_portfolio_row(symbol, data)
+        row_index = self._portfolio_rows[symbol]
+        for column in range(4, 8): # Precio Act., Valor Mercado, P&L No Real., % P&L
+            self.portfolio_table.insert(row_index, column, row_values[column])
+        self._portfolio_results[symbol] = data
+
+        self._portfolio_prices_received += 1
+        total = len(self._portfolio_rows)
+        self.portfolio_progress.set(self._portfolio_prices_received / total)
+        self.portfolio_status_label.configure(text=f"Precios {self._portfolio_prices_received}/{total}")
+
+    def _finish_portfolio_refresh(self, cancelled=False):
+        # Cierra el refresco: totales con lo recibido y estado final en la cabecera
+        total_portfolio_market_value = Decimal(0)
+        total_portfolio_cost_basis = Decimal(0)
+        for asset, quantity, total_cost in self._portfolio_positions.values():
+            total_portfolio_cost_basis += total_cost
+        for data in self._portfolio_results.values():
+            if data["market_value"] is not None: total_portfolio_market_value += data["market_value"]
+
+        if cancelled:
+            # Las filas que no recibieron precio quedan como N/A
+            for symbol, row_index in self._portfolio_rows.items():
+                if symbol not in self._portfolio_results:
+                    for column in range(4, 8):
+                        self.portfolio_table.insert(row_index, column, "N/A")
+            self._stop_portfolio_progress("Cancelado")
+        else:
+            self._stop_portfolio_progress(f"Actualizado {datetime.now():%H:%M:%S}")
+        self._add_portfolio_totals(total_portfolio_cost_basis, total_portfolio_market_value)
 
-            # --- Añadir Totales del Portafolio ---
-            self._add_portfolio_totals(total_portfolio_cost_basis, total_portfolio_market_value)
+    def _stop_portfolio_progress(self, status_text):
+        self.portfolio_progress.stop()
+        self.portfolio_progress.grid_remove()
+        self.portfolio_cancel_button.grid_remove()
+        self.portfolio_status_label.configure(text=status_text)
 
-        except Exception as e:
-            # --- Manejo de Errores al Cargar Portafolio ---
-            logging.error(f"Error al actualizar el frame del portafolio: {e}", exc_info=True)
-            self._clear_portfolio_frame() # Limpiar por si algo se dibujó parcialmente
+    def _show_portfolio_error(self, e):
+        # --- Manejo de Errores al Cargar Portafolio ---
+        logging.error(f"Error al actualizar el frame del portafolio: {e}", exc_info=e)
+        self._clear_portfolio_frame() # Limpiar por si algo se dibujó parcialmente
 
-            # Re-crear cabecera mínima con botón refrescar
-            header_frame = ctk.CTkFrame(self.portfolio_frame, fg_color="transparent")
-            header_frame.grid(row=0, column=0, padx=15, pady=(10, 5), sticky="ew")
-            header_frame.grid_columnconfigure(1, weight=1) # Botón a la derecha
-            refresh_button = ctk.CTkButton(header_frame, text="Refrescar", width=100, command=self.update_portfolio_frame)
-            refresh_button.grid(row=0, column=1, padx=5, pady=5, sticky="e")
+        # Re-crear cabecera mínima con botón refrescar
+        header_frame = ctk.CTkFrame(self.portfolio_frame, fg_color="transparent")
+        header_frame.grid(row=0, column=0, padx=15, pady=(10, 5), sticky="ew")
+        header_frame.grid_columnconfigure(1, weight=1) # Botón a la derecha
+        refresh_button = ctk.CTkButton(header_frame, text="Refrescar", width=100, command=self.update_portfolio_frame)
+        refresh_button.grid(row=0, column=1, padx=5, pady=5, sticky="e")
 
-            # Mostrar mensaje de error
-            error_label = ctk.CTkLabel(self.portfolio_frame,
-                                       text=f"Error al cargar datos del portafolio:\n{e}\n\nIntenta refrescar o revisa los logs.",
-                                       text_color="red", font=ctk.CTkFont(size=14), justify="left")
-            error_label.grid(row=1, column=0, padx=20, pady=20, sticky="nsew")
-            self._add_empty_portfolio_totals() # Mostrar totales en cero
+        # Mostrar mensaje de error
+        error_label = ctk.CTkLabel(self.portfolio_frame,
+                                   text=f"Error al cargar datos del portafolio:\n{e}\n\nIntenta refrescar o revisa los logs.",
+                                   text_color="red", font=ctk.CTkFont(size=14), justify="left")
+        error_label.grid(row=1, column=0, padx=20, pady=20, sticky="nsew")
+        self._add_empty_portfolio_totals() # Mostrar totales en cero
 
     # --- Métodos Auxiliares Portafolio ---
     def _add_portfolio_totals(self, total_cost, total_value):
@@ -343,8 +492,8 @@ class PortfolioApp(ctk.CTk):
         self.delete_transaction_button = delete_button
 
         try:
-            # --- Obtener y Mostrar Transacciones ---
-            transactions = crud.get_transactions_for_user(self.db, user_id=self.current_user.id)
+            # --- Obtener y Mostrar Transacciones (primera página; el resto con "Cargar más") ---
+            transactions, self._transactions_cursor = crud.get_transaction_rows_page(self.db, user_id=self.current_user.id)
 
             if not transactions:
                 # Mostrar mensaje si no hay transacciones
@@ -354,30 +503,7 @@ class PortfolioApp(ctk.CTk):
 
             # --- Preparar Datos para la Tabla ---
             headers = ["ID", "Fecha", "Tipo", "Símbolo", "Cantidad", "Precio", "Coste Total", "Comisión", "Notas"]
-            table_data = [headers]
-
-            for tx in transactions:
-                # Calcular coste total incluyendo comisiones
-                total_cost = (tx.quantity * tx.price_per_unit)
-                if tx.fees is not None:
-                    if tx.transaction_type == models.TransactionType.BUY: total_cost += tx.fees
-                    elif tx.transaction_type == models.TransactionType.SELL: total_cost -= tx.fees
-
-                # Formatear datos para la fila
-                tx_id_str = str(tx.id)
-                timestamp_str = tx.transaction_date.strftime('%d-%m-%Y %H:%M') if tx.transaction_date else "N/A"
-                type_str = tx.transaction_type.name.capitalize() if tx.transaction_type else "N/A"
-                symbol_str = tx.asset.symbol if tx.asset else "N/A"
-
-                # Formateo de números decimales
-                qty_decimals, price_decimals, value_decimals = 8, 4, 2
-                quantity_str = f"{tx.quantity:.{qty_decimals}f}".rstrip('0').rstrip('.') if tx.quantity is not None else "N/A"
-                price_str = f"{tx.price_per_unit:.{price_decimals}f}".rstrip('0').rstrip('.') if tx.price_per_unit is not None else "N/A"
-                total_cost_str = f"{total_cost:,.{value_decimals}f}" if total_cost is not None else "N/A"
-                commission_str = f"{tx.fees:.{value_decimals}f}".rstrip('0').rstrip('.') if tx.fees is not None else "N/A"
-                notes_str = tx.notes if tx.notes else ""
-
-                table_data.append([tx_id_str, timestamp_str, type_str, symbol_str, quantity_str, price_str, total_cost_str, commission_str, notes_str])
+            table_data = [headers] + [self._transaction_row_values(tx) for tx in transactions]
 
             # --- Crear y Mostrar Tabla ---
             table_frame = ctk.CTkScrollableFrame(self.transactions_frame, corner_radius=0)
@@ -390,6 +516,8 @@ class PortfolioApp(ctk.CTk):
                                                   corner_radius=6,
                                                   command=self.transaction_table_click) # Añadir comando para click
                 self.transaction_table.pack(expand=True, fill="both", padx=5, pady=5)
+                self._transactions_table_frame = table_frame
+                self._add_load_more_button()
             else:
                  # Mensaje si no hay datos (no debería ocurrir si 'transactions' no estaba vacío)
                  no_data_label = ctk.CTkLabel(table_frame, text="No se encontraron datos para mostrar en la tabla.", font=ctk.CTkFont(size=14))
@@ -416,18 +544,74 @@ class PortfolioApp(ctk.CTk):
             error_label.grid(row=1, column=0, padx=20, pady=20, sticky="nsew")
 
 
+    def _transaction_row_values(self, tx: crud.TransactionRow) -> list[str]:
+        # Calcular coste total incluyendo comisiones
+        total_cost = (tx.quantity * tx.price_per_unit)
+        if tx.fees is not None:
+            if tx.transaction_type == models.TransactionType.BUY: total_cost += tx.fees
+            elif tx.transaction_type == models.TransactionType.SELL: total_cost -= tx.fees
+
+        # Formatear datos para la fila
+        tx_id_str = str(tx.id)
+        timestamp_str = tx.transaction_date.strftime('%d-%m-%Y %H:%M') if tx.transaction_date else "N/A"
+        type_str = tx.transaction_type.name.capitalize() if tx.transaction_type else "N/A"
+        symbol_str = tx.symbol or "N/A"
+
+        # Formateo de números decimales
+        qty_decimals, price_decimals, value_decimals = 8, 4, 2
+        quantity_str = f"{tx.quantity:.{qty_decimals}f}".rstrip('0').rstrip('.') if tx.quantity is not None else "N/A"
+        price_str = f"{tx.price_per_unit:.{price_decimals}f}".rstrip('0').rstrip('.') if tx.price_per_unit is not None else "N/A"
+        total_cost_str = f"{total_cost:,.{value_decimals}f}" if total_cost is not None else "N/A"
+        commission_str = f"{tx.fees:.{value_decimals}f}".rstrip('0').rstrip('.') if tx.fees is not None else "N/A"
+        notes_str = tx.notes if tx.notes else ""
+
+        return [tx_id_str, timestamp_str, type_str, symbol_str, quantity_str, price_str, total_cost_str, commission_str, notes_str]
+
+    def _add_load_more_button(self):
+        # Botón al final de la tabla mientras queden páginas por cargar
+        self._load_more_button = None
+        if self._transactions_cursor is None: return
+        self._load_more_button = ctk.CTkButton(self._transactions_table_frame, text="Cargar más", width=120,
+                                               command=self.load_more_transactions)
+        self._load_more_button.pack(pady=(5, 10))
+
+    def load_more_transactions(self):
+        # Añade la página siguiente (paginación por cursor) como una tabla nueva bajo las anteriores:
+        # CTkTable redibuja todas sus celdas al añadir filas, así cada página cuesta lo mismo.
+        if not self.current_user or self._transactions_cursor is None: return
+        try:
+            transactions, self._transactions_cursor = crud.get_transaction_rows_page(
+                self.db, user_id=self.current_user.id, after=self._transactions_cursor)
+        except Exception as e:
+            logging.error(f"Error al cargar más transacciones: {e}", exc_info=True)
+            CTkMessagebox(title="Error", message=f"No se pudieron cargar más transacciones:\n{e}", icon="cancel")
+            return
+        if self._load_more_button is not None:
+            self._load_more_button.destroy()
+        if transactions:
+            page_table = CTkTable(master=self._transactions_table_frame,
+                                  values=[self._transaction_row_values(tx) for tx in transactions],
+                                  hover_color=ctk.ThemeManager.theme["CTkButton"]["hover_color"],
+                                  corner_radius=6,
+                                  command=lambda data: self.transaction_table_click(data, page_table))
+            page_table.pack(expand=True, fill="both", padx=5, pady=(0, 5))
+        self._add_load_more_button()
+
     # --- Click en Tabla Transacciones ---
-    def transaction_table_click(self, click_data):
+    def transaction_table_click(self, click_data, table=None):
         # Este método se llama cuando se hace clic en una celda de la tabla de transacciones
+        # ('table' es la tabla de una página cargada con "Cargar más"; solo la primera tiene cabecera)
         try:
             row_index = click_data.get("row") # Obtener el índice de la fila clickeada
             edit_exists = hasattr(self, 'edit_transaction_button') # Verificar si los botones existen
             delete_exists = hasattr(self, 'delete_transaction_button')
+            table = table if table is not None else getattr(self, 'transaction_table', None)
+            first_row = 0 if table is not getattr(self, 'transaction_table', None) else 1
 
-            if row_index is not None and row_index > 0: # Ignorar click en cabecera (fila 0)
-                if hasattr(self, 'transaction_table') and self.transaction_table:
+            if row_index is not None and row_index >= first_row: # Ignorar click en cabecera (fila 0)
+                if table:
                     # Obtener el ID de la transacción de la primera columna de la fila seleccionada
-                    selected_id_str = self.transaction_table.get_row(row_index)[0]
+                    selected_id_str = table.get_row(row_index)[0]
                     self.selected_transaction_id = int(selected_id_str)
                     logging.info(f"Fila {row_index} seleccionada. ID Transacción: {self.selected_transaction_id}")
                     # Habilitar botones de editar y eliminar
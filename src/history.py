@@ -0,0 +1,195 @@
+# src/history.py
+# --- Histórico local de precios (tabla price_bars) ---
+# El backfill calcula, por símbolo, qué rangos de fechas faltan según price_bar_coverage
+# y descarga solo esos huecos, agrupando en una sola petición los símbolos que comparten
+# el mismo hueco. Las consultas posteriores (gráficos, analítica) se sirven desde SQLite.
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+import logging
+import time
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .providers import PriceProvider
+
+# Máximo de símbolos por petición de histórico al proveedor
+HISTORY_BATCH_SIZE = 100
+
+
+def _default_provider() -> PriceProvider:
+    # Import diferido para no crear una dependencia circular con crud
+    from . import crud
+    return crud.price_provider
+
+def _merge_ranges(ranges: list[tuple[date, date]]) -> list[tuple[date, date]]:
+    """Une rangos solapados o contiguos (fechas incluidas en ambos extremos)."""
+    merged: list[tuple[date, date]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def get_coverage(db: Session, symbol: str) -> list[tuple[date, date]]:
+    rows = db.query(models.PriceBarCoverage.start_date, models.PriceBarCoverage.end_date)\
+             .filter(models.PriceBarCoverage.symbol == symbol.upper())\
+             .order_by(models.PriceBarCoverage.start_date).all()
+    return _merge_ranges([(r.start_date, r.end_date) for r in rows])
+
+def missing_ranges(db: Session, symbol: str, start: date, end: date) -> list[tuple[date, date]]:
+    """Retorna los rangos [inicio, fin] entre 'start' y 'end' que aún no se han descargado."""
+    gaps = []
+    cursor = start
+    for covered_start, covered_end in get_coverage(db, symbol):
+        if covered_end < cursor:
+            continue
+        if covered_start > end:
+            break
+        if covered_start > cursor:
+            gaps.append((cursor, min(covered_start - timedelta(days=1), end)))
+        cursor = max(cursor, covered_end + timedelta(days=1))
+        if cursor > end:
+            break
+    if cursor <= end:
+        gaps.append((cursor, end))
+    return gaps
+
+def _record_coverage(db: Session, symbol: str, start: date, end: date):
+    # Se reescriben los rangos del símbolo ya fusionados para mantener la tabla compacta
+    ranges = _merge_ranges(get_coverage(db, symbol) + [(start, end)])
+    db.query(models.PriceBarCoverage).filter(models.PriceBarCoverage.symbol == symbol).delete(synchronize_session=False)
+    db.add_all(models.PriceBarCoverage(symbol=symbol, start_date=s, end_date=e) for s, e in ranges)
+
+def _store_bars(db: Session, symbol: str, bars) -> int:
+    if not bars:
+        return 0
+    rows = [{"symbol": symbol, "date": b.date, "open": b.open, "high": b.high, "low": b.low,
+             "close": b.close, "adj_close": b.adj_close, "volume": b.volume} for b in bars]
+    if db.bind.dialect.name == "sqlite":
+        stmt = sqlite_insert(models.PriceBar.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["symbol", "date"],
+            set_={c: stmt.excluded[c] for c in ("open", "high", "low", "close", "adj_close", "volume")})
+        db.execute(stmt, rows)
+    else:
+        for row in rows:
+            db.merge(models.PriceBar(**row))
+    return len(rows)
+
+def backfill(db: Session, symbols, start: date, end: date | None = None,
+             provider: PriceProvider | None = None) -> dict:
+    """
+    Descarga solo los huecos del histórico de 'symbols' entre 'start' y 'end' (por defecto hoy).
+    La barra del día en curso se guarda pero no se marca como cubierta, para refrescarla luego.
+    Solo se marcan como cubiertos los rangos que el proveedor ha servido: si la petición falla
+    o un símbolo no aparece en la respuesta, el hueco se vuelve a intentar en el siguiente backfill.
+    Retorna estadísticas: símbolos, huecos, peticiones al proveedor, huecos no servidos,
+    barras guardadas y tiempo.
+    """
+    end = end or date.today()
+    provider = provider or _default_provider()
+    last_complete_day = date.today() - timedelta(days=1)
+    started = time.perf_counter()
+
+    # Agrupar símbolos por hueco idéntico: una sola petición por grupo
+    gaps_by_range: dict[tuple[date, date], list[str]] = defaultdict(list)
+    symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
+    for symbol in symbols:
+        for gap in missing_ranges(db, symbol, start, end):
+            gaps_by_range[gap].append(symbol)
+
+    stats = {"symbols": len(symbols), "gaps": sum(len(v) for v in gaps_by_range.values()),
+             "requests": 0, "unserved": 0, "bars_stored": 0, "seconds": 0.0}
+    for (gap_start, gap_end), gap_symbols in sorted(gaps_by_range.items()):
+        for i in range(0, len(gap_symbols), HISTORY_BATCH_SIZE):
+            chunk = gap_symbols[i:i + HISTORY_BATCH_SIZE]
+            history = provider.get_history(chunk, gap_start, gap_end)
+            stats["requests"] += 1
+            if history is None:
+                stats["unserved"] += len(chunk)
+                logging.warning(f"Sin histórico de {provider.name} para {len(chunk)} símbolos ({gap_start}..{gap_end}); se reintentará.")
+                continue
+            try:
+                for symbol in chunk:
+                    if symbol not in history:
+                        stats["unserved"] += 1
+                        continue
+                    stats["bars_stored"] += _store_bars(db, symbol, history[symbol])
+                    covered_end = min(gap_end, last_complete_day)
+                    if covered_end >= gap_start:
+                        _record_coverage(db, symbol, gap_start, covered_end)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                logging.error(f"Error al guardar histórico ({gap_start}..{gap_end}) de {len(chunk)} símbolos: {e}", exc_info=True)
+                raise
+
+    stats["seconds"] = time.perf_counter() - started
+    logging.info(f"Backfill de histórico: {stats['gaps']} huecos en {stats['requests']} peticiones "
+                 f"({stats['unserved']} sin servir), {stats['bars_stored']} barras guardadas en {stats['seconds']:.2f}s.")
+    return stats
+
+def get_price_history(db: Session, symbol: str, start: date, end: date | None = None,
+                      backfill_missing: bool = True, provider: PriceProvider | None = None) -> list[models.PriceBar]:
+    """
+    Retorna las barras diarias de 'symbol' entre 'start' y 'end' desde la BD local.
+    Si 'backfill_missing' es True, antes descarga los huecos que falten.
+    """
+    end = end or date.today()
+    symbol = symbol.strip().upper()
+    if backfill_missing and missing_ranges(db, symbol, start, end):
+        backfill(db, [symbol], start, end, provider=provider)
+    return db.query(models.PriceBar)\
+             .filter(models.PriceBar.symbol == symbol, models.PriceBar.date >= start, models.PriceBar.date <= end)\
+             .order_by(models.PriceBar.date).all()
+
+def get_closes(db: Session, symbols, start: date, end: date) -> dict[str, list[tuple[date, Decimal]]]:
+    """Cierres locales (sin backfill) de varios símbolos en una sola consulta, ordenados por fecha."""
+    closes: dict[str, list[tuple[date, Decimal]]] = defaultdict(list)
+    symbols = [s.upper() for s in symbols]
+    if not symbols:
+        return {}
+    rows = db.query(models.PriceBar.symbol, models.PriceBar.date, models.PriceBar.close)\
+             .filter(models.PriceBar.symbol.in_(symbols), models.PriceBar.date >= start, models.PriceBar.date <= end)\
+             .order_by(models.PriceBar.symbol, models.PriceBar.date)
+    for symbol, day, close in rows:
+        closes[symbol].append((day, Decimal(close)))
+    return dict(closes)
+
+def get_closes_as_of(db: Session, symbols, as_of: date) -> dict[str, tuple[date, Decimal]]:
+    """Último cierre local (fecha, precio) en o antes de 'as_of' para cada símbolo, en una consulta."""
+    symbols = list({s.upper() for s in symbols})
+    if not symbols:
+        return {}
+    latest = db.query(models.PriceBar.symbol, func.max(models.PriceBar.date).label("date"))\
+               .filter(models.PriceBar.symbol.in_(symbols), models.PriceBar.date <= as_of)\
+               .group_by(models.PriceBar.symbol).subquery()
+    rows = db.query(models.PriceBar.symbol, models.PriceBar.date, models.PriceBar.close)\
+             .join(latest, (models.PriceBar.symbol == latest.c.symbol) & (models.PriceBar.date == latest.c.date))
+    return {symbol: (day, Decimal(close)) for symbol, day, close in rows}
+
+
+# --- Uso desde línea de comandos ---
+# python -m src.history --start 2020-01-01 [--end 2024-12-31] [SIMBOLO ...]
+# Sin símbolos, completa el histórico de todos los activos registrados en la BD.
+if __name__ == "__main__":
+    import argparse
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Completa el histórico local de precios (solo los huecos).")
+    parser.add_argument("symbols", nargs="*", help="Símbolos (por defecto, todos los activos de la BD)")
+    parser.add_argument("--start", required=True, type=date.fromisoformat, help="Fecha inicial YYYY-MM-DD")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Fecha final YYYY-MM-DD (por defecto hoy)")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        target_symbols = args.symbols or [s for (s,) in session.query(models.Asset.symbol).distinct()]
+        print(backfill(session, target_symbols, args.start, args.end))
+    finally:
+        session.close()
@@ -0,0 +1,329 @@
+# src/importer.py
+# --- Importación en bloque de extractos de bróker (CSV / OFX) ---
+# Las filas se leen de forma perezosa (un generador por formato) y cada una se valida como en
+# crud.create_transaction. Las válidas se insertan con inserciones en bloque, con un commit por
+# lote de IMPORT_BATCH_SIZE filas; las rechazadas se escriben, con el motivo, en un CSV aparte.
+# Los activos que no existen se crean al vuelo (un INSERT por símbolo nuevo).
+#
+# Coherencia con las estructuras derivadas: el primer lote borra las posiciones materializadas
+# del usuario (positions.clear_user) y cada lote invalida sus instantáneas desde la fecha más
+# antigua del lote e incrementa users.data_version. Si la importación se interrumpe, lo ya
+# importado queda guardado y las posiciones se reconstruyen en la siguiente lectura
+# (ensure_built); al terminar se recalculan en bloque en el último commit.
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+import logging
+import os
+import re
+import time
+from typing import Iterable, Iterator
+
+from sqlalchemy.orm import Session
+
+from . import models, positions, snapshots
+
+# Filas por lote (una inserción en bloque y un commit por lote)
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "1000"))
+
+# Campos de una fila normalizada (valores en texto, tal cual vienen del fichero)
+FIELDS = ("date", "type", "symbol", "quantity", "price", "fees", "notes", "asset_type", "name")
+
+# Cabeceras CSV aceptadas (en minúsculas) para cada campo
+CSV_ALIASES = {
+    "date": ("date", "fecha", "trade date", "fecha operación", "fecha operacion"),
+    "type": ("type", "tipo", "action", "operación", "operacion"),
+    "symbol": ("symbol", "símbolo", "simbolo", "ticker"),
+    "quantity": ("quantity", "cantidad", "units", "shares"),
+    "price": ("price", "precio", "price_per_unit", "precio unitario", "unit price"),
+    "fees": ("fees", "comisiones", "commission", "comisión", "comision"),
+    "notes": ("notes", "notas", "memo", "description", "descripción"),
+    "asset_type": ("asset_type", "tipo de activo", "tipo activo"),
+    "name": ("name", "nombre", "security", "security name"),
+}
+DATE_FORMATS = ('%Y-%m-%d %H:%M', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d', '%d/%m/%Y %H:%M', '%d/%m/%Y')
+TYPE_ALIASES = {"BUY": models.TransactionType.BUY, "COMPRA": models.TransactionType.BUY,
+                "SELL": models.TransactionType.SELL, "VENTA": models.TransactionType.SELL}
+
+# OFX: agregados de compra/venta de inversiones y tipo de activo según el bloque SECLIST
+OFX_BUY_TAGS = {"BUYSTOCK", "BUYMF", "BUYOTHER", "BUYDEBT", "BUYOPT"}
+OFX_SELL_TAGS = {"SELLSTOCK", "SELLMF", "SELLOTHER", "SELLDEBT", "SELLOPT"}
+OFX_SECINFO_TYPES = {"STOCKINFO": "STOCK", "MFINFO": "MUTUAL_FUND", "DEBTINFO": "OTHER",
+                     "OPTINFO": "OTHER", "OTHERINFO": "OTHER"}
+_OFX_TAG = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+OFX_READ_CHUNK = 64 * 1024
+
+
+# --- Lectores (generadores de (número de fila, fila normalizada)) ---
+
+def iter_csv_rows(path: str, delimiter: str | None = None) -> Iterator[tuple[int, dict]]:
+    """Filas de un CSV con cabecera. Detecta ',' o ';' si no se indica el separador."""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if delimiter is None:
+            header = f.readline()
+            delimiter = ";" if header.count(";") > header.count(",") else ","
+            f.seek(0)
+        reader = csv.DictReader(f, delimiter=delimiter)
+        columns = {}
+        for column in reader.fieldnames or []:
+            for field, aliases in CSV_ALIASES.items():
+                if column.strip().lower() in aliases and field not in columns:
+                    columns[field] = column
+        missing = [field for field in ("date", "type", "symbol", "quantity", "price") if field not in columns]
+        if missing:
+            raise ValueError(f"Faltan columnas obligatorias en el CSV: {', '.join(missing)}.")
+        for row in reader:
+            yield reader.line_num, {field: (row.get(column) or "").strip() for field, column in columns.items()}
+
+def _ofx_elements(path: str) -> Iterator[tuple[bool, str, str]]:
+    """(es cierre, etiqueta, texto) de cada etiqueta OFX, leyendo el fichero por bloques (SGML o XML)."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        buffer = ""
+        while True:
+            chunk = f.read(OFX_READ_CHUNK)
+            buffer += chunk
+            # Se procesa hasta la última '<' (el texto de la última etiqueta puede seguir en el siguiente bloque)
+            cut = buffer.rfind("<") if chunk else len(buffer)
+            if cut < 0:
+                continue
+            for match in _OFX_TAG.finditer(buffer, 0, cut):
+                yield match.group(1) == "/", match.group(2).upper(), match.group(3).strip()
+            buffer = buffer[cut:]
+            if not chunk:
+                return
+
+def _ofx_date(value: str) -> str:
+    # AAAAMMDD[HHMMSS[.XXX]][[-5:EST]] -> 'AAAA-MM-DD HH:MM:SS'
+    digits = re.match(r"\d+", value or "")
+    digits = digits.group(0) if digits else ""
+    if len(digits) < 8:
+        return value
+    moment = digits[:14].ljust(14, "0")
+    return f"{moment[:4]}-{moment[4:6]}-{moment[6:8]} {moment[8:10]}:{moment[10:12]}:{moment[12:14]}"
+
+def iter_ofx_rows(path: str) -> Iterator[tuple[int, dict]]:
+    """
+    Operaciones de compra/venta (INVBUY/INVSELL) de un extracto OFX de inversiones.
+    La lista de valores (SECLIST, con el ticker de cada CUSIP/ISIN) suele ir después de las
+    operaciones, así que el fichero se recorre dos veces en streaming: valores y operaciones.
+    """
+    securities: dict[str, dict] = {}
+    info = None
+    for closing, tag, text in _ofx_elements(path):
+        if tag in OFX_SECINFO_TYPES:
+            if closing:
+                if info and info.get("id"):
+                    securities[info["id"]] = info
+                info = None
+            else:
+                info = {"asset_type": OFX_SECINFO_TYPES[tag]}
+        elif info is not None and not closing:
+            if tag == "UNIQUEID": info["id"] = text
+            elif tag == "TICKER": info["symbol"] = text
+            elif tag == "SECNAME": info["name"] = text
+
+    number, record = 0, None
+    for closing, tag, text in _ofx_elements(path):
+        if tag in OFX_BUY_TAGS or tag in OFX_SELL_TAGS:
+            if not closing:
+                record = {"type": "BUY" if tag in OFX_BUY_TAGS else "SELL"}
+                continue
+            if record is None:
+                continue
+            number += 1
+            security = securities.get(record.pop("id", ""), {})
+            fees = sum((_ofx_amount(record.pop(k, "0")) for k in ("COMMISSION", "FEES", "TAXES")), Decimal(0))
+            yield number, {"date": _ofx_date(record.get("date", "")), "type": record["type"],
+                           "symbol": security.get("symbol", ""), "quantity": record.get("quantity", "").lstrip("-"),
+                           "price": record.get("price", ""), "fees": str(fees), "notes": record.get("notes", ""),
+                           "asset_type": security.get("asset_type", ""), "name": security.get("name", "")}
+            record = None
+        elif record is not None and not closing:
+            if tag == "DTTRADE": record["date"] = text
+            elif tag == "UNITS": record["quantity"] = text
+            elif tag == "UNITPRICE": record["price"] = text
+            elif tag == "UNIQUEID": record["id"] = text
+            elif tag == "MEMO": record["notes"] = text
+            elif tag in ("COMMISSION", "FEES", "TAXES"): record[tag] = text
+
+def _ofx_amount(value: str) -> Decimal:
+    try:
+        return abs(Decimal(value))
+    except InvalidOperation:
+        return Decimal(0)
+
+def iter_rows(path: str, fmt: str | None = None) -> Iterator[tuple[int, dict]]:
+    """Elige el lector por 'fmt' ('csv' u 'ofx') o por la extensión del fichero."""
+    fmt = (fmt or os.path.splitext(path)[1].lstrip(".")).lower()
+    if fmt == "csv":
+        return iter_csv_rows(path)
+    if fmt in ("ofx", "qfx"):
+        return iter_ofx_rows(path)
+    raise ValueError(f"Formato de importación no soportado: '{fmt}'. Use 'csv' u 'ofx'.")
+
+
+# --- Validación y carga ---
+
+def _parse_date(value: str) -> datetime:
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            continue
+    raise ValueError(f"Fecha inválida: '{value}'.")
+
+def convert_row(row: dict) -> dict:
+    """Valida una fila normalizada y la convierte a los tipos del modelo. Lanza ValueError."""
+    from .crud import _validate_and_convert_transaction_data # Import diferido: crud carga el proveedor de precios
+
+    transaction_type = TYPE_ALIASES.get(row.get("type", "").strip().upper())
+    if transaction_type is None:
+        raise ValueError(f"Tipo de transacción inválido: '{row.get('type', '')}'.")
+    symbol = row.get("symbol", "").strip().upper()
+    if not symbol:
+        raise ValueError("El símbolo del activo no puede estar vacío.")
+    quantity, price, fees = _validate_and_convert_transaction_data(
+        row.get("quantity", ""), row.get("price", ""), row.get("fees") or "0")
+    asset_type = row.get("asset_type", "").strip().upper() or "STOCK"
+    if asset_type not in models.AssetType.__members__:
+        raise ValueError(f"Tipo de activo inválido: '{row.get('asset_type')}'.")
+    return {"symbol": symbol, "asset_type": models.AssetType[asset_type], "name": row.get("name") or None,
+            "transaction_type": transaction_type, "quantity": quantity, "price_per_unit": price, "fees": fees,
+            "transaction_date": _parse_date(row.get("date", "").strip()), "notes": (row.get("notes") or "").strip() or None}
+
+class _Rejects:
+    """CSV de filas rechazadas; el fichero solo se crea si hay alguna."""
+
+    def __init__(self, path: str | None):
+        self.path, self.count = path, 0
+        self._file = self._writer = None
+
+    def add(self, number: int, row: dict, error: str):
+        self.count += 1
+        if self.path is None:
+            return
+        if self._writer is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(("fila", "error", *FIELDS))
+        self._writer.writerow((number, error, *(row.get(field, "") for field in FIELDS)))
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+def import_transactions(db: Session, owner_id: int, rows: Iterable[tuple[int, dict]],
+                        batch_size: int | None = None, rejects_path: str | None = None) -> dict:
+    """
+    Importa las filas (número, fila normalizada) para el usuario: un commit por lote y uno final
+    con las posiciones recalculadas. Las filas inválidas van a 'rejects_path' con el motivo.
+    Retorna {"rows", "imported", "rejected", "assets_created", "batches", "seconds", "rows_per_second"}.
+    """
+    from .crud import bump_data_version # Import diferido: crud carga el proveedor de precios
+
+    batch_size = batch_size or IMPORT_BATCH_SIZE
+    if batch_size < 1:
+        raise ValueError("El tamaño de lote debe ser positivo.")
+    if db.query(models.User.id).filter(models.User.id == owner_id).scalar() is None:
+        raise ValueError(f"El usuario ID {owner_id} no existe.")
+
+    started = time.perf_counter()
+    assets = {symbol.upper(): asset_id for asset_id, symbol in
+              db.query(models.Asset.id, models.Asset.symbol).filter(models.Asset.owner_id == owner_id)}
+    rejects = _Rejects(rejects_path)
+    stats = {"rows": 0, "imported": 0, "rejected": 0, "assets_created": 0, "batches": 0}
+    batch: list[dict] = []
+
+    def flush_batch():
+        if not batch:
+            return
+        if stats["batches"] == 0:
+            positions.clear_user(db, owner_id)
+        db.execute(models.Transaction.__table__.insert(), batch)
+        snapshots.invalidate_from(db, owner_id, min(row["transaction_date"] for row in batch))
+        bump_data_version(db, owner_id)
+        db.commit()
+        stats["batches"] += 1
+        stats["imported"] += len(batch)
+        logging.debug(f"Importación usuario ID {owner_id}: lote {stats['batches']} ({stats['imported']} filas).")
+        batch.clear()
+
+    try:
+        for number, row in rows:
+            stats["rows"] += 1
+            try:
+                values = convert_row(row)
+            except ValueError as e:
+                rejects.add(number, row, str(e))
+                continue
+            asset_id = assets.get(values["symbol"])
+            if asset_id is None:
+                # Queda en la transacción del lote en curso: se guarda con él
+                asset_id = db.execute(models.Asset.__table__.insert().values(
+                    owner_id=owner_id, symbol=values["symbol"], name=values["name"] or values["symbol"],
+                    asset_type=values["asset_type"])).inserted_primary_key[0]
+                assets[values["symbol"]] = asset_id
+                stats["assets_created"] += 1
+            batch.append({"owner_id": owner_id, "asset_id": asset_id, "transaction_type": values["transaction_type"],
+                          "quantity": values["quantity"], "price_per_unit": values["price_per_unit"],
+                          "fees": values["fees"], "transaction_date": values["transaction_date"], "notes": values["notes"]})
+            if len(batch) >= batch_size:
+                flush_batch()
+        flush_batch()
+    except Exception as e:
+        # Cualquier error a mitad de lote (también al crear un activo) descarta el lote en curso:
+        # los lotes anteriores ya están confirmados
+        db.rollback()
+        logging.error(f"Error al importar el lote {stats['batches'] + 1} para usuario ID {owner_id}: {e}")
+        raise
+    finally:
+        rejects.close()
+
+    if stats["batches"]:
+        try:
+            positions.rebuild_user(db, owner_id)
+            bump_data_version(db, owner_id)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logging.error(f"Error al recalcular posiciones tras la importación (usuario ID {owner_id}): {e}")
+            raise
+    stats["rejected"] = rejects.count
+    stats["seconds"] = time.perf_counter() - started
+    stats["rows_per_second"] = stats["rows"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    logging.info(f"Importación usuario ID {owner_id}: {stats['imported']} de {stats['rows']} filas en "
+                 f"{stats['batches']} lotes, {stats['rejected']} rechazadas, {stats['assets_created']} activos "
+                 f"nuevos, {stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} filas/s).")
+    return stats
+
+def import_file(db: Session, owner_id: int, path: str, fmt: str | None = None, batch_size: int | None = None,
+                rejects_path: str | None = None) -> dict:
+    """Importa un fichero CSV u OFX (ver import_transactions)."""
+    return import_transactions(db, owner_id, iter_rows(path, fmt), batch_size, rejects_path)
+
+
+# --- Uso desde línea de comandos ---
+# python -m src.importer --user ID fichero.(csv|ofx) [--format csv|ofx] [--batch-size N] [--rejects RUTA]
+if __name__ == "__main__":
+    import argparse
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Importa transacciones desde un extracto CSV u OFX.")
+    parser.add_argument("path", help="Fichero a importar")
+    parser.add_argument("--user", type=int, required=True, help="ID del usuario destino")
+    parser.add_argument("--format", choices=("csv", "ofx"), default=None, help="Formato (por defecto según la extensión)")
+    parser.add_argument("--batch-size", type=int, default=None, help="Filas por lote (por defecto IMPORT_BATCH_SIZE)")
+    parser.add_argument("--rejects", default=None, help="CSV de filas rechazadas (por defecto <fichero>.rechazos.csv)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    rejects_path = args.rejects or f"{os.path.splitext(args.path)[0]}.rechazos.csv"
+    session = SessionLocal()
+    try:
+        stats = import_file(session, args.user, args.path, args.format, args.batch_size, rejects_path)
+    finally:
+        session.close()
+    print(f"{stats['imported']} de {stats['rows']} filas importadas en {stats['seconds']:.2f}s "
+          f"({stats['rows_per_second']:,.0f} filas/s), {stats['assets_created']} activos nuevos.")
+    if stats["rejected"]:
+        print(f"{stats['rejected']} filas rechazadas: {rejects_path}")
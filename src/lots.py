@@ -0,0 +1,339 @@
+# src/lots.py
+# --- Libro de lotes FIFO ---
+# Mantiene los lotes abiertos de un activo en una deque ordenada por fecha de compra:
+# las compras se añaden al final y las ventas consumen desde la cabeza, de modo que cada
+# lote se abre y se cierra una sola vez (O(1) amortizado por operación, sin reordenar ni
+# reconstruir listas en cada venta). Cada venta reporta sus emparejamientos con el P&L realizado.
+# Hay dos implementaciones con la misma interfaz (ver new_ledger y LOT_ENGINE):
+#   - LotLedger: aritmética Decimal.
+#   - FixedLotLedger: enteros escalados (cantidades con 10 decimales, la escala de las
+#     columnas Numeric(24,10); importes con 20 decimales, el producto exacto cantidad x precio).
+#     Solo convierte a Decimal al leer sus atributos, redondeando a la escala de la BD.
+from collections import deque
+from datetime import datetime
+from decimal import Decimal
+from typing import NamedTuple
+import logging
+import os
+
+from . import models
+
+# Tolerancia para comparar cantidades Decimal con cero
+ZERO_TOLERANCE = Decimal('1e-9')
+# Motor de los libros de lotes (replays completos y escrituras incrementales de positions.py):
+# "decimal" (LotLedger) o "fixed" (FixedLotLedger)
+LOT_ENGINE = os.getenv("LOT_ENGINE", "decimal").lower()
+# Escala (decimales) de las columnas Numeric de la BD
+SCALE = 10
+RESULT_QUANTUM = Decimal(1).scaleb(-SCALE)
+
+
+class Lot:
+    """Lote de compra abierto (cantidad restante y coste unitario con comisiones)."""
+    __slots__ = ("date", "quantity", "cost_per_unit", "transaction_id")
+
+    def __init__(self, date: datetime, quantity: Decimal, cost_per_unit: Decimal, transaction_id: int | None = None):
+        self.date = date
+        self.quantity = quantity
+        self.cost_per_unit = cost_per_unit
+        self.transaction_id = transaction_id
+
+    def __repr__(self):
+        return f"<Lot(date={self.date:%Y-%m-%d}, quantity={self.quantity}, cost_per_unit={self.cost_per_unit})>"
+
+
+class LotMatch(NamedTuple):
+    """Parte de una venta casada con un lote de compra."""
+    buy_transaction_id: int | None
+    sell_transaction_id: int | None
+    buy_date: datetime
+    sell_date: datetime
+    quantity: Decimal
+    cost_basis: Decimal
+    proceeds: Decimal # Ingresos netos de la venta prorrateados por cantidad
+    realized_pnl: Decimal
+
+
+class LotLedger:
+    """
+    Lotes abiertos de un activo con emparejamiento FIFO.
+    Las transacciones deben aplicarse en orden (fecha, id), como las retorna la BD.
+    """
+
+    def __init__(self, label: str = "", record_matches: bool = False):
+        self.label = label # Solo para los mensajes de log: el símbolo o "ID n (usuario m)"
+        self.lots: deque[Lot] = deque()
+        # Con record_matches=True se acumulan aquí los emparejamientos de todas las ventas
+        self.matches: list[LotMatch] | None = [] if record_matches else None
+        self.quantity = Decimal(0)
+        self.cost_basis = Decimal(0)
+        self.realized_pnl = Decimal(0)
+
+    def buy(self, date: datetime, quantity: Decimal, price: Decimal, fees: Decimal = Decimal(0),
+            transaction_id: int | None = None):
+        cost = (quantity * price) + fees
+        cost_per_unit = cost / quantity if quantity > ZERO_TOLERANCE else Decimal(0)
+        self.lots.append(Lot(date, quantity, cost_per_unit, transaction_id))
+        self.quantity += quantity
+        self.cost_basis += cost
+
+    def sell(self, date: datetime, quantity: Decimal, price: Decimal, fees: Decimal = Decimal(0),
+             transaction_id: int | None = None) -> list[LotMatch]:
+        """Consume lotes desde el más antiguo. Retorna los emparejamientos de la venta."""
+        proceeds = (quantity * price) - fees
+        if quantity > self.quantity + ZERO_TOLERANCE:
+            logging.warning(f"Activo {self.label}: Venta de {quantity} excede la cantidad actual {self.quantity}. Se ajustará a {self.quantity}.")
+            quantity = self.quantity
+
+        matches: list[LotMatch] = []
+        sold_cost_basis = Decimal(0)
+        remaining = quantity
+        lots = self.lots
+        while remaining > ZERO_TOLERANCE and lots:
+            lot = lots[0]
+            taken = min(remaining, lot.quantity)
+            cost = taken * lot.cost_per_unit
+            sold_cost_basis += cost
+            remaining -= taken
+            if lot.quantity > taken + ZERO_TOLERANCE:
+                lot.quantity -= taken
+            else:
+                lots.popleft()
+            share = proceeds * taken / quantity if quantity > ZERO_TOLERANCE else Decimal(0)
+            matches.append(LotMatch(lot.transaction_id, transaction_id, lot.date, date, taken, cost, share, share - cost))
+
+        self.quantity -= quantity
+        self.cost_basis -= sold_cost_basis
+        self.realized_pnl += proceeds - sold_cost_basis
+        if self.matches is not None:
+            self.matches.extend(matches)
+        return matches
+
+    def restore(self, lots, quantity: Decimal, cost_basis: Decimal, realized_pnl: Decimal):
+        """Carga un estado guardado (lotes abiertos en orden de fecha y totales de la posición)."""
+        self.lots = deque(lots)
+        self.quantity = quantity
+        self.cost_basis = cost_basis
+        self.realized_pnl = realized_pnl
+
+    def apply(self, transaction: models.Transaction) -> list[LotMatch]:
+        """Aplica una transacción de la BD. Retorna los emparejamientos si es una venta."""
+        quantity = Decimal(transaction.quantity)
+        price = Decimal(transaction.price_per_unit)
+        fees = Decimal(transaction.fees) if transaction.fees is not None else Decimal(0)
+        if transaction.transaction_type == models.TransactionType.BUY:
+            self.buy(transaction.transaction_date, quantity, price, fees, transaction.id)
+            return []
+        if transaction.transaction_type == models.TransactionType.SELL:
+            return self.sell(transaction.transaction_date, quantity, price, fees, transaction.id)
+        return []
+
+    def is_open(self) -> bool:
+        return self.quantity > ZERO_TOLERANCE
+
+    def __repr__(self):
+        return f"<LotLedger({self.label}, quantity={self.quantity}, lots={len(self.lots)})>"
+
+
+_UNIT = 10 ** SCALE # 1 en cantidades (escala 10)
+_MONEY = _UNIT * _UNIT # 1 en importes (escala 20)
+_FIXED_ZERO = int(ZERO_TOLERANCE.scaleb(SCALE))
+
+def to_fixed(value: Decimal, scale: int = SCALE) -> int:
+    """Decimal -> entero escalado (redondeo al par si trae más decimales que 'scale')."""
+    return int(Decimal(value).scaleb(scale).to_integral_value())
+
+def _round_div(numerator: int, denominator: int) -> int:
+    """numerator / denominator redondeado al entero más cercano (empates al par)."""
+    quotient, remainder = divmod(numerator, denominator)
+    twice = 2 * remainder
+    if twice > denominator or (twice == denominator and quotient % 2):
+        quotient += 1
+    return quotient
+
+def _quantity(value: int) -> Decimal:
+    return Decimal(value).scaleb(-SCALE)
+
+def _money(value: int) -> Decimal:
+    """Importe en escala 20 -> Decimal con la escala de la BD."""
+    return Decimal(_round_div(value, _UNIT)).scaleb(-SCALE)
+
+
+class FixedLotLedger:
+    """
+    Lotes abiertos de un activo con emparejamiento FIFO en aritmética entera (misma interfaz
+    que LotLedger). Cada lote guarda su cantidad y su coste restantes; el coste de una venta
+    parcial de un lote es su parte proporcional redondeada, y el de un lote que se cierra es
+    todo su coste restante, así que el coste base nunca acumula residuos.
+    """
+
+    def __init__(self, label: str = "", record_matches: bool = False):
+        self.label = label
+        # Lotes como [fecha, cantidad, coste restante, id de transacción]
+        self._lots = deque()
+        self._raw_matches: list[tuple] | None = [] if record_matches else None
+        self._matches: list[LotMatch] = []
+        self._quantity = 0
+        self._cost_basis = 0
+        self._realized_pnl = 0
+
+    # --- Frontera Decimal: solo aquí se convierte ---
+    @property
+    def quantity(self) -> Decimal:
+        return _quantity(self._quantity)
+
+    @property
+    def cost_basis(self) -> Decimal:
+        return _money(self._cost_basis)
+
+    @property
+    def realized_pnl(self) -> Decimal:
+        return _money(self._realized_pnl)
+
+    @property
+    def lots(self) -> deque[Lot]:
+        return deque(Lot(date, _quantity(quantity), _money(_round_div(cost * _UNIT, quantity)) if quantity else Decimal(0), tx_id)
+                     for date, quantity, cost, tx_id in self._open_lots())
+
+    @property
+    def matches(self) -> list[LotMatch] | None:
+        if self._raw_matches is None:
+            return None
+        # Solo se convierten los emparejamientos nuevos desde la última lectura
+        for raw in self._raw_matches[len(self._matches):]:
+            self._matches.append(self._to_match(raw))
+        return self._matches
+
+    @staticmethod
+    def _to_match(raw: tuple) -> LotMatch:
+        buy_id, sell_id, buy_date, sell_date, quantity, cost, proceeds = raw
+        return LotMatch(buy_id, sell_id, buy_date, sell_date, _quantity(quantity), _money(cost), _money(proceeds),
+                        _money(proceeds - cost))
+
+    # --- Orden de consumo de los lotes (FIFO); valuation.py lo redefine para LIFO, HIFO y AVERAGE ---
+    def _open_lots(self):
+        """Lotes abiertos en orden de consumo."""
+        return self._lots
+
+    def _push_lot(self, lot: list):
+        self._lots.append(lot)
+
+    def _next_lot(self) -> list:
+        return self._lots[0]
+
+    def _pop_lot(self):
+        self._lots.popleft()
+
+    # --- Operaciones sobre enteros escalados ---
+    def buy_fixed(self, date: datetime, quantity: int, price: int, fees: int = 0, transaction_id: int | None = None):
+        """Compra con cantidad, precio y comisiones en escala 10."""
+        cost = quantity * price + fees * _UNIT
+        self._push_lot([date, quantity, cost, transaction_id])
+        self._quantity += quantity
+        self._cost_basis += cost
+
+    def sell_fixed(self, date: datetime, quantity: int, price: int, fees: int = 0,
+                   transaction_id: int | None = None) -> list[tuple]:
+        """Venta con cantidad, precio y comisiones en escala 10. Retorna los emparejamientos en enteros."""
+        proceeds = quantity * price - fees * _UNIT
+        if quantity > self._quantity + _FIXED_ZERO:
+            logging.warning(f"Activo {self.label}: Venta de {_quantity(quantity)} excede la cantidad actual {self.quantity}. Se ajustará a {self.quantity}.")
+            quantity = self._quantity
+
+        matches = []
+        sold_cost_basis = 0
+        remaining = quantity
+        while remaining > _FIXED_ZERO and self._lots:
+            lot = self._next_lot()
+            lot_quantity = lot[1]
+            if lot_quantity > remaining + _FIXED_ZERO:
+                taken = remaining
+                cost = _round_div(lot[2] * taken, lot_quantity)
+                lot[1] -= taken
+                lot[2] -= cost
+            else:
+                taken = min(remaining, lot_quantity)
+                cost = lot[2]
+                self._pop_lot()
+            sold_cost_basis += cost
+            remaining -= taken
+            share = _round_div(proceeds * taken, quantity) if quantity > _FIXED_ZERO else 0
+            matches.append((lot[3], transaction_id, lot[0], date, taken, cost, share))
+
+        self._quantity -= quantity
+        self._cost_basis -= sold_cost_basis
+        self._realized_pnl += proceeds - sold_cost_basis
+        if self._raw_matches is not None:
+            self._raw_matches.extend(matches)
+        return matches
+
+    # --- Misma interfaz que LotLedger ---
+    def restore(self, lots, quantity: Decimal, cost_basis: Decimal, realized_pnl: Decimal):
+        """
+        Carga un estado guardado (lotes abiertos en orden de fecha y totales de la posición).
+        El coste restante de cada lote es su cantidad por el coste unitario guardado.
+        """
+        self._lots = deque()
+        for lot in lots:
+            lot_quantity = to_fixed(lot.quantity)
+            self._push_lot([lot.date, lot_quantity, lot_quantity * to_fixed(lot.cost_per_unit), lot.transaction_id])
+        self._quantity = to_fixed(quantity)
+        self._cost_basis = to_fixed(cost_basis, 2 * SCALE)
+        self._realized_pnl = to_fixed(realized_pnl, 2 * SCALE)
+
+    def buy(self, date: datetime, quantity: Decimal, price: Decimal, fees: Decimal = Decimal(0),
+            transaction_id: int | None = None):
+        self.buy_fixed(date, to_fixed(quantity), to_fixed(price), to_fixed(fees), transaction_id)
+
+    def sell(self, date: datetime, quantity: Decimal, price: Decimal, fees: Decimal = Decimal(0),
+             transaction_id: int | None = None) -> list[LotMatch]:
+        return [self._to_match(m) for m in self.sell_fixed(date, to_fixed(quantity), to_fixed(price), to_fixed(fees), transaction_id)]
+
+    def apply(self, transaction: models.Transaction) -> list[LotMatch]:
+        """Aplica una transacción de la BD (importes Decimal). Retorna los emparejamientos si es una venta."""
+        fees = to_fixed(transaction.fees) if transaction.fees is not None else 0
+        if transaction.transaction_type == models.TransactionType.BUY:
+            self.buy_fixed(transaction.transaction_date, to_fixed(transaction.quantity),
+                           to_fixed(transaction.price_per_unit), fees, transaction.id)
+            return []
+        if transaction.transaction_type == models.TransactionType.SELL:
+            return [self._to_match(m) for m in self.sell_fixed(transaction.transaction_date, to_fixed(transaction.quantity),
+                                                               to_fixed(transaction.price_per_unit), fees, transaction.id)]
+        return []
+
+    def apply_fixed(self, transaction):
+        """
+        Aplica una fila con cantidad, precio y comisiones ya escalados a enteros (escala 10),
+        p.ej. leídos así desde SQL (ver positions.iter_ledgers). No convierte nada a Decimal.
+        """
+        if transaction.transaction_type == models.TransactionType.BUY:
+            self.buy_fixed(transaction.transaction_date, transaction.quantity, transaction.price_per_unit,
+                           transaction.fees, transaction.id)
+        elif transaction.transaction_type == models.TransactionType.SELL:
+            self.sell_fixed(transaction.transaction_date, transaction.quantity, transaction.price_per_unit,
+                            transaction.fees, transaction.id)
+
+    def is_open(self) -> bool:
+        return self._quantity > _FIXED_ZERO
+
+    def __repr__(self):
+        return f"<FixedLotLedger({self.label}, quantity={self.quantity}, lots={len(self._lots)})>"
+
+
+def new_ledger(label: str = "", record_matches: bool = False, engine: str | None = None) -> LotLedger | FixedLotLedger:
+    """Libro de lotes del motor configurado ('engine' o LOT_ENGINE): "decimal" o "fixed"."""
+    engine = (engine or LOT_ENGINE).lower()
+    if engine == "fixed":
+        return FixedLotLedger(label, record_matches)
+    if engine == "decimal":
+        return LotLedger(label, record_matches)
+    raise ValueError(f"Motor de lotes desconocido: '{engine}'. Use 'decimal' o 'fixed'.")
+
+
+def replay(transactions, label: str = "", record_matches: bool = False,
+           engine: str | None = None) -> LotLedger | FixedLotLedger:
+    """Construye el libro de lotes aplicando las transacciones en orden."""
+    ledger = new_ledger(label, record_matches, engine)
+    for t in transactions:
+        ledger.apply(t)
+    return ledger
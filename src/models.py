@@ -1,6 +1,6 @@
 # src/models.py
-from sqlalchemy import (Column, Integer, String, Float, DateTime, ForeignKey,
-                        Enum as SQLEnum, Numeric, UniqueConstraint)
+from sqlalchemy import (Column, Integer, BigInteger, String, Float, Date, DateTime, ForeignKey,
+                        Enum as SQLEnum, Numeric, UniqueConstraint, Index)
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from enum import Enum as PyEnum
@@ -30,6 +30,14 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Se incrementa con cada alta, edición o borrado de transacciones del usuario (ver crud);
+    # invalida los resultados de posiciones guardados en caché (position_cache.py).
+    data_version = Column(Integer, nullable=False, default=0, server_default="0")
+
+    # Login y alta comparan sin distinguir mayúsculas (crud.get_user_by_*): índices sobre la
+    # misma expresión lower(...) que usan esas consultas, para no recorrer toda la tabla.
+    __table_args__ = (Index('ix_users_username_lower', func.lower(username)),
+                      Index('ix_users_email_lower', func.lower(email)))
 
     # Relaciones: Un usuario puede tener muchos activos y muchas transacciones.
     # 'cascade="all, delete-orphan"' significa que si se borra un usuario,
@@ -42,8 +50,6 @@ class User(Base):
 
 class Asset(Base):
     __tablename__ = "assets"
-    # Añadir una restricción única para que un usuario no pueda tener el mismo símbolo dos veces
-    __table_args__ = (UniqueConstraint('owner_id', 'symbol', name='uq_user_asset_symbol'),)
 
     id = Column(Integer, primary_key=True, index=True)
     symbol = Column(String, index=True, nullable=False) # Ej: AAPL, BTC-USD
@@ -53,15 +59,21 @@ class Asset(Base):
     # Clave foránea para relacionar con el usuario propietario
     owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
 
+    # Añadir una restricción única para que un usuario no pueda tener el mismo símbolo dos veces,
+    # y un índice para buscar por símbolo sin distinguir mayúsculas (crud.get_asset_by_symbol)
+    __table_args__ = (UniqueConstraint('owner_id', 'symbol', name='uq_user_asset_symbol'),
+                      Index('ix_assets_owner_symbol_upper', owner_id, func.upper(symbol)))
+
     # Relaciones: Un activo pertenece a un usuario y puede tener muchas transacciones.
     owner = relationship("User", back_populates="assets")
 
-    # --- MODIFICACIÓN IMPORTANTE ---
-    # Se quita 'cascade="all, delete-orphan"' de aquí.
-    # No queremos borrar el historial de transacciones si se elimina un activo.
-    # Si quisiéramos borrar transacciones al borrar el activo, necesitaríamos lógica explícita
-    # o re-añadir el cascade si estamos seguros de ese comportamiento.
-    # 'passive_deletes=True' puede ser útil si la base de datos maneja la restricción FK.
+    # --- IMPORTANTE ---
+    # La relación no tiene 'cascade="all, delete-orphan"', pero el borrado lo hace la BD:
+    # transactions.asset_id (y positions, open_lots y lot_matches) tienen ON DELETE CASCADE, y
+    # el perfil SQLite 'tuned' (database.py) activa foreign_keys. Es decir, borrar un activo
+    # borra todo su historial de transacciones y sus posiciones y lotes. Con el perfil
+    # 'default' las claves foráneas no se comprueban y las transacciones quedarían huérfanas.
+    # 'passive_deletes=True': el ORM no carga las transacciones para borrarlas, lo deja a la BD.
     transactions = relationship("Transaction", back_populates="asset", cascade="save-update, merge", passive_deletes=True)
 
     def __repr__(self):
@@ -70,7 +82,7 @@ class Asset(Base):
 class Transaction(Base):
     __tablename__ = "transactions"
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     transaction_type = Column(SQLEnum(TransactionType), nullable=False) # BUY o SELL
 
     # Usar Numeric para precisión financiera.
@@ -79,7 +91,7 @@ class Transaction(Base):
     # Ajusta según necesites (e.g., para criptos con muchos decimales).
     quantity = Column(Numeric(precision=24, scale=10), nullable=False)
     price_per_unit = Column(Numeric(precision=24, scale=10), nullable=False)
-    transaction_date = Column(DateTime(timezone=True), nullable=False, default=func.now(), index=True)
+    transaction_date = Column(DateTime(timezone=True), nullable=False, default=func.now())
     fees = Column(Numeric(precision=18, scale=8), nullable=True, default=0.0)
     notes = Column(String, nullable=True) # Para comentarios adicionales
 
@@ -91,6 +103,12 @@ class Transaction(Base):
     asset = relationship("Asset", back_populates="transactions")
     owner = relationship("User", back_populates="transactions")
 
+    # Índices con el orden de las consultas reales (filtro + ORDER BY sin ordenar en memoria):
+    #   - (usuario, activo, fecha, id): historial de un activo, replays FIFO y motor de valoración.
+    #   - (usuario, fecha, id): lista de transacciones del usuario, instantáneas y rentabilidades.
+    __table_args__ = (Index('ix_transactions_owner_asset_date', 'owner_id', 'asset_id', 'transaction_date', 'id'),
+                      Index('ix_transactions_owner_date', 'owner_id', 'transaction_date', 'id'))
+
     def __repr__(self):
         try:
             # Intentar calcular el valor total, manejando posible None o error
@@ -104,4 +122,142 @@ class Transaction(Base):
 
         return (f"<Transaction(id={self.id}, type='{self.transaction_type.name}', "
                 f"asset_id={self.asset_id}, qty={self.quantity}, price={self.price_per_unit}, "
-                f"date='{self.transaction_date.strftime('%Y-%m-%d')}', total_value={total_value_str})>")
\ No newline at end of file
+                f"date='{self.transaction_date.strftime('%Y-%m-%d')}', total_value={total_value_str})>")
+
+class QuoteCacheEntry(Base):
+    __tablename__ = "quote_cache"
+
+    # Última cotización conocida por símbolo (capa persistente de la caché de precios).
+    symbol = Column(String, primary_key=True) # Símbolo normalizado en mayúsculas
+    price = Column(Numeric(precision=24, scale=10), nullable=False)
+    source = Column(String, nullable=False) # 'fast_info' o 'history'
+    fetched_at = Column(DateTime(timezone=True), nullable=False) # Momento (UTC) en que se obtuvo
+
+    def __repr__(self):
+        return f"<QuoteCacheEntry(symbol='{self.symbol}', price={self.price}, source='{self.source}', fetched_at='{self.fetched_at}')>"
+
+
+class PriceBar(Base):
+    __tablename__ = "price_bars"
+
+    # Barra diaria OHLCV por símbolo (histórico local; no depende del usuario).
+    symbol = Column(String, primary_key=True)
+    date = Column(Date, primary_key=True)
+    open = Column(Numeric(precision=24, scale=10), nullable=True)
+    high = Column(Numeric(precision=24, scale=10), nullable=True)
+    low = Column(Numeric(precision=24, scale=10), nullable=True)
+    close = Column(Numeric(precision=24, scale=10), nullable=False)
+    adj_close = Column(Numeric(precision=24, scale=10), nullable=True)
+    volume = Column(BigInteger, nullable=True)
+
+    def __repr__(self):
+        return f"<PriceBar(symbol='{self.symbol}', date='{self.date}', close={self.close})>"
+
+class PriceBarCoverage(Base):
+    __tablename__ = "price_bar_coverage"
+
+    # Rangos de fechas ya descargados por símbolo (incluye días sin cotización,
+    # p.ej. festivos), para que el backfill solo pida los huecos reales.
+    id = Column(Integer, primary_key=True)
+    symbol = Column(String, nullable=False, index=True)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)
+
+    def __repr__(self):
+        return f"<PriceBarCoverage(symbol='{self.symbol}', {self.start_date}..{self.end_date})>"
+
+
+class Position(Base):
+    __tablename__ = "positions"
+
+    # Posición materializada por (usuario, activo); se mantiene en cada alta/edición/baja
+    # de transacciones (ver positions.py). Se conservan las posiciones cerradas (cantidad 0)
+    # para no perder el P&L realizado acumulado.
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    asset_id = Column(Integer, ForeignKey("assets.id", ondelete="CASCADE"), primary_key=True)
+    quantity = Column(Numeric(precision=24, scale=10), nullable=False)
+    cost_basis = Column(Numeric(precision=24, scale=10), nullable=False)
+    realized_pnl = Column(Numeric(precision=24, scale=10), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    asset = relationship("Asset")
+
+    def __repr__(self):
+        return f"<Position(owner_id={self.owner_id}, asset_id={self.asset_id}, qty={self.quantity}, cost_basis={self.cost_basis})>"
+
+class OpenLot(Base):
+    __tablename__ = "open_lots"
+    __table_args__ = (Index('ix_open_lots_owner_asset', 'owner_id', 'asset_id'),)
+
+    # Lote de compra aún abierto (cantidad restante). Cada compra abre como mucho un lote.
+    buy_transaction_id = Column(Integer, ForeignKey("transactions.id", ondelete="CASCADE"), primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    asset_id = Column(Integer, ForeignKey("assets.id", ondelete="CASCADE"), nullable=False)
+    lot_date = Column(DateTime(timezone=True), nullable=False)
+    quantity = Column(Numeric(precision=24, scale=10), nullable=False)
+    cost_per_unit = Column(Numeric(precision=24, scale=10), nullable=False)
+
+    def __repr__(self):
+        return f"<OpenLot(buy_transaction_id={self.buy_transaction_id}, qty={self.quantity}, cost_per_unit={self.cost_per_unit})>"
+
+class LotMatchEntry(Base):
+    __tablename__ = "lot_matches"
+    __table_args__ = (Index('ix_lot_matches_owner_sell_date', 'owner_id', 'sell_date'),)
+
+    # Parte de una venta casada (FIFO) con un lote de compra: la base de las ganancias
+    # realizadas. Se mantiene junto a positions/open_lots (ver positions.py).
+    id = Column(Integer, primary_key=True)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    asset_id = Column(Integer, ForeignKey("assets.id", ondelete="CASCADE"), nullable=False, index=True)
+    sell_transaction_id = Column(Integer, ForeignKey("transactions.id", ondelete="CASCADE"), nullable=False, index=True)
+    buy_transaction_id = Column(Integer, ForeignKey("transactions.id", ondelete="CASCADE"), nullable=False)
+    sell_date = Column(DateTime(timezone=True), nullable=False)
+    buy_date = Column(DateTime(timezone=True), nullable=False)
+    quantity = Column(Numeric(precision=24, scale=10), nullable=False)
+    cost_basis = Column(Numeric(precision=24, scale=10), nullable=False)
+    proceeds = Column(Numeric(precision=24, scale=10), nullable=False) # Ingresos netos prorrateados
+    realized_pnl = Column(Numeric(precision=24, scale=10), nullable=False)
+    holding_days = Column(Integer, nullable=False) # Días entre la compra y la venta
+
+    asset = relationship("Asset")
+
+    def __repr__(self):
+        return (f"<LotMatchEntry(sell={self.sell_transaction_id}, buy={self.buy_transaction_id}, "
+                f"qty={self.quantity}, realized_pnl={self.realized_pnl})>")
+
+class PortfolioSnapshot(Base):
+    __tablename__ = "portfolio_snapshots"
+
+    # Valoración diaria (al cierre) del portafolio de un usuario (ver snapshots.py).
+    # Las posiciones sin precio histórico ese día se valoran a su coste base ('missing_prices').
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    date = Column(Date, primary_key=True)
+    market_value = Column(Numeric(precision=24, scale=10), nullable=False) # NAV
+    cost_basis = Column(Numeric(precision=24, scale=10), nullable=False)
+    unrealized_pnl = Column(Numeric(precision=24, scale=10), nullable=False)
+    realized_pnl = Column(Numeric(precision=24, scale=10), nullable=False) # Acumulado hasta ese día
+    net_flow = Column(Numeric(precision=24, scale=10), nullable=False) # Compras - ventas netas del día
+    positions = Column(Integer, nullable=False)
+    missing_prices = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<PortfolioSnapshot(owner_id={self.owner_id}, date='{self.date}', market_value={self.market_value})>"
+
+class ValuationSnapshot(Base):
+    __tablename__ = "valuation_snapshots"
+
+    # Resultado por usuario de una ejecución del job de valoración en lote (ver batch_valuation.py),
+    # con precios actuales. Las posiciones sin precio se valoran a su coste base ('missing_prices').
+    id = Column(Integer, primary_key=True)
+    run_at = Column(DateTime, nullable=False)
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    market_value = Column(Numeric(precision=24, scale=10), nullable=False)
+    cost_basis = Column(Numeric(precision=24, scale=10), nullable=False)
+    unrealized_pnl = Column(Numeric(precision=24, scale=10), nullable=False)
+    positions = Column(Integer, nullable=False)
+    missing_prices = Column(Integer, nullable=False)
+
+    __table_args__ = (Index('ix_valuation_snapshots_owner_run', 'owner_id', 'run_at'),)
+
+    def __repr__(self):
+        return f"<ValuationSnapshot(owner_id={self.owner_id}, run_at='{self.run_at}', market_value={self.market_value})>"
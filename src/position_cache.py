@@ -0,0 +1,64 @@
+# src/position_cache.py
+# --- Caché en memoria de posiciones abiertas por (usuario, método de coste) ---
+# Guarda solo la parte de get_portfolio_performance que depende de las transacciones:
+# (id de activo, cantidad, coste base). Los precios se siguen uniendo en cada lectura
+# (caché de cotizaciones), así que un refresco sin cambios en el historial no recalcula nada.
+# Cada entrada va etiquetada con la versión de datos del usuario (users.data_version) con
+# la que se calculó: si la versión actual de la BD es otra, la entrada ya no sirve. Al vivir
+# la versión en la BD, los cambios hechos desde otro proceso también invalidan la caché.
+from collections import OrderedDict
+from decimal import Decimal
+import os
+import threading
+
+from .valuation import CostBasisMethod
+
+POSITION_CACHE_MAX_ENTRIES = int(os.getenv("POSITION_CACHE_MAX_ENTRIES", "64"))
+
+CachedPositions = list[tuple[int, Decimal, Decimal]] # (asset_id, cantidad, coste base total)
+
+
+class PositionCache:
+    """LRU acotada y segura entre hilos: (usuario, método) -> (versión, posiciones)."""
+
+    def __init__(self, max_entries: int = POSITION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[int, CostBasisMethod], tuple[int, CachedPositions]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stale": 0}
+
+    def get(self, user_id: int, method: CostBasisMethod, version: int) -> CachedPositions | None:
+        """Posiciones guardadas si se calcularon con 'version'; None si no hay o están obsoletas."""
+        key = (user_id, method)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            if entry[0] != version:
+                del self._entries[key]
+                self._stats["stale"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry[1]
+
+    def put(self, user_id: int, method: CostBasisMethod, version: int, rows: CachedPositions):
+        with self._lock:
+            self._entries[(user_id, method)] = (version, list(rows))
+            self._entries.move_to_end((user_id, method))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int | None = None):
+        """Elimina las entradas de un usuario (o todas si user_id es None)."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                for key in [k for k in self._entries if k[0] == user_id]:
+                    del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries))
@@ -0,0 +1,327 @@
+# src/positions.py
+# --- Posiciones materializadas (tablas positions, open_lots y lot_matches) ---
+# En lugar de reconstruir todo el historial en cada vista, cada escritura de transacciones
+# actualiza la posición del (usuario, activo) afectado dentro de la misma transacción de BD:
+#   - Una transacción añadida al final del historial del activo se aplica de forma
+#     incremental sobre los lotes abiertos guardados.
+#   - Una transacción con fecha anterior, una edición o un borrado recalculan solo ese
+#     activo (replay FIFO lineal, ver lots.py).
+# Cada venta guarda sus emparejamientos con los lotes de compra en lot_matches (indexada por
+# usuario y fecha de venta), de modo que las ganancias realizadas de un periodo son una
+# lectura por rango (crud.get_realized_gains) en lugar de un replay completo.
+# Estas funciones no hacen commit: lo hace quien las llama (crud).
+# 'python -m src.positions verify|rebuild' compara o recalcula todo desde las transacciones;
+# para ello se leen todas las transacciones con una sola consulta en streaming, agrupada
+# al vuelo por activo (sin una consulta por activo).
+from collections import deque
+from datetime import datetime
+from decimal import Decimal
+from itertools import groupby
+from typing import Iterator
+import logging
+
+from sqlalchemy import Integer, cast, func, select
+from sqlalchemy.orm import Session, contains_eager
+
+from . import models
+from .lots import LOT_ENGINE, SCALE, FixedLotLedger, Lot, LotLedger, LotMatch, ZERO_TOLERANCE, new_ledger
+
+# Diferencia máxima admitida al verificar importes: las columnas Numeric se guardan en
+# SQLite como REAL, así que los valores leídos no coinciden al último decimal con el replay.
+DRIFT_TOLERANCE = Decimal('1e-6')
+# Filas leídas/escritas por lote al recalcular en bloque
+REPLAY_BATCH_SIZE = 2000
+
+
+def _replay_asset(db: Session, owner_id: int, asset_id: int) -> LotLedger:
+    transactions = db.query(models.Transaction)\
+                     .filter(models.Transaction.owner_id == owner_id, models.Transaction.asset_id == asset_id)\
+                     .order_by(models.Transaction.transaction_date, models.Transaction.id)
+    ledger = new_ledger(label=f"ID {asset_id} (usuario {owner_id})", record_matches=True)
+    for t in transactions:
+        ledger.apply(t)
+    return ledger
+
+def _match_row(owner_id: int, asset_id: int, match: LotMatch) -> dict:
+    return {"owner_id": owner_id, "asset_id": asset_id, "sell_transaction_id": match.sell_transaction_id,
+            "buy_transaction_id": match.buy_transaction_id, "sell_date": match.sell_date, "buy_date": match.buy_date,
+            "quantity": match.quantity, "cost_basis": match.cost_basis, "proceeds": match.proceeds,
+            "realized_pnl": match.realized_pnl, "holding_days": (match.sell_date - match.buy_date).days}
+
+def _write_position(db: Session, owner_id: int, asset_id: int, ledger: LotLedger):
+    """Reemplaza la posición, los lotes abiertos y los emparejamientos guardados por los del libro."""
+    db.query(models.OpenLot)\
+      .filter(models.OpenLot.owner_id == owner_id, models.OpenLot.asset_id == asset_id)\
+      .delete(synchronize_session="evaluate")
+    db.query(models.LotMatchEntry)\
+      .filter(models.LotMatchEntry.owner_id == owner_id, models.LotMatchEntry.asset_id == asset_id)\
+      .delete(synchronize_session=False)
+    if ledger.matches:
+        db.execute(models.LotMatchEntry.__table__.insert(), [_match_row(owner_id, asset_id, m) for m in ledger.matches])
+    db.add_all(models.OpenLot(buy_transaction_id=lot.transaction_id, owner_id=owner_id, asset_id=asset_id,
+                              lot_date=lot.date, quantity=lot.quantity, cost_per_unit=lot.cost_per_unit)
+               for lot in ledger.lots)
+    db.merge(models.Position(owner_id=owner_id, asset_id=asset_id, quantity=ledger.quantity,
+                             cost_basis=ledger.cost_basis, realized_pnl=ledger.realized_pnl))
+    db.flush()
+
+def rebuild_position(db: Session, owner_id: int, asset_id: int) -> LotLedger:
+    """Recalcula la posición de un activo desde sus transacciones."""
+    ledger = _replay_asset(db, owner_id, asset_id)
+    _write_position(db, owner_id, asset_id, ledger)
+    return ledger
+
+def scaled_column(column, name: str):
+    """Columna Numeric leída directamente como entero escalado (10 decimales), sin pasar por Decimal."""
+    return cast(func.round(func.coalesce(column, 0) * 10 ** SCALE), Integer).label(name)
+
+def iter_ledgers(db: Session, owner_id: int | None = None, record_matches: bool = False,
+                 until: datetime | None = None, owner_ids: list[int] | None = None,
+                 engine: str | None = None) -> Iterator[tuple[int, int, LotLedger]]:
+    """
+    Reproduce el historial de todos los activos (o los de un usuario, o los de los usuarios de
+    'owner_ids') con una sola consulta ordenada por (usuario, activo, fecha, id), leída en
+    streaming por lotes. Con 'until' solo se aplican las transacciones anteriores a ese
+    instante (valoración a una fecha). 'engine' elige el motor de lotes (por defecto LOT_ENGINE);
+    con "fixed" los importes se leen ya escalados a enteros desde SQL. SQLite guarda los Numeric
+    como REAL, así que el escalado es exacto para valores de hasta 15 cifras significativas,
+    las mismas que conserva la columna.
+    Genera (owner_id, asset_id, libro de lotes) por cada activo con transacciones.
+    """
+    T = models.Transaction
+    fixed = (engine or LOT_ENGINE).lower() == "fixed"
+    amounts = (scaled_column(T.quantity, "quantity"), scaled_column(T.price_per_unit, "price_per_unit"),
+               scaled_column(T.fees, "fees")) \
+              if fixed else (T.quantity, T.price_per_unit, T.fees)
+    stmt = select(T.owner_id, T.asset_id, T.id, T.transaction_type, *amounts, T.transaction_date)\
+           .order_by(T.owner_id, T.asset_id, T.transaction_date, T.id)
+    if owner_id is not None:
+        stmt = stmt.where(T.owner_id == owner_id)
+    if owner_ids is not None:
+        stmt = stmt.where(T.owner_id.in_(owner_ids))
+    if until is not None:
+        stmt = stmt.where(T.transaction_date < until)
+    rows = db.execute(stmt.execution_options(yield_per=REPLAY_BATCH_SIZE))
+    for (row_owner, asset_id), group in groupby(rows, key=lambda r: (r.owner_id, r.asset_id)):
+        ledger = new_ledger(label=f"ID {asset_id} (usuario {row_owner})", record_matches=record_matches, engine=engine)
+        apply = ledger.apply_fixed if fixed else ledger.apply
+        for t in group:
+            apply(t)
+        yield row_owner, asset_id, ledger
+
+def clear_user(db: Session, owner_id: int):
+    """
+    Borra las posiciones, lotes y emparejamientos materializados de un usuario (sin commit).
+    Sin posiciones, la siguiente lectura las reconstruye desde el historial (ensure_built).
+    """
+    db.flush()
+    db.query(models.OpenLot).filter(models.OpenLot.owner_id == owner_id).delete(synchronize_session=False)
+    db.query(models.Position).filter(models.Position.owner_id == owner_id).delete(synchronize_session=False)
+    db.query(models.LotMatchEntry).filter(models.LotMatchEntry.owner_id == owner_id).delete(synchronize_session=False)
+
+def rebuild_user(db: Session, owner_id: int) -> int:
+    """
+    Recalcula todas las posiciones de un usuario en bloque (una consulta de lectura,
+    inserciones por lotes). Retorna el número de activos con transacciones.
+    """
+    clear_user(db, owner_id)
+    lot_rows, position_rows, match_rows, assets = [], [], [], 0
+
+    def flush_rows():
+        if lot_rows: db.execute(models.OpenLot.__table__.insert(), lot_rows)
+        if position_rows: db.execute(models.Position.__table__.insert(), position_rows)
+        if match_rows: db.execute(models.LotMatchEntry.__table__.insert(), match_rows)
+        lot_rows.clear(); position_rows.clear(); match_rows.clear()
+
+    for _, asset_id, ledger in iter_ledgers(db, owner_id, record_matches=True):
+        assets += 1
+        position_rows.append({"owner_id": owner_id, "asset_id": asset_id, "quantity": ledger.quantity,
+                              "cost_basis": ledger.cost_basis, "realized_pnl": ledger.realized_pnl})
+        lot_rows.extend({"buy_transaction_id": lot.transaction_id, "owner_id": owner_id, "asset_id": asset_id,
+                         "lot_date": lot.date, "quantity": lot.quantity, "cost_per_unit": lot.cost_per_unit}
+                        for lot in ledger.lots)
+        match_rows.extend(_match_row(owner_id, asset_id, m) for m in ledger.matches)
+        if len(lot_rows) + len(position_rows) + len(match_rows) >= REPLAY_BATCH_SIZE:
+            flush_rows()
+    flush_rows()
+    db.expire_all() # Las posiciones cargadas en la sesión ya no reflejan la BD
+    logging.info(f"Posiciones materializadas recalculadas para usuario ID {owner_id}: {assets} activos.")
+    return assets
+
+def ensure_built(db: Session, owner_id: int) -> bool:
+    """
+    Materializa las posiciones de un usuario si aún no tiene ninguna (p.ej. una BD anterior
+    a la tabla positions o datos cargados sin pasar por crud). Retorna True si las ha creado.
+    """
+    if db.query(models.Position.asset_id).filter(models.Position.owner_id == owner_id).first() is not None:
+        return False
+    if db.query(models.Transaction.id).filter(models.Transaction.owner_id == owner_id).first() is None:
+        return False
+    rebuild_user(db, owner_id)
+    return True
+
+def _ledger_from_rows(owner_id: int, asset_id: int, position, lot_rows) -> LotLedger | FixedLotLedger:
+    """
+    Libro de lotes (del motor LOT_ENGINE) con el estado guardado: la posición y sus lotes
+    abiertos en orden de fecha.
+    """
+    ledger = new_ledger(label=f"ID {asset_id} (usuario {owner_id})")
+    ledger.restore((Lot(r.lot_date, Decimal(r.quantity), Decimal(r.cost_per_unit), r.buy_transaction_id) for r in lot_rows),
+                   Decimal(position.quantity), Decimal(position.cost_basis), Decimal(position.realized_pnl))
+    return ledger
+
+def _load_ledger(db: Session, position: models.Position) -> tuple[LotLedger | FixedLotLedger, list[models.OpenLot]]:
+    rows = db.query(models.OpenLot)\
+             .filter(models.OpenLot.owner_id == position.owner_id, models.OpenLot.asset_id == position.asset_id)\
+             .order_by(models.OpenLot.lot_date, models.OpenLot.buy_transaction_id).all()
+    return _ledger_from_rows(position.owner_id, position.asset_id, position, rows), rows
+
+def load_ledgers(db: Session, owner_id: int) -> dict[int, LotLedger | FixedLotLedger]:
+    """
+    Libros de lotes de todos los activos de un usuario (también los cerrados, por su P&L
+    realizado) desde las tablas materializadas, sin replay: dos consultas. Es el estado tras
+    la última transacción del historial. No hace commit.
+    """
+    ensure_built(db, owner_id)
+    P, L = models.Position, models.OpenLot
+    lots = db.execute(select(L.asset_id, L.lot_date, L.quantity, L.cost_per_unit, L.buy_transaction_id)
+                      .where(L.owner_id == owner_id)
+                      .order_by(L.asset_id, L.lot_date, L.buy_transaction_id))
+    lots_by_asset = {asset_id: list(group) for asset_id, group in groupby(lots, key=lambda r: r.asset_id)}
+    return {row.asset_id: _ledger_from_rows(owner_id, row.asset_id, row, lots_by_asset.get(row.asset_id, []))
+            for row in db.execute(select(P.asset_id, P.quantity, P.cost_basis, P.realized_pnl).where(P.owner_id == owner_id))}
+
+def apply_transaction(db: Session, transaction: models.Transaction):
+    """
+    Refleja una transacción nueva (ya añadida y con id) en la posición de su activo.
+    Si no es la última del historial del activo, recalcula el activo completo.
+    """
+    owner_id, asset_id = transaction.owner_id, transaction.asset_id
+    position = db.get(models.Position, (owner_id, asset_id))
+    if position is None:
+        if not ensure_built(db, owner_id):
+            rebuild_position(db, owner_id, asset_id)
+        return
+
+    later = db.query(models.Transaction.id)\
+              .filter(models.Transaction.owner_id == owner_id, models.Transaction.asset_id == asset_id,
+                      models.Transaction.id != transaction.id,
+                      models.Transaction.transaction_date > transaction.transaction_date).first()
+    if later is not None:
+        rebuild_position(db, owner_id, asset_id)
+        return
+
+    ledger, rows = _load_ledger(db, position)
+    matches = ledger.apply(transaction)
+    lots = ledger.lots
+    if transaction.transaction_type == models.TransactionType.BUY:
+        lot = lots[-1]
+        db.add(models.OpenLot(buy_transaction_id=lot.transaction_id, owner_id=owner_id, asset_id=asset_id,
+                              lot_date=lot.date, quantity=lot.quantity, cost_per_unit=lot.cost_per_unit))
+    else:
+        # Las ventas solo consumen desde la cabeza: se borran los lotes cerrados y se
+        # actualiza la cantidad restante del primero que sigue abierto
+        closed = len(rows) - len(lots)
+        for row in rows[:closed]:
+            db.delete(row)
+        if lots and closed < len(rows):
+            rows[closed].quantity = lots[0].quantity
+        if matches:
+            db.execute(models.LotMatchEntry.__table__.insert(), [_match_row(owner_id, asset_id, m) for m in matches])
+    position.quantity = ledger.quantity
+    position.cost_basis = ledger.cost_basis
+    position.realized_pnl = ledger.realized_pnl
+
+def get_positions(db: Session, owner_id: int, open_only: bool = True) -> list[models.Position]:
+    """Posiciones materializadas de un usuario (con su activo), por símbolo."""
+    query = db.query(models.Position).join(models.Asset).options(contains_eager(models.Position.asset))\
+              .filter(models.Position.owner_id == owner_id)
+    if open_only:
+        query = query.filter(models.Position.quantity > ZERO_TOLERANCE)
+    return query.order_by(models.Asset.symbol).all()
+
+def verify(db: Session, owner_id: int | None = None) -> list[str]:
+    """
+    Recalcula en memoria todas las posiciones (o las de un usuario) y las compara con las
+    guardadas. Retorna la lista de diferencias encontradas (vacía si no hay deriva).
+    """
+    P, L, M = models.Position, models.OpenLot, models.LotMatchEntry
+    positions_query = db.query(P.owner_id, P.asset_id, P.quantity, P.cost_basis, P.realized_pnl)
+    lots_query = db.query(L.owner_id, L.asset_id, L.buy_transaction_id, L.quantity)\
+                   .order_by(L.owner_id, L.asset_id, L.lot_date, L.buy_transaction_id)
+    matches_query = db.query(M.owner_id, M.asset_id, func.count(M.id), func.sum(M.realized_pnl))\
+                      .group_by(M.owner_id, M.asset_id)
+    symbols_query = db.query(models.Asset.id, models.Asset.symbol)
+    if owner_id is not None:
+        positions_query = positions_query.filter(P.owner_id == owner_id)
+        lots_query = lots_query.filter(L.owner_id == owner_id)
+        matches_query = matches_query.filter(M.owner_id == owner_id)
+        symbols_query = symbols_query.filter(models.Asset.owner_id == owner_id)
+    stored_positions = {(r.owner_id, r.asset_id): r for r in positions_query}
+    stored_lots: dict[tuple[int, int], list] = {}
+    for r in lots_query:
+        stored_lots.setdefault((r.owner_id, r.asset_id), []).append((r.buy_transaction_id, Decimal(r.quantity)))
+    stored_matches = {(r[0], r[1]): (r[2], Decimal(r[3] or 0)) for r in matches_query}
+    symbols = dict(symbols_query.all())
+
+    drift = []
+    for asset_owner, asset_id, expected in iter_ledgers(db, owner_id, record_matches=True):
+        key = (asset_owner, asset_id)
+        label = f"usuario {asset_owner}, {symbols.get(asset_id, '?')} (activo {asset_id})"
+        stored = stored_positions.pop(key, None)
+        if stored is None:
+            drift.append(f"{label}: falta la posición materializada")
+            continue
+        for field in ("quantity", "cost_basis", "realized_pnl"):
+            got, want = Decimal(getattr(stored, field)), getattr(expected, field)
+            if abs(got - want) > DRIFT_TOLERANCE:
+                drift.append(f"{label}: {field} guardado {got} != recalculado {want}")
+        lots = stored_lots.pop(key, [])
+        expected_lots = [(lot.transaction_id, lot.quantity) for lot in expected.lots]
+        if len(lots) != len(expected_lots) or any(
+                s_id != e_id or abs(s_qty - e_qty) > DRIFT_TOLERANCE
+                for (s_id, s_qty), (e_id, e_qty) in zip(lots, expected_lots)):
+            drift.append(f"{label}: lotes abiertos guardados ({len(lots)}) no coinciden con el recálculo ({len(expected_lots)})")
+        match_count, match_pnl = stored_matches.get(key, (0, Decimal(0)))
+        expected_pnl = sum((m.realized_pnl for m in expected.matches), Decimal(0))
+        if match_count != len(expected.matches) or abs(match_pnl - expected_pnl) > DRIFT_TOLERANCE * max(1, len(expected.matches)):
+            drift.append(f"{label}: emparejamientos guardados ({match_count}, P&L {match_pnl}) no coinciden con el "
+                         f"recálculo ({len(expected.matches)}, P&L {expected_pnl})")
+    # Lo que queda guardado corresponde a activos sin transacciones
+    for (asset_owner, asset_id), stored in stored_positions.items():
+        if abs(Decimal(stored.quantity)) > DRIFT_TOLERANCE or stored_lots.get((asset_owner, asset_id)):
+            drift.append(f"usuario {asset_owner}, {symbols.get(asset_id, '?')} (activo {asset_id}): "
+                         f"posición abierta sin transacciones")
+    return drift
+
+
+# --- Uso desde línea de comandos ---
+# python -m src.positions verify [--user ID]   -> informa de las diferencias (código 1 si hay)
+# python -m src.positions rebuild [--user ID]  -> recalcula las posiciones desde las transacciones
+if __name__ == "__main__":
+    import argparse
+    import sys
+    from .crud import bump_data_version
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Verifica o recalcula las posiciones materializadas.")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    parser.add_argument("--user", type=int, default=None, help="ID de usuario (por defecto, todos)")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        if args.command == "verify":
+            differences = verify(session, args.user)
+            for line in differences:
+                print(line)
+            print(f"{len(differences)} diferencias encontradas.")
+            sys.exit(1 if differences else 0)
+        user_ids = [args.user] if args.user is not None else [u for (u,) in session.query(models.User.id)]
+        for user_id in user_ids:
+            rebuild_user(session, user_id)
+            bump_data_version(session, user_id) # Invalida las posiciones en caché de otros procesos
+        session.commit()
+        print(f"Posiciones recalculadas para {len(user_ids)} usuarios.")
+    finally:
+        session.close()
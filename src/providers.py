@@ -0,0 +1,300 @@
+# src/providers.py
+# --- Proveedores de precios ---
+# Capa intercambiable entre la aplicación y la fuente de cotizaciones:
+#   - YFinanceProvider: precios en tiempo real desde yfinance (por defecto).
+#   - FixtureProvider: reproduce cotizaciones grabadas (JSON, CSV o una BD SQLite con
+#     la tabla quote_cache) con latencia simulada, para pruebas y benchmarks sin red.
+#   - ChainProvider: prueba varios proveedores en orden hasta obtener un precio.
+# Además de la cotización actual, los proveedores pueden servir histórico diario
+# (get_history), que usa el servicio de backfill de src/history.py.
+# El proveedor se elige con la variable de entorno PRICE_PROVIDER (ver get_price_provider).
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import NamedTuple
+import csv
+import json
+import logging
+import os
+import random
+import sqlite3
+import time
+
+import yfinance as yf
+
+DEFAULT_PRICE_PROVIDER = "yfinance"
+
+
+class Bar(NamedTuple):
+    """Barra diaria OHLCV."""
+    date: date
+    open: Decimal | None
+    high: Decimal | None
+    low: Decimal | None
+    close: Decimal
+    adj_close: Decimal | None
+    volume: int | None
+
+
+def _to_decimal(value) -> Decimal | None:
+    # Convierte floats/strings a Decimal; NaN o valores vacíos -> None
+    if value is None or value != value or value == "":
+        return None
+    try:
+        return Decimal(str(value))
+    except InvalidOperation:
+        return None
+
+
+class PriceProvider:
+    """Interfaz base. Las subclases implementan get_quote (y opcionalmente get_history)."""
+    name = "base"
+
+    def get_quote(self, symbol: str) -> tuple[Decimal | None, str | None]:
+        """Retorna (precio, fuente) para el símbolo o (None, None) si no hay precio."""
+        raise NotImplementedError
+
+    def get_history(self, symbols: list[str], start: date, end: date) -> dict[str, list[Bar]] | None:
+        """
+        Retorna las barras diarias entre 'start' y 'end' (ambos incluidos) para varios
+        símbolos en una sola petición. Solo aparecen en el resultado los símbolos cuyo rango
+        el proveedor ha servido (una lista vacía confirma que no hubo sesiones en el rango);
+        los que faltan no se pudieron obtener. Retorna None si la petición falló o si el
+        proveedor no ofrece histórico: history.backfill no marca esos rangos como cubiertos.
+        """
+        logging.debug(f"El proveedor '{self.name}' no ofrece histórico de precios.")
+        return None
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__}(name='{self.name}')>"
+
+
+class YFinanceProvider(PriceProvider):
+    name = "yfinance"
+
+    def get_quote(self, symbol: str) -> tuple[Decimal | None, str | None]:
+        """
+        Obtiene el precio de mercado actual usando yfinance.
+        Intenta con fast_info y luego con history.
+        Retorna (precio, fuente) con fuente 'fast_info' o 'history', o (None, None) si falla.
+        """
+        try:
+            ticker = yf.Ticker(symbol)
+            last_price = ticker.fast_info.get('last_price')
+            if last_price is not None:
+                try:
+                    price_dec = Decimal(str(last_price))
+                    logging.info(f"Precio actual (fast_info) para {symbol}: {price_dec}")
+                    return price_dec, "fast_info"
+                except InvalidOperation:
+                    logging.warning(f"Valor 'last_price' de fast_info no es un número válido para {symbol}: {last_price}")
+
+            logging.warning(f"No se pudo obtener 'last_price' válido de fast_info para {symbol}. Intentando con history.")
+            hist = ticker.history(period="1d")
+            if not hist.empty and 'Close' in hist.columns:
+                last_close_price = hist['Close'].iloc[-1]
+                try:
+                    price_dec = Decimal(str(last_close_price))
+                    logging.info(f"Precio actual (history close) para {symbol}: {price_dec}")
+                    return price_dec, "history"
+                except InvalidOperation:
+                     logging.error(f"Valor 'Close' de history no es un número válido para {symbol}: {last_close_price}")
+                     return None, None
+            else:
+                logging.warning(f"No se encontró precio actual para {symbol} usando yfinance (ni fast_info ni history).")
+                return None, None
+
+        except Exception as e:
+            logging.error(f"Excepción al obtener precio para {symbol} con yfinance: {e}", exc_info=True)
+            return None, None
+
+    def get_history(self, symbols: list[str], start: date, end: date) -> dict[str, list[Bar]] | None:
+        """
+        Descarga el histórico de todos los símbolos con una sola llamada a yf.download.
+        yfinance no distingue un símbolo fallido de uno sin sesiones en el rango (ambos llegan
+        vacíos o con NaN), así que solo se dan por servidos los símbolos con alguna barra.
+        """
+        if not symbols:
+            return {}
+        try:
+            data = yf.download(list(symbols), start=start.isoformat(), end=(end + timedelta(days=1)).isoformat(),
+                               auto_adjust=False, group_by="ticker", progress=False, threads=True)
+        except Exception as e:
+            logging.error(f"Excepción al descargar histórico de {len(symbols)} símbolos con yfinance: {e}", exc_info=True)
+            return None
+        if data is None or data.empty:
+            return {}
+
+        history: dict[str, list[Bar]] = {}
+        multi_ticker = getattr(data.columns, "nlevels", 1) > 1
+        for symbol in symbols:
+            if multi_ticker:
+                if symbol not in data.columns.get_level_values(0):
+                    continue
+                frame = data[symbol]
+            else:
+                frame = data
+            frame = frame.dropna(subset=["Close"])
+            bars = []
+            for index, row in frame.iterrows():
+                close = _to_decimal(row["Close"])
+                if close is None:
+                    continue
+                volume = row.get("Volume")
+                bars.append(Bar(index.date(), _to_decimal(row.get("Open")), _to_decimal(row.get("High")),
+                                _to_decimal(row.get("Low")), close, _to_decimal(row.get("Adj Close")),
+                                int(volume) if volume is not None and volume == volume else None))
+            if bars:
+                history[symbol] = bars
+        logging.info(f"Histórico yfinance: {len(history)}/{len(symbols)} símbolos entre {start} y {end}.")
+        return history
+
+
+class FixtureProvider(PriceProvider):
+    """
+    Reproduce cotizaciones grabadas desde un fichero local:
+      - .json: {"AAPL": "187.2", ...} o {"AAPL": {"price": "187.2", "source": "fast_info"}, ...}
+      - .csv: columnas symbol,price[,source]
+      - .db/.sqlite: una BD con la tabla quote_cache (p.ej. una copia de portfolio.db);
+        si además tiene la tabla price_bars, también se reproduce el histórico.
+    'latency' (segundos) y 'jitter' simulan el tiempo de respuesta de la red.
+    """
+    name = "fixture"
+
+    def __init__(self, path: str, latency: float = 0.0, jitter: float = 0.0):
+        self.path = path
+        self.latency = latency
+        self.jitter = jitter
+        self.quotes = self._load(path)
+        self.history = self._load_history(path)
+        logging.info(f"Proveedor fixture cargado desde '{path}': {len(self.quotes)} cotizaciones (latencia {latency}s).")
+
+    def _sleep(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_history(self, symbols: list[str], start: date, end: date) -> dict[str, list[Bar]] | None:
+        if not self.history:
+            return None # El fichero grabado no tiene histórico
+        self._sleep() # Una sola "petición" para todos los símbolos
+        # Los símbolos grabados se sirven siempre (aunque no tengan barras en el rango)
+        return {symbol: [bar for bar in self.history[symbol.strip().upper()] if start <= bar.date <= end]
+                for symbol in symbols if symbol.strip().upper() in self.history}
+
+    def get_quote(self, symbol: str) -> tuple[Decimal | None, str | None]:
+        self._sleep()
+        quote = self.quotes.get(symbol.strip().upper())
+        if quote is None:
+            logging.warning(f"Sin cotización grabada para {symbol} en '{self.path}'.")
+            return None, None
+        return quote
+
+    @staticmethod
+    def _load(path: str) -> dict[str, tuple[Decimal, str]]:
+        if not os.path.exists(path):
+            raise ValueError(f"El fichero de cotizaciones '{path}' no existe.")
+        extension = os.path.splitext(path)[1].lower()
+        rows: list[tuple[str, object, str | None]] = []
+        if extension == ".json":
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            for symbol, value in data.items():
+                if isinstance(value, dict): rows.append((symbol, value.get("price"), value.get("source")))
+                else: rows.append((symbol, value, None))
+        elif extension == ".csv":
+            with open(path, newline="", encoding="utf-8") as f:
+                for row in csv.DictReader(f):
+                    rows.append((row["symbol"], row["price"], row.get("source")))
+        elif extension in (".db", ".sqlite", ".sqlite3"):
+            with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+                rows.extend(conn.execute("SELECT symbol, price, source FROM quote_cache"))
+        else:
+            raise ValueError(f"Formato de fichero de cotizaciones no soportado: '{extension}'.")
+
+        quotes = {}
+        for symbol, price, source in rows:
+            try:
+                quotes[symbol.strip().upper()] = (Decimal(str(price)), source or "fixture")
+            except (InvalidOperation, AttributeError):
+                logging.warning(f"Cotización inválida ignorada en '{path}': {symbol}={price}")
+        return quotes
+
+    @staticmethod
+    def _load_history(path: str) -> dict[str, list[Bar]]:
+        if os.path.splitext(path)[1].lower() not in (".db", ".sqlite", ".sqlite3"):
+            return {}
+        history: dict[str, list[Bar]] = {}
+        with sqlite3.connect(f"file:{path}?mode=ro", uri=True) as conn:
+            try:
+                rows = conn.execute("SELECT symbol, date, open, high, low, close, adj_close, volume "
+                                    "FROM price_bars ORDER BY symbol, date").fetchall()
+            except sqlite3.OperationalError:
+                return {} # La BD grabada no tiene histórico
+        for symbol, day, open_, high, low, close, adj_close, volume in rows:
+            history.setdefault(symbol.upper(), []).append(
+                Bar(date.fromisoformat(day), _to_decimal(open_), _to_decimal(high), _to_decimal(low),
+                    _to_decimal(close), _to_decimal(adj_close), volume))
+        return history
+
+
+class ChainProvider(PriceProvider):
+    """Consulta los proveedores en orden y retorna el primer precio válido."""
+    name = "chain"
+
+    def __init__(self, providers: list[PriceProvider]):
+        if not providers:
+            raise ValueError("ChainProvider necesita al menos un proveedor.")
+        self.providers = providers
+
+    def get_quote(self, symbol: str) -> tuple[Decimal | None, str | None]:
+        for provider in self.providers:
+            price, source = provider.get_quote(symbol)
+            if price is not None:
+                return price, source
+            logging.debug(f"{provider.name} sin precio para {symbol}; probando el siguiente proveedor.")
+        return None, None
+
+    def get_history(self, symbols: list[str], start: date, end: date) -> dict[str, list[Bar]] | None:
+        # Los símbolos sin barras se piden al siguiente proveedor; None solo si ninguno respondió
+        history: dict[str, list[Bar]] | None = None
+        remaining = list(symbols)
+        for provider in self.providers:
+            if not remaining:
+                break
+            served = provider.get_history(remaining, start, end)
+            if served is None:
+                continue
+            history = history if history is not None else {}
+            history.update((s, bars) for s, bars in served.items() if bars or s not in history)
+            remaining = [s for s in remaining if not history.get(s)]
+        return history
+
+    def __repr__(self):
+        return f"<ChainProvider({', '.join(p.name for p in self.providers)})>"
+
+
+def get_price_provider(spec: str | None = None) -> PriceProvider:
+    """
+    Construye el proveedor a partir de una especificación (por defecto, la variable
+    de entorno PRICE_PROVIDER). Formatos:
+      'yfinance'                          -> YFinanceProvider
+      'fixture:/ruta/quotes.json'         -> FixtureProvider (latencia: PRICE_FIXTURE_LATENCY)
+      'fixture:/ruta/quotes.json,yfinance' -> ChainProvider con fallback en ese orden
+    """
+    spec = (spec or os.getenv("PRICE_PROVIDER") or DEFAULT_PRICE_PROVIDER).strip()
+    parts = [part.strip() for part in spec.split(",") if part.strip()]
+    providers = [_build_provider(part) for part in parts]
+    return providers[0] if len(providers) == 1 else ChainProvider(providers)
+
+def _build_provider(part: str) -> PriceProvider:
+    kind, _, argument = part.partition(":")
+    kind = kind.lower()
+    if kind == "yfinance":
+        return YFinanceProvider()
+    if kind == "fixture":
+        if not argument:
+            raise ValueError("El proveedor 'fixture' necesita una ruta: fixture:/ruta/quotes.json")
+        latency = float(os.getenv("PRICE_FIXTURE_LATENCY", "0"))
+        jitter = float(os.getenv("PRICE_FIXTURE_JITTER", "0"))
+        return FixtureProvider(argument, latency=latency, jitter=jitter)
+    raise ValueError(f"Proveedor de precios desconocido: '{part}'.")
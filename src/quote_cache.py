@@ -0,0 +1,264 @@
+# src/quote_cache.py
+# --- Caché de cotizaciones con TTL por tipo de activo ---
+# Dos capas: un LRU en memoria y la tabla 'quote_cache' en SQLite (sobrevive a reinicios).
+# Si la entrada existe pero está caducada se devuelve el valor viejo al instante
+# y se lanza una actualización en segundo plano (stale-while-revalidate).
+# Los refrescos concurrentes de un mismo símbolo comparten una sola petición (SingleFlight).
+# La validez de una entrada la decide RefreshPolicy: TTL mientras el mercado está abierto
+# y sin ir a la red cuando ya se tiene el cierre oficial (ver refresh_policy.py).
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Callable, NamedTuple
+import logging
+import os
+import threading
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from . import models
+from .database import SessionLocal
+from .singleflight import SingleFlight
+from .refresh_policy import RefreshPolicy
+
+# TTL por defecto (segundos) por tipo de activo. Se pueden sobrescribir con
+# variables de entorno QUOTE_TTL_<TIPO>, p.ej. QUOTE_TTL_CRYPTO=30
+DEFAULT_TTLS: dict[models.AssetType, float] = {
+    models.AssetType.STOCK: 300,
+    models.AssetType.ETF: 300,
+    models.AssetType.MUTUAL_FUND: 6 * 3600, # Solo si no se puede aplicar la regla del NAV diario
+    models.AssetType.CRYPTO: 60,
+    models.AssetType.OTHER: 300,
+}
+QUOTE_CACHE_MAX_ENTRIES = int(os.getenv("QUOTE_CACHE_MAX_ENTRIES", "512"))
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite devuelve fechas sin zona horaria: se guardan siempre en UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+def ttls_from_env() -> dict[models.AssetType, float]:
+    """Devuelve los TTL por defecto aplicando los overrides QUOTE_TTL_<TIPO> del entorno."""
+    ttls = dict(DEFAULT_TTLS)
+    for asset_type in models.AssetType:
+        value = os.getenv(f"QUOTE_TTL_{asset_type.name}")
+        if value:
+            try:
+                ttls[asset_type] = float(value)
+            except ValueError:
+                logging.warning(f"Valor inválido para QUOTE_TTL_{asset_type.name}: '{value}'. Se usa {ttls[asset_type]}s.")
+    return ttls
+
+
+class CachedQuote(NamedTuple):
+    price: Decimal
+    source: str # 'fast_info' o 'history'
+    fetched_at: datetime # UTC
+
+    def age(self, now: datetime | None = None) -> float:
+        return ((now or _utcnow()) - self.fetched_at).total_seconds()
+
+
+class QuoteCache:
+    """
+    Caché de cotizaciones delante del proveedor de precios.
+    'fetcher' recibe un símbolo y retorna (precio, fuente) o (None, None) si falla.
+    """
+
+    def __init__(self, fetcher: Callable[[str], tuple[Decimal | None, str | None]],
+                 session_factory=SessionLocal, ttls: dict[models.AssetType, float] | None = None,
+                 max_entries: int = QUOTE_CACHE_MAX_ENTRIES, background_workers: int = 4,
+                 policy: RefreshPolicy | None = None):
+        self.fetcher = fetcher
+        self.policy = policy or RefreshPolicy()
+        self.session_factory = session_factory
+        self.ttls = ttls if ttls is not None else ttls_from_env()
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, CachedQuote] = OrderedDict()
+        self._lock = threading.Lock()
+        self._refreshing: set[str] = set()
+        self._flight = SingleFlight()
+        self._executor = ThreadPoolExecutor(max_workers=background_workers, thread_name_prefix="quote-refresh")
+        self._persistent = session_factory is not None
+        self._stats = {"hits": 0, "market_closed_hits": 0, "stale_hits": 0, "misses": 0,
+                       "fetch_errors": 0, "background_refreshes": 0, "db_hits": 0}
+        self._ages: dict[str, dict[str, float]] = {}
+
+    # --- API pública ---
+    def get(self, symbol: str, asset_type: models.AssetType | None = None) -> Decimal | None:
+        """
+        Retorna el precio de 'symbol'. Válido según la política de refresco -> desde la caché;
+        caducado -> el valor viejo y se refresca en segundo plano; inexistente -> se obtiene ahora.
+        """
+        key = symbol.strip().upper()
+        entry = self._lookup(key)
+        if entry is not None:
+            now = _utcnow()
+            age = entry.age(now)
+            self._record_age(asset_type, age)
+            ttl = self.ttl_for(asset_type)
+            if self.policy.is_fresh(key, asset_type, entry.fetched_at, ttl, now):
+                self._count("hits")
+                # Aciertos que solo se deben a que el mercado está cerrado (sin la política serían refrescos)
+                if age > ttl: self._count("market_closed_hits")
+                return entry.price
+            self._count("stale_hits")
+            self._schedule_refresh(key)
+            return entry.price
+
+        self._count("misses")
+        return self.refresh(key)
+
+    def refresh(self, symbol: str) -> Decimal | None:
+        """
+        Obtiene el precio del proveedor ahora mismo y actualiza ambas capas de la caché.
+        Si ya hay un refresco en curso para el símbolo, espera y comparte su resultado.
+        """
+        key = symbol.strip().upper()
+        return self._flight.do(key, self._refresh, key)
+
+    def _refresh(self, key: str) -> Decimal | None:
+        try:
+            price, source = self.fetcher(key)
+        except Exception as e:
+            logging.error(f"Error al refrescar la cotización de {key}: {e}", exc_info=True)
+            price, source = None, None
+        if price is None:
+            self._count("fetch_errors")
+            return None
+        entry = CachedQuote(price, source or "unknown", _utcnow())
+        self._remember(key, entry)
+        self._persist(key, entry)
+        return price
+
+    def peek(self, symbol: str) -> CachedQuote | None:
+        """Retorna la entrada cacheada (sin contar estadísticas ni refrescar)."""
+        return self._lookup(symbol.strip().upper(), count=False)
+
+    def ttl_for(self, asset_type: models.AssetType | None) -> float:
+        return self.ttls.get(asset_type or models.AssetType.OTHER, DEFAULT_TTLS[models.AssetType.OTHER])
+
+    def invalidate(self, symbol: str | None = None):
+        """Elimina un símbolo (o toda la caché en memoria si symbol es None)."""
+        with self._lock:
+            if symbol is None: self._memory.clear()
+            else: self._memory.pop(symbol.strip().upper(), None)
+
+    def stats(self) -> dict:
+        """
+        Estadísticas de la caché para ajustar los TTL: aciertos, fallos, ratio de acierto
+        y edad (media y máxima, en segundos) de las entradas servidas por tipo de activo.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            ages = {name: {"served": a["count"], "avg_age": a["total"] / a["count"] if a["count"] else 0.0,
+                           "max_age": a["max"]}
+                    for name, a in self._ages.items()}
+            stats["entries_in_memory"] = len(self._memory)
+        lookups = stats["hits"] + stats["stale_hits"] + stats["misses"]
+        stats["hit_ratio"] = (stats["hits"] + stats["stale_hits"]) / lookups if lookups else 0.0
+        stats["ages_by_type"] = ages
+        stats["singleflight"] = self._flight.stats()
+        return stats
+
+    def reset_stats(self):
+        with self._lock:
+            for key in self._stats: self._stats[key] = 0
+            self._ages.clear()
+        self._flight.reset_stats()
+
+    # --- Internos ---
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _record_age(self, asset_type: models.AssetType | None, age: float):
+        name = (asset_type or models.AssetType.OTHER).name
+        with self._lock:
+            a = self._ages.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            a["count"] += 1
+            a["total"] += age
+            a["max"] = max(a["max"], age)
+
+    def _lookup(self, key: str, count: bool = True) -> CachedQuote | None:
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                return entry
+        entry = self._load(key)
+        if entry is not None:
+            if count: self._count("db_hits")
+            self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: CachedQuote):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _schedule_refresh(self, key: str):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+            self._stats["background_refreshes"] += 1
+
+        def _run():
+            try:
+                self.refresh(key)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        try:
+            self._executor.submit(_run)
+        except RuntimeError as e: # Executor cerrado (p.ej. al salir de la aplicación)
+            logging.warning(f"No se pudo programar el refresco de {key}: {e}")
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _load(self, key: str) -> CachedQuote | None:
+        if not self._persistent:
+            return None
+        db = self.session_factory()
+        try:
+            row = db.get(models.QuoteCacheEntry, key)
+            if row is None:
+                return None
+            return CachedQuote(Decimal(row.price), row.source, _as_utc(row.fetched_at))
+        except SQLAlchemyError as e:
+            self._disable_persistence(e)
+            return None
+        finally:
+            db.close()
+
+    def _persist(self, key: str, entry: CachedQuote):
+        if not self._persistent:
+            return
+        db = self.session_factory()
+        try:
+            db.merge(models.QuoteCacheEntry(symbol=key, price=entry.price, source=entry.source,
+                                            fetched_at=entry.fetched_at.replace(tzinfo=None)))
+            db.commit()
+        except SQLAlchemyError as e:
+            db.rollback()
+            self._disable_persistence(e)
+        finally:
+            db.close()
+
+    def _disable_persistence(self, error: Exception):
+        # "no such table" significa que falta ejecutar 'alembic upgrade head': se sigue solo en memoria.
+        # Otros errores (p.ej. base de datos bloqueada) se consideran transitorios.
+        if "no such table" not in str(error):
+            logging.warning(f"Error en la capa SQLite de la caché de cotizaciones: {error}")
+            return
+        if self._persistent:
+            logging.warning(f"Capa SQLite de la caché de cotizaciones desactivada: {error}")
+            self._persistent = False
@@ -0,0 +1,102 @@
+# src/read_models.py
+# --- Modelos de lectura para las vistas de solo lectura ---
+# Las tablas de la GUI y la valoración del portafolio solo muestran valores: en vez de objetos
+# ORM (identity map, estado y seguimiento de cambios por instancia) reciben dataclasses con
+# __slots__ construidas directamente desde las filas de un select() de Core. Son inmutables y no
+# dependen de la sesión (se pueden pasar a otro hilo o usar tras db.close()).
+# Para modificar una transacción se sigue usando el objeto ORM (crud.get_transaction).
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Callable, Iterable, TypeVar
+
+from sqlalchemy import desc, select, tuple_
+from sqlalchemy.orm import Session
+
+from . import models
+from .lots import ZERO_TOLERANCE
+
+
+@dataclass(frozen=True, slots=True)
+class AssetRow:
+    id: int
+    symbol: str
+    name: str | None
+    asset_type: models.AssetType
+
+@dataclass(frozen=True, slots=True)
+class TransactionRow:
+    id: int
+    transaction_date: datetime
+    transaction_type: models.TransactionType
+    quantity: Decimal
+    price_per_unit: Decimal
+    fees: Decimal | None
+    notes: str | None
+    asset_id: int
+    symbol: str
+
+
+# Cursor de paginación del historial: (fecha, id) de la última transacción de la página anterior
+TransactionCursor = tuple[datetime, int]
+_R = TypeVar("_R")
+
+def _asset_columns():
+    A = models.Asset
+    return A.id, A.symbol, A.name, A.asset_type
+
+def _transaction_select(owner_id: int):
+    T, A = models.Transaction, models.Asset
+    return select(T.id, T.transaction_date, T.transaction_type, T.quantity, T.price_per_unit, T.fees,
+                  T.notes, T.asset_id, A.symbol)\
+           .join(A, A.id == T.asset_id)\
+           .where(T.owner_id == owner_id)
+
+def get_assets(db: Session, asset_ids: Iterable[int]) -> list[AssetRow]:
+    """Activos con esos ids, por símbolo."""
+    asset_ids = list(asset_ids)
+    if not asset_ids:
+        return []
+    stmt = select(*_asset_columns()).where(models.Asset.id.in_(asset_ids)).order_by(models.Asset.symbol)
+    return [AssetRow(*row) for row in db.execute(stmt)]
+
+def get_transactions(db: Session, owner_id: int, skip: int = 0, limit: int | None = 100) -> list[TransactionRow]:
+    """Como crud.get_transactions_for_user (más recientes primero), sin objetos ORM."""
+    T = models.Transaction
+    stmt = _transaction_select(owner_id).order_by(desc(T.transaction_date), desc(T.id)).offset(skip).limit(limit)
+    return [TransactionRow(*row) for row in db.execute(stmt)]
+
+def keyset_page(query, after: TransactionCursor | None, limit: int,
+                fetch: Callable[..., list[_R]]) -> tuple[list[_R], TransactionCursor | None]:
+    """
+    Paginación por clave (fecha, id) del historial, más recientes primero: aplica a 'query'
+    (Query del ORM o select() de Core sobre transactions) el cursor 'after', el orden y el
+    límite, y la ejecuta con 'fetch'. Las filas deben tener transaction_date e id.
+    Retorna (filas, cursor de la página siguiente o None si no hay más).
+    """
+    if limit < 1:
+        raise ValueError("El tamaño de página debe ser positivo.")
+    T = models.Transaction
+    if after is not None:
+        query = query.where(tuple_(T.transaction_date, T.id) < tuple_(*after))
+    # Se pide una fila de más para saber si hay otra página sin hacer un COUNT
+    rows = fetch(query.order_by(desc(T.transaction_date), desc(T.id)).limit(limit + 1))
+    if len(rows) <= limit:
+        return rows, None
+    last = rows[limit - 1]
+    return rows[:limit], (last.transaction_date, last.id)
+
+def get_transactions_page(db: Session, owner_id: int, after: TransactionCursor | None,
+                          limit: int) -> tuple[list[TransactionRow], TransactionCursor | None]:
+    """Como crud.get_transactions_page (mismo cursor (fecha, id) y orden), sin objetos ORM."""
+    return keyset_page(_transaction_select(owner_id), after, limit,
+                       lambda stmt: [TransactionRow(*row) for row in db.execute(stmt)])
+
+def get_open_positions(db: Session, owner_id: int) -> list[tuple[AssetRow, Decimal, Decimal]]:
+    """Posiciones abiertas materializadas (tabla positions) como (activo, cantidad, coste base), por símbolo."""
+    P = models.Position
+    stmt = select(*_asset_columns(), P.quantity, P.cost_basis)\
+           .join(models.Asset, models.Asset.id == P.asset_id)\
+           .where(P.owner_id == owner_id, P.quantity > ZERO_TOLERANCE)\
+           .order_by(models.Asset.symbol)
+    return [(AssetRow(*row[:4]), Decimal(row[4]), Decimal(row[5])) for row in db.execute(stmt)]
@@ -0,0 +1,159 @@
+# src/refresh_policy.py
+# --- Política de refresco de cotizaciones según el horario de mercado ---
+# Decide si una cotización cacheada sigue siendo válida sin ir a la red:
+#   - STOCK / ETF / OTHER: mientras el mercado está abierto rige el TTL; con el mercado
+#     cerrado, si la cotización se obtuvo después del último cierre ya es el precio
+#     oficial de cierre y no hace falta refrescarla hasta la siguiente sesión.
+#   - CRYPTO: mercado 24/7, solo TTL.
+#   - MUTUAL_FUND: el NAV se publica una vez al día tras el cierre; basta con una
+#     cotización obtenida después de la última publicación.
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+from . import models
+
+# Margen tras el cierre para que el proveedor publique el precio oficial de cierre
+CLOSE_SETTLEMENT = timedelta(minutes=20)
+# Hora (local de la bolsa) a partir de la cual se considera publicado el NAV de los fondos
+NAV_PUBLICATION_TIME = time(18, 0)
+
+
+def _easter(year: int) -> date:
+    # Algoritmo gregoriano anónimo (Meeus/Jones/Butcher)
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = ((h + l - 7 * m + 114) % 31) + 1
+    return date(year, month, day)
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    # n-ésimo día de la semana del mes (n=-1: el último)
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year, month + 1, 1) if month < 12 else date(year + 1, 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _observed(day: date) -> date:
+    # Festivo en sábado -> viernes anterior; en domingo -> lunes siguiente
+    if day.weekday() == 5: return day - timedelta(days=1)
+    if day.weekday() == 6: return day + timedelta(days=1)
+    return day
+
+@lru_cache(maxsize=32)
+def us_market_holidays(year: int) -> frozenset[date]:
+    """Festivos completos de NYSE/NASDAQ para un año."""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),   # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),   # Presidents' Day
+        _easter(year) - timedelta(days=2), # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),   # Independence Day
+        _nth_weekday(year, 9, 0, 1),   # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)), # Christmas
+    }
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5: # NYSE no traslada al viernes 31 el Año Nuevo en sábado
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19))) # Juneteenth
+    return frozenset(holidays)
+
+
+class MarketCalendar:
+    """Calendario de sesiones de una bolsa: zona horaria, horario y festivos."""
+
+    def __init__(self, name: str, tz: str, open_time: time, close_time: time, holidays=None):
+        self.name = name
+        self.tz = ZoneInfo(tz)
+        self.open_time = open_time
+        self.close_time = close_time
+        self._holidays = holidays # función año -> conjunto de fechas, o None (solo fines de semana)
+
+    def is_trading_day(self, day: date) -> bool:
+        if day.weekday() >= 5:
+            return False
+        return not (self._holidays and day in self._holidays(day.year))
+
+    def is_open(self, now: datetime) -> bool:
+        local = now.astimezone(self.tz)
+        return self.is_trading_day(local.date()) and self.open_time <= local.time() < self.close_time
+
+    def last_session_end(self, now: datetime, at: time | None = None) -> datetime | None:
+        """
+        Último instante (UTC) <= now en que terminó una sesión: el cierre o, si se indica
+        'at', esa hora local de un día hábil (p.ej. la publicación del NAV).
+        """
+        at = at or self.close_time
+        local_now = now.astimezone(self.tz)
+        day = local_now.date()
+        for _ in range(15): # Cubre puentes largos
+            if self.is_trading_day(day):
+                moment = datetime.combine(day, at, tzinfo=self.tz)
+                if moment <= local_now:
+                    return moment.astimezone(timezone.utc)
+            day -= timedelta(days=1)
+        return None
+
+    def __repr__(self):
+        return f"<MarketCalendar({self.name})>"
+
+
+NYSE = MarketCalendar("NYSE", "America/New_York", time(9, 30), time(16, 0), us_market_holidays)
+# Otras bolsas por sufijo de Yahoo Finance (solo fines de semana como días inhábiles)
+CALENDARS_BY_SUFFIX: dict[str, MarketCalendar] = {
+    ".MC": MarketCalendar("BME", "Europe/Madrid", time(9, 0), time(17, 30)),
+    ".DE": MarketCalendar("XETRA", "Europe/Berlin", time(9, 0), time(17, 30)),
+    ".PA": MarketCalendar("Euronext Paris", "Europe/Paris", time(9, 0), time(17, 30)),
+    ".AS": MarketCalendar("Euronext Amsterdam", "Europe/Amsterdam", time(9, 0), time(17, 30)),
+    ".MI": MarketCalendar("Borsa Italiana", "Europe/Rome", time(9, 0), time(17, 30)),
+    ".L": MarketCalendar("LSE", "Europe/London", time(8, 0), time(16, 30)),
+    ".TO": MarketCalendar("TSX", "America/Toronto", time(9, 30), time(16, 0)),
+}
+
+def calendar_for(symbol: str) -> MarketCalendar:
+    """Calendario de la bolsa de un símbolo según su sufijo (por defecto, NYSE)."""
+    _, dot, suffix = symbol.upper().rpartition(".")
+    if dot:
+        calendar = CALENDARS_BY_SUFFIX.get(f".{suffix}")
+        if calendar:
+            return calendar
+    return NYSE
+
+
+class RefreshPolicy:
+    """Decide si una cotización cacheada es válida según el tipo de activo y el mercado."""
+
+    def is_fresh(self, symbol: str, asset_type: models.AssetType | None, fetched_at: datetime,
+                 ttl: float, now: datetime | None = None) -> bool:
+        now = now or datetime.now(timezone.utc)
+        age = (now - fetched_at).total_seconds()
+        calendar = calendar_for(symbol)
+
+        if asset_type == models.AssetType.MUTUAL_FUND:
+            # Un NAV es válido hasta la siguiente publicación, sea cual sea su antigüedad
+            published = calendar.last_session_end(now - CLOSE_SETTLEMENT, at=NAV_PUBLICATION_TIME)
+            if published is None:
+                return age <= ttl
+            return fetched_at >= published + CLOSE_SETTLEMENT
+
+        if age <= ttl:
+            return True
+        if asset_type == models.AssetType.CRYPTO or calendar.is_open(now):
+            return False
+        # Mercado cerrado: válida si se obtuvo una vez publicado el último cierre oficial
+        last_close = calendar.last_session_end(now - CLOSE_SETTLEMENT)
+        return last_close is not None and fetched_at >= last_close + CLOSE_SETTLEMENT
+
+    def market_closed(self, symbol: str, asset_type: models.AssetType | None, now: datetime | None = None) -> bool:
+        if asset_type == models.AssetType.CRYPTO:
+            return False
+        return not calendar_for(symbol).is_open(now or datetime.now(timezone.utc))
@@ -0,0 +1,218 @@
+# src/returns.py
+# --- Rentabilidad ponderada por tiempo (TWR) y por dinero (XIRR) ---
+# Los flujos de caja salen de la tabla transactions (compra = aportación, venta = retirada)
+# y las valoraciones diarias de los cierres del histórico local (price_bars).
+# Se construye una sola vez una matriz diaria activos x días (cantidad x último cierre) que
+# cubre todos los periodos pedidos; cada periodo es una ventana de columnas de esa matriz.
+#   - TWR: producto de las rentabilidades diarias (V_t - F_t) / V_{t-1}, con los flujos al
+#     cierre del día en que ocurren. Vectorizado por filas (activos y portafolio).
+#   - XIRR: tasa anual r tal que sum(a_i / (1 + r)^t_i) = 0 con el valor inicial como
+#     aportación y el final como retirada. Todos los (periodo, activo) se resuelven en un
+#     solo lote con Newton vectorizado y bisección vectorizada para los que no convergen.
+# Las rentabilidades son floats (0.05 = 5%); None si no se pueden calcular (falta de precios
+# o periodo sin inversión).
+from datetime import date, datetime, timedelta
+import logging
+
+import numpy as np
+from sqlalchemy import Float, select, type_coerce
+from sqlalchemy.orm import Session
+
+from . import models, history
+from .lots import ZERO_TOLERANCE
+from .providers import PriceProvider
+
+# Días hacia atrás en los que se busca el último cierre conocido antes del primer periodo
+PRICE_LOOKBACK_DAYS = 14
+DAYS_PER_YEAR = 365.0
+XIRR_TOLERANCE = 1e-10
+XIRR_MAX_ITERATIONS = 50
+# Intervalo de búsqueda de la bisección (tasas anuales)
+XIRR_BRACKET = (-0.999999, 1e4)
+ZERO_TOLERANCE_FLOAT = float(ZERO_TOLERANCE)
+
+
+def _npv(rates: np.ndarray, amounts: np.ndarray, years: np.ndarray) -> np.ndarray:
+    return (amounts * (1.0 + rates[:, None]) ** -years).sum(axis=1)
+
+def xirr_batch(amounts: np.ndarray, years: np.ndarray, guess: float = 0.1) -> np.ndarray:
+    """
+    Resuelve la XIRR de varias series de flujos a la vez.
+    'amounts' y 'years' son matrices (n, m): un problema por fila, con 'years' el tiempo de
+    cada flujo en años desde el primero. Las filas más cortas se rellenan con importe 0.
+    Retorna un array (n,) de tasas; NaN donde no hay solución (p.ej. flujos de un solo signo).
+    """
+    amounts = np.asarray(amounts, dtype=np.float64)
+    years = np.asarray(years, dtype=np.float64)
+    n = amounts.shape[0]
+    rates = np.full(n, guess)
+    solvable = (amounts > 0).any(axis=1) & (amounts < 0).any(axis=1)
+    active = solvable.copy()
+
+    # Newton sobre todas las filas activas a la vez
+    for _ in range(XIRR_MAX_ITERATIONS):
+        if not active.any():
+            break
+        base = 1.0 + rates[active, None]
+        discounted = amounts[active] * base ** -years[active]
+        npv = discounted.sum(axis=1)
+        derivative = (-years[active] * discounted / base).sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = npv / derivative
+        new_rates = rates[active] - step
+        # Mantener 1 + r > 0: si Newton se sale, se acerca a -1 a mitad de camino
+        new_rates = np.where(new_rates <= -1.0, (rates[active] - 1.0) / 2.0, new_rates)
+        idx = np.flatnonzero(active)
+        ok = np.isfinite(new_rates)
+        rates[idx[ok]] = new_rates[ok]
+        done = ok & (np.abs(step) < XIRR_TOLERANCE)
+        failed = ~ok
+        active[idx[done | failed]] = False
+        if failed.any():
+            rates[idx[failed]] = np.nan
+
+    converged = solvable & np.isfinite(rates) & (np.abs(_npv(np.nan_to_num(rates), amounts, years)) <
+                                                 1e-6 * np.maximum(1.0, np.abs(amounts).sum(axis=1)))
+    pending = solvable & ~converged
+    if pending.any():
+        rates[pending] = _bisect(amounts[pending], years[pending])
+    rates[~solvable] = np.nan
+    return rates
+
+def _bisect(amounts: np.ndarray, years: np.ndarray, iterations: int = 200) -> np.ndarray:
+    """Bisección vectorizada en XIRR_BRACKET; NaN para las filas sin cambio de signo."""
+    low = np.full(amounts.shape[0], XIRR_BRACKET[0])
+    high = np.full(amounts.shape[0], XIRR_BRACKET[1])
+    npv_low = _npv(low, amounts, years)
+    npv_high = _npv(high, amounts, years)
+    bracketed = np.sign(npv_low) != np.sign(npv_high)
+    for _ in range(iterations):
+        mid = (low + high) / 2.0
+        npv_mid = _npv(mid, amounts, years)
+        same = np.sign(npv_mid) == np.sign(npv_low)
+        low = np.where(same, mid, low)
+        npv_low = np.where(same, npv_mid, npv_low)
+        high = np.where(same, high, mid)
+    return np.where(bracketed, (low + high) / 2.0, np.nan)
+
+def twr_batch(values: np.ndarray, flows: np.ndarray) -> np.ndarray:
+    """
+    TWR de varias series diarias a la vez (una por fila). values[:, t] es el valor al cierre
+    del día t y flows[:, t] la aportación neta de ese día (la del día 0 queda en el valor base).
+    Si el día empieza sin inversión (valor anterior 0), la base es la aportación de ese día
+    (primera compra o recompra tras cerrar la posición); sin aportación, el día no cuenta.
+    NaN si falta algún valor.
+    """
+    previous, inflow = values[:, :-1], flows[:, 1:]
+    held = previous > ZERO_TOLERANCE_FLOAT
+    opened = ~held & (inflow > ZERO_TOLERANCE_FLOAT)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        daily = np.where(held, (values[:, 1:] - inflow) / previous, np.where(opened, values[:, 1:] / inflow, 1.0))
+    daily = np.where(np.isnan(previous) | np.isnan(values[:, 1:]), np.nan, daily)
+    invested = (held | opened).any(axis=1)
+    result = np.prod(daily, axis=1) - 1.0
+    return np.where(invested, result, np.nan)
+
+
+class DailyMatrix:
+    """Valor al cierre y aportación neta por activo y día entre 'start' y 'end'."""
+
+    def __init__(self, db: Session, user_id: int, start: date, end: date, backfill_missing: bool = False,
+                 provider: PriceProvider | None = None):
+        self.start, self.end = start, end
+        T = models.Transaction
+        rows = db.execute(select(T.asset_id, T.transaction_type == models.TransactionType.BUY, T.transaction_date,
+                                 type_coerce(T.quantity, Float), type_coerce(T.price_per_unit, Float),
+                                 type_coerce(T.fees, Float))
+                          .where(T.owner_id == user_id, T.transaction_date < _next_day(end))).all()
+        asset_ids = sorted({r[0] for r in rows})
+        self.symbols = [s for _, s in sorted(db.query(models.Asset.id, models.Asset.symbol)
+                                             .filter(models.Asset.id.in_(asset_ids)).all())] if asset_ids else []
+        n_days = (end - start).days + 1
+        n_assets = len(asset_ids)
+        position = {asset_id: i for i, asset_id in enumerate(asset_ids)}
+
+        quantity = np.zeros((n_assets, n_days))
+        self.flows = np.zeros((n_assets, n_days))
+        for asset_id, is_buy, when, qty, price, fees in rows:
+            fees = fees or 0.0
+            signed = qty if is_buy else -qty
+            flow = qty * price + fees if is_buy else -(qty * price - fees)
+            day = max((when.date() - start).days, 0) # Lo anterior al inicio se acumula en el día 0
+            quantity[position[asset_id], day] += signed
+            self.flows[position[asset_id], day] += flow
+        quantity = np.cumsum(quantity, axis=1)
+        quantity[np.abs(quantity) < ZERO_TOLERANCE_FLOAT] = 0.0
+
+        prices = np.full((n_assets, n_days), np.nan)
+        if backfill_missing and self.symbols:
+            history.backfill(db, self.symbols, start - timedelta(days=PRICE_LOOKBACK_DAYS), end, provider=provider)
+        closes = history.get_closes(db, self.symbols, start - timedelta(days=PRICE_LOOKBACK_DAYS), end)
+        for i, symbol in enumerate(self.symbols):
+            for day, close in closes.get(symbol.upper(), []):
+                prices[i, max((day - start).days, 0)] = float(close)
+        # Rellenar hacia delante con el último cierre conocido
+        index = np.where(np.isnan(prices), 0, np.arange(n_days))
+        np.maximum.accumulate(index, axis=1, out=index)
+        prices = prices[np.arange(n_assets)[:, None], index]
+        self.values = np.where(quantity == 0.0, 0.0, quantity * prices)
+
+    def window(self, start: date, end: date) -> tuple[np.ndarray, np.ndarray]:
+        """Valores y flujos del periodo; los flujos del primer día forman parte del valor base."""
+        a, b = (start - self.start).days, (end - self.start).days + 1
+        values, flows = self.values[:, a:b], self.flows[:, a:b].copy()
+        flows[:, 0] = 0.0
+        return values, flows
+
+def _next_day(day: date) -> datetime:
+    return datetime.combine(day + timedelta(days=1), datetime.min.time())
+
+def _to_result(value: float) -> float | None:
+    return None if value is None or not np.isfinite(value) else float(value)
+
+def get_returns(db: Session, user_id: int, periods: list[tuple[date, date]], backfill_missing: bool = False,
+                provider: PriceProvider | None = None) -> list[dict]:
+    """
+    TWR y XIRR del portafolio y de cada activo para cada periodo (inicio, fin), ambos incluidos.
+    Si 'backfill_missing' es True, antes descarga los cierres que falten de esos días.
+    Retorna una lista (en el orden de 'periods') de
+    {"start", "end", "portfolio": {"twr", "xirr"}, "by_symbol": {símbolo: {"twr", "xirr"}}}.
+    """
+    periods = list(periods)
+    if any(e <= s for s, e in periods):
+        raise ValueError("Cada periodo debe terminar después de su fecha de inicio.")
+    if not periods:
+        return []
+    matrix = DailyMatrix(db, user_id, min(s for s, _ in periods), max(e for _, e in periods),
+                         backfill_missing=backfill_missing, provider=provider)
+    n_assets = len(matrix.symbols)
+
+    # Un problema por (periodo, activo) más el portafolio completo, todos en la misma matriz
+    windows = [matrix.window(s, e) for s, e in periods]
+    longest = max(v.shape[1] for v, _ in windows)
+    amounts = np.zeros((len(periods) * (n_assets + 1), longest))
+    years = np.tile(np.arange(longest) / DAYS_PER_YEAR, (amounts.shape[0], 1))
+    twr = np.empty(amounts.shape[0])
+    for p, (values, flows) in enumerate(windows):
+        values = np.vstack([values, values.sum(axis=0)])
+        flows = np.vstack([flows, flows.sum(axis=0)])
+        rows = slice(p * (n_assets + 1), (p + 1) * (n_assets + 1))
+        days = values.shape[1]
+        amounts[rows, :days] = -flows
+        amounts[rows, 0] -= values[:, 0]
+        amounts[rows, days - 1] += values[:, -1]
+        twr[rows] = twr_batch(values, flows)
+    xirr = xirr_batch(np.nan_to_num(amounts), years)
+    xirr[np.isnan(amounts).any(axis=1)] = np.nan
+
+    results = []
+    for p, (start, end) in enumerate(periods):
+        base = p * (n_assets + 1)
+        results.append({
+            "start": start, "end": end,
+            "portfolio": {"twr": _to_result(twr[base + n_assets]), "xirr": _to_result(xirr[base + n_assets])},
+            "by_symbol": {symbol: {"twr": _to_result(twr[base + i]), "xirr": _to_result(xirr[base + i])}
+                          for i, symbol in enumerate(matrix.symbols)},
+        })
+    logging.info(f"Rentabilidades de usuario ID {user_id}: {len(periods)} periodos x {n_assets} activos.")
+    return results
@@ -0,0 +1,76 @@
+# src/singleflight.py
+# --- Coalescencia de peticiones concurrentes ("single-flight") ---
+# Si varios hilos piden a la vez el mismo recurso (p.ej. el precio de un símbolo),
+# solo el primero ejecuta la función; el resto espera y recibe el mismo resultado.
+import threading
+from typing import Any, Callable
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Agrupa llamadas concurrentes con la misma clave en una sola ejecución."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: dict[Any, _Call] = {}
+        self._stats = {"calls": 0, "executions": 0, "shared": 0}
+
+    def do(self, key, fn: Callable, *args, **kwargs):
+        """
+        Ejecuta fn(*args, **kwargs) salvo que ya haya una ejecución en curso para 'key';
+        en ese caso espera a que termine y retorna su resultado (o relanza su excepción).
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._in_flight.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._stats["shared"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._in_flight[key] = call
+                self._stats["executions"] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            call.done.set()
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._in_flight)
+
+    def stats(self) -> dict:
+        """
+        'calls': peticiones recibidas; 'executions': ejecuciones reales;
+        'shared': peticiones que reutilizaron una ejecución en curso (duplicados evitados).
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def reset_stats(self):
+        with self._lock:
+            for key in self._stats: self._stats[key] = 0
@@ -0,0 +1,213 @@
+# src/snapshots.py
+# --- Valoración a una fecha y serie diaria de NAV (tabla portfolio_snapshots) ---
+#   - value_as_of: posiciones FIFO a una fecha, valoradas con el último cierre local
+#     (price_bars) en o antes de esa fecha. Mismo formato que get_portfolio_performance.
+#   - build_snapshots: añade a portfolio_snapshots solo los días posteriores a la última
+#     instantánea del usuario. Parte de las posiciones materializadas (o, si hay transacciones
+#     en el tramo, de un replay en streaming del historial anterior) y avanza día a día
+#     aplicando solo las transacciones de cada día, sin replay por día.
+#   - Las escrituras de transacciones invalidan las instantáneas desde su fecha
+#     (invalidate_from), que se recalculan en el siguiente build.
+# Las series para gráficos y las rentabilidades de un periodo se leen de la tabla
+# (get_nav_series / get_period_change) sin recorrer el historial.
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import logging
+import time
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models, history, read_models
+from .lots import ZERO_TOLERANCE, new_ledger
+from .positions import iter_ledgers, load_ledgers
+from .providers import PriceProvider
+
+# Días hacia atrás en los que se busca el último cierre conocido al empezar un tramo
+PRICE_LOOKBACK_DAYS = 14
+
+
+def _day_start(day: date) -> datetime:
+    return datetime.combine(day, datetime.min.time())
+
+def value_as_of(db: Session, user_id: int, as_of: date, backfill_missing: bool = False,
+                provider: PriceProvider | None = None) -> dict:
+    """
+    Valora el portafolio de 'user_id' al cierre de 'as_of': posiciones con las transacciones
+    hasta ese día (incluido) y el último cierre local en o antes de esa fecha.
+    Si 'backfill_missing' es True, antes descarga los cierres que falten de esos días.
+    Retorna {símbolo: métricas} con el formato de crud.get_portfolio_performance.
+    """
+    from .crud import build_position_metrics # Import diferido: crud importa este módulo
+
+    ledgers = {asset_id: ledger for _, asset_id, ledger in iter_ledgers(db, user_id, until=_day_start(as_of + timedelta(days=1)))
+               if ledger.is_open()}
+    if not ledgers:
+        return {}
+    assets = read_models.get_assets(db, ledgers)
+    symbols = [asset.symbol for asset in assets]
+    if backfill_missing:
+        history.backfill(db, symbols, as_of - timedelta(days=PRICE_LOOKBACK_DAYS), as_of, provider=provider)
+    closes = history.get_closes_as_of(db, symbols, as_of)
+
+    portfolio = {}
+    for asset in assets:
+        ledger = ledgers[asset.id]
+        close = closes.get(asset.symbol.upper())
+        portfolio[asset.symbol] = build_position_metrics(asset, ledger.quantity, ledger.cost_basis,
+                                                         close[1] if close else None)
+    return portfolio
+
+def last_snapshot_date(db: Session, user_id: int) -> date | None:
+    return db.query(func.max(models.PortfolioSnapshot.date)).filter(models.PortfolioSnapshot.owner_id == user_id).scalar()
+
+def invalidate_from(db: Session, user_id: int, day: date | datetime):
+    """Borra las instantáneas desde 'day' (incluido); no hace commit."""
+    if isinstance(day, datetime):
+        day = day.date()
+    db.query(models.PortfolioSnapshot)\
+      .filter(models.PortfolioSnapshot.owner_id == user_id, models.PortfolioSnapshot.date >= day)\
+      .delete(synchronize_session=False)
+
+def build_snapshots(db: Session, user_id: int, end: date | None = None, backfill_missing: bool = True,
+                    provider: PriceProvider | None = None) -> dict:
+    """
+    Añade las instantáneas diarias que faltan entre la última guardada y 'end' (por defecto
+    ayer: el día en curso aún no tiene cierre). Hace commit. Retorna estadísticas.
+    """
+    started = time.perf_counter()
+    end = end or date.today() - timedelta(days=1)
+    T = models.Transaction
+    stats = {"days": 0, "start": None, "end": end, "seconds": 0.0}
+    last = last_snapshot_date(db, user_id)
+    if last is None:
+        first = db.query(func.min(T.transaction_date)).filter(T.owner_id == user_id).scalar()
+        if first is None:
+            return stats
+        start = first.date()
+    else:
+        start = last + timedelta(days=1)
+    if start > end:
+        return stats
+    stats["start"] = start
+
+    # Estado al empezar el tramo. Sin transacciones desde 'start' (el caso habitual de un build
+    # diario) es el de las posiciones materializadas; si no, se reproduce en streaming solo el
+    # historial anterior a 'start'. En ambos casos solo se cargan las transacciones del tramo.
+    if db.query(T.id).filter(T.owner_id == user_id, T.transaction_date >= _day_start(start)).first() is None:
+        ledgers = load_ledgers(db, user_id)
+    else:
+        ledgers = {asset_id: ledger for _, asset_id, ledger in iter_ledgers(db, user_id, until=_day_start(start))}
+    transactions = db.query(T.asset_id, T.transaction_type, T.quantity, T.price_per_unit, T.fees,
+                            T.transaction_date, T.id)\
+                     .filter(T.owner_id == user_id, T.transaction_date >= _day_start(start),
+                             T.transaction_date < _day_start(end + timedelta(days=1)))\
+                     .order_by(T.transaction_date, T.id).all()
+    asset_ids = set(ledgers) | {t.asset_id for t in transactions}
+    asset_symbols = {asset.id: asset.symbol.upper() for asset in read_models.get_assets(db, asset_ids)}
+
+    symbols = sorted(set(asset_symbols.values()))
+    if backfill_missing:
+        history.backfill(db, symbols, start - timedelta(days=PRICE_LOOKBACK_DAYS), end, provider=provider)
+    # Cierres por símbolo ordenados por fecha; se avanza un puntero por símbolo a medida que pasan los días
+    closes = history.get_closes(db, symbols, start - timedelta(days=PRICE_LOOKBACK_DAYS), end)
+    price_index = {symbol: 0 for symbol in closes}
+    last_price: dict[str, Decimal] = {}
+
+    tx_iter = iter(transactions)
+    pending = next(tx_iter, None)
+    rows = []
+    day = start
+    while day <= end:
+        net_flow = Decimal(0)
+        while pending is not None and pending.transaction_date.date() == day:
+            ledger = ledgers.setdefault(pending.asset_id, new_ledger(label=asset_symbols[pending.asset_id]))
+            quantity, price = Decimal(pending.quantity), Decimal(pending.price_per_unit)
+            fees = Decimal(pending.fees) if pending.fees is not None else Decimal(0)
+            if pending.transaction_type == models.TransactionType.BUY: net_flow += quantity * price + fees
+            else: net_flow -= quantity * price - fees
+            ledger.apply(pending)
+            pending = next(tx_iter, None)
+
+        for symbol, bars in closes.items():
+            i = price_index[symbol]
+            while i < len(bars) and bars[i][0] <= day:
+                last_price[symbol] = bars[i][1]
+                i += 1
+            price_index[symbol] = i
+
+        market_value = cost_basis = realized_pnl = Decimal(0)
+        open_positions = missing = 0
+        for asset_id, ledger in ledgers.items():
+            realized_pnl += ledger.realized_pnl
+            if ledger.quantity <= ZERO_TOLERANCE:
+                continue
+            open_positions += 1
+            cost_basis += ledger.cost_basis
+            price = last_price.get(asset_symbols[asset_id])
+            if price is None:
+                missing += 1
+                market_value += ledger.cost_basis
+            else:
+                market_value += ledger.quantity * price
+        rows.append({"owner_id": user_id, "date": day, "market_value": market_value, "cost_basis": cost_basis,
+                     "unrealized_pnl": market_value - cost_basis, "realized_pnl": realized_pnl,
+                     "net_flow": net_flow, "positions": open_positions, "missing_prices": missing})
+        day += timedelta(days=1)
+
+    try:
+        db.execute(models.PortfolioSnapshot.__table__.insert(), rows)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Error al guardar instantáneas del usuario ID {user_id}: {e}", exc_info=True)
+        raise
+    stats["days"] = len(rows)
+    stats["seconds"] = time.perf_counter() - started
+    logging.info(f"Instantáneas del usuario ID {user_id}: {len(rows)} días ({start}..{end}) en {stats['seconds']:.2f}s.")
+    return stats
+
+def get_nav_series(db: Session, user_id: int, start: date | None = None, end: date | None = None) -> list[models.PortfolioSnapshot]:
+    """Serie diaria guardada (para gráficos), por fecha."""
+    query = db.query(models.PortfolioSnapshot).filter(models.PortfolioSnapshot.owner_id == user_id)
+    if start is not None: query = query.filter(models.PortfolioSnapshot.date >= start)
+    if end is not None: query = query.filter(models.PortfolioSnapshot.date <= end)
+    return query.order_by(models.PortfolioSnapshot.date).all()
+
+def get_period_change(db: Session, user_id: int, start: date, end: date) -> dict | None:
+    """
+    Variación del portafolio entre dos días con instantánea, leyendo solo esas dos filas y la
+    suma de flujos del periodo: 'start_value', 'end_value', 'net_flow' y 'change'
+    (variación del NAV descontadas las aportaciones netas). None si falta alguna instantánea.
+    """
+    S = models.PortfolioSnapshot
+    first = db.get(S, (user_id, start))
+    last = db.get(S, (user_id, end))
+    if first is None or last is None:
+        return None
+    flows = db.query(func.sum(S.net_flow)).filter(S.owner_id == user_id, S.date > start, S.date <= end).scalar()
+    net_flow = Decimal(flows or 0)
+    start_value, end_value = Decimal(first.market_value), Decimal(last.market_value)
+    return {"start_value": start_value, "end_value": end_value, "net_flow": net_flow,
+            "change": end_value - start_value - net_flow}
+
+
+# --- Uso desde línea de comandos ---
+# python -m src.snapshots [--user ID] [--end YYYY-MM-DD]
+# Completa las instantáneas diarias de todos los usuarios (o de uno).
+if __name__ == "__main__":
+    import argparse
+    from .database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Completa la serie diaria de valoración (portfolio_snapshots).")
+    parser.add_argument("--user", type=int, default=None, help="ID de usuario (por defecto, todos)")
+    parser.add_argument("--end", type=date.fromisoformat, default=None, help="Último día YYYY-MM-DD (por defecto ayer)")
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        user_ids = [args.user] if args.user is not None else [u for (u,) in session.query(models.User.id)]
+        for user_id in user_ids:
+            print(user_id, build_snapshots(session, user_id, args.end))
+    finally:
+        session.close()
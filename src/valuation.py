@@ -0,0 +1,163 @@
+# src/valuation.py
+# --- Motor de valoración con método de coste seleccionable ---
+# Carga todas las transacciones de un usuario con una sola consulta (importes ya escalados a
+# enteros en SQL, como positions.iter_ledgers con LOT_ENGINE=fixed) y calcula, activo por
+# activo, cantidad, coste base y P&L realizado según:
+#   - FIFO: se venden primero los lotes más antiguos.
+#   - LIFO: se venden primero los lotes más recientes.
+#   - HIFO: se venden primero los lotes con mayor coste unitario.
+#   - AVERAGE: coste medio ponderado (las ventas salen al coste medio vigente).
+# Todos los métodos usan el libro de lotes en enteros escalados de lots.py (FixedLotLedger),
+# que solo cambia el orden en que se consumen los lotes: la aritmética es exacta y la misma que
+# la de las posiciones FIFO materializadas, y los resultados llegan como Decimal con la escala de la BD.
+from decimal import Decimal
+from enum import Enum as PyEnum
+from itertools import groupby
+from typing import NamedTuple
+import heapq
+import logging
+import os
+
+from sqlalchemy import select
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+
+from . import models, read_models
+from .lots import FixedLotLedger, ZERO_TOLERANCE
+from .positions import scaled_column
+from .read_models import AssetRow
+
+
+class CostBasisMethod(PyEnum):
+    FIFO = "FIFO"
+    LIFO = "LIFO"
+    HIFO = "HIFO"
+    AVERAGE = "AVERAGE"
+
+def _default_cost_basis_method() -> CostBasisMethod:
+    # Un valor inválido en COST_BASIS_METHOD no debe impedir arrancar la aplicación
+    value = os.getenv("COST_BASIS_METHOD", "FIFO").strip().upper()
+    try:
+        return CostBasisMethod[value]
+    except KeyError:
+        logging.warning(f"COST_BASIS_METHOD desconocido: '{value}'. Se usa FIFO "
+                        f"(valores válidos: {', '.join(m.value for m in CostBasisMethod)}).")
+        return CostBasisMethod.FIFO
+
+DEFAULT_COST_BASIS_METHOD = _default_cost_basis_method()
+
+
+class PositionResult(NamedTuple):
+    quantity: Decimal
+    cost_basis: Decimal
+    realized_pnl: Decimal
+
+
+class _LifoLedger(FixedLotLedger):
+    """Se venden primero los lotes más recientes (pila)."""
+
+    def _next_lot(self) -> list:
+        return self._lots[-1]
+
+    def _pop_lot(self):
+        self._lots.pop()
+
+    def _open_lots(self):
+        return reversed(self._lots)
+
+
+class _HifoLedger(FixedLotLedger):
+    """Se venden primero los lotes de mayor coste unitario (montículo; a igual coste, el más antiguo)."""
+
+    def __init__(self, label: str = "", record_matches: bool = False):
+        super().__init__(label, record_matches)
+        self._lots = [] # (-coste unitario en escala 10, orden de compra, lote)
+        self._sequence = 0
+
+    def _push_lot(self, lot: list):
+        # Coste (escala 20) / cantidad (escala 10): coste unitario truncado a la escala de la BD
+        unit_cost = lot[2] // lot[1] if lot[1] else 0
+        heapq.heappush(self._lots, (-unit_cost, self._sequence, lot))
+        self._sequence += 1
+
+    def _next_lot(self) -> list:
+        return self._lots[0][2]
+
+    def _pop_lot(self):
+        heapq.heappop(self._lots)
+
+    def _open_lots(self):
+        return [lot for *_, lot in sorted(self._lots)]
+
+
+class _AverageLedger(FixedLotLedger):
+    """
+    Coste medio ponderado: todas las compras se acumulan en un único lote, así que cada venta
+    sale al coste medio vigente (la parte proporcional del coste del lote).
+    """
+
+    def _push_lot(self, lot: list):
+        if self._lots:
+            pooled = self._lots[0]
+            pooled[1] += lot[1]
+            pooled[2] += lot[2]
+        else:
+            self._lots.append(lot)
+
+
+_LEDGERS = {CostBasisMethod.FIFO: FixedLotLedger, CostBasisMethod.LIFO: _LifoLedger,
+            CostBasisMethod.HIFO: _HifoLedger, CostBasisMethod.AVERAGE: _AverageLedger}
+
+def new_method_ledger(method: CostBasisMethod, label: str = "") -> FixedLotLedger:
+    """Libro de lotes en enteros escalados que consume los lotes según 'method'."""
+    return _LEDGERS[method](label)
+
+
+def load_transactions(db: Session, owner_id: int) -> list[Row]:
+    """
+    Lee las transacciones del usuario con una sola consulta, ordenadas por (activo, fecha, id),
+    con cantidad, precio y comisiones escalados a enteros (ver positions.scaled_column).
+    """
+    T = models.Transaction
+    return db.execute(select(T.asset_id, T.id, T.transaction_type, scaled_column(T.quantity, "quantity"),
+                             scaled_column(T.price_per_unit, "price_per_unit"), scaled_column(T.fees, "fees"),
+                             T.transaction_date)
+                      .where(T.owner_id == owner_id)
+                      .order_by(T.asset_id, T.transaction_date, T.id)).all()
+
+
+def compute_positions(transactions: list[Row], method: CostBasisMethod = CostBasisMethod.FIFO) -> dict[int, PositionResult]:
+    """Calcula la posición de cada activo (incluidas las cerradas) según 'method'."""
+    results: dict[int, PositionResult] = {}
+    for asset_id, group in groupby(transactions, key=lambda t: t.asset_id):
+        ledger = new_method_ledger(method, label=f"ID {asset_id}")
+        for t in group:
+            ledger.apply_fixed(t)
+        results[asset_id] = PositionResult(ledger.quantity, ledger.cost_basis, ledger.realized_pnl)
+    return results
+
+
+def get_open_positions(db: Session, owner_id: int, method: CostBasisMethod = CostBasisMethod.FIFO
+                       ) -> list[tuple[AssetRow, Decimal, Decimal]]:
+    """Posiciones abiertas como (activo, cantidad, coste base total) según 'method', por símbolo."""
+    results = compute_positions(load_transactions(db, owner_id), method)
+    open_ids = [asset_id for asset_id, r in results.items() if r.quantity > ZERO_TOLERANCE]
+    if not open_ids:
+        return []
+    assets = read_models.get_assets(db, open_ids)
+    logging.info(f"Posiciones abiertas ({method.value}) para usuario ID {owner_id}: {len(assets)}.")
+    return [(asset, results[asset.id].quantity, results[asset.id].cost_basis) for asset in assets]
+
+
+def compare_methods(db: Session, owner_id: int) -> dict[CostBasisMethod, dict[str, Decimal]]:
+    """
+    Totales del usuario con cada método (para planificación fiscal): coste base de lo que
+    sigue abierto y P&L realizado. Las transacciones se leen una sola vez.
+    """
+    transactions = load_transactions(db, owner_id)
+    summary = {}
+    for method in CostBasisMethod:
+        results = compute_positions(transactions, method).values()
+        summary[method] = {"open_cost_basis": sum((r.cost_basis for r in results if r.quantity > ZERO_TOLERANCE), Decimal(0)),
+                           "realized_pnl": sum((r.realized_pnl for r in results), Decimal(0))}
+    return summary